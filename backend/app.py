@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, Response, current_app, g, has_request_context, jsonify, request
 from flask_mail import Mail, Message
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
@@ -7,58 +7,140 @@ import time
 from flask_cors import CORS
 import os
 import re
+import json
+import math
+import threading
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from contextlib import contextmanager
 import logging
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from competitor_scraper import CompetitorScraper
+from price_history_store import record_competitor_price, expand_price_history
+from price_history_rollups import BUCKETS, resolve_range, query_price_buckets
+from scrape_jobs import ScrapeJobQueue, job_result
+from db_routing import ReplicaRouter
 
-# Initialize scraper
-scraper = CompetitorScraper()
-
-# Initialize Flask app
-app = Flask(__name__)
+# The scraper (requests + BeautifulSoup), numpy and the Parquet archive are
+# imported where they are first used, so starting the API, or importing this
+# module from a worker, does not pay for subsystems it never touches.
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-bcrypt = Bcrypt(app)
-jwt = JWTManager(app)
 load_dotenv()
 
-CORS(app, origins=["http://localhost:3000"])
-
-# Flask-Mail Configuration (keep for price alerts)
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
-
-mail = Mail(app)
-
-# MySQL configuration
-app.config['MYSQL_HOST'] = os.getenv('MYSQL_HOST', 'localhost')
-app.config['MYSQL_USER'] = os.getenv('MYSQL_USER', 'tracker_user')
-app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD', 'password')
-app.config['MYSQL_DB'] = os.getenv('MYSQL_DB', 'price_tracker')
-
-mysql = MySQL(app)
-
-# JWT secret key
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'fallback_default_key')
+# Extensions are bound to an app in create_app()
+bcrypt = Bcrypt()
+jwt = JWTManager()
+mail = Mail()
+mysql = MySQL()
+
+api = Blueprint('api', __name__)
+
+def create_app():
+    """Build the Flask app and bind the extensions to it"""
+    app = Flask(__name__)
+
+    # Flask-Mail Configuration (keep for price alerts)
+    app.config['MAIL_SERVER'] = 'smtp.gmail.com'
+    app.config['MAIL_PORT'] = 587
+    app.config['MAIL_USE_TLS'] = True
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
+
+    # MySQL configuration
+    app.config['MYSQL_HOST'] = os.getenv('MYSQL_HOST', 'localhost')
+    app.config['MYSQL_USER'] = os.getenv('MYSQL_USER', 'tracker_user')
+    app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD', 'password')
+    app.config['MYSQL_DB'] = os.getenv('MYSQL_DB', 'price_tracker')
+
+    # JWT secret key
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'fallback_default_key')
+
+    bcrypt.init_app(app)
+    jwt.init_app(app)
+    mail.init_app(app)
+    mysql.init_app(app)
+    CORS(app, origins=["http://localhost:3000"], expose_headers=[READ_PIN_HEADER])
+
+    # Background scrape queue; its worker threads only start with the first job
+    app.extensions['scrape_jobs'] = ScrapeJobQueue(
+        lambda mapping_id: run_scrape_job(app, mapping_id),
+        max_workers=int(os.getenv('SCRAPE_JOB_WORKERS', '4'))
+    )
+
+    # Read-only routes may be served by MYSQL_REPLICA_HOSTS
+    app.extensions['db_router'] = ReplicaRouter.from_env(app.config['JWT_SECRET_KEY'])
+    app.after_request(send_read_pin)
+
+    app.register_blueprint(api)
+    return app
+
+_scraper = None
+_scraper_lock = threading.Lock()
+
+def get_scraper():
+    """Shared CompetitorScraper, created on first use"""
+    global _scraper
+    if _scraper is None:
+        with _scraper_lock:
+            if _scraper is None:
+                from competitor_scraper import CompetitorScraper
+                _scraper = CompetitorScraper()
+    return _scraper
+
+def get_scrape_jobs():
+    return current_app.extensions['scrape_jobs']
+
+# Read-your-writes token: set after a write, sent back by the client
+READ_PIN_COOKIE = 'db_read_pin'
+READ_PIN_HEADER = 'X-DB-Read-Pin'
+
+def is_read_pinned():
+    """Whether this request's reads must see the client's recent writes"""
+    router = current_app.extensions['db_router']
+    if 'db_read_pin' in g:
+        return True
+    token = request.headers.get(READ_PIN_HEADER) or request.cookies.get(READ_PIN_COOKIE)
+    return router.is_pinned(token)
+
+def send_read_pin(response):
+    """Hand the client the read pin of a write made by this request"""
+    token = g.pop('db_read_pin', None)
+    if token:
+        max_age = math.ceil(current_app.extensions['db_router'].pin_seconds)
+        response.set_cookie(READ_PIN_COOKIE, token, max_age=max_age, httponly=True, samesite='Lax')
+        response.headers[READ_PIN_HEADER] = token
+    return response
 
 # Database connection context manager
 @contextmanager
-def get_db_cursor():
+def get_db_cursor(readonly=False):
+    """Cursor on the primary; readonly=True lets the router pick a replica"""
+    router = current_app.extensions['db_router']
+    replica = None
+    if readonly and router.enabled and has_request_context() and not is_read_pinned():
+        replica = router.read_connection()
+    if replica is not None:
+        cursor = replica.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            replica.rollback()
+            replica.close()  # back to the pool
+        return
+
     cursor = None
     try:
         cursor = mysql.connection.cursor()
         yield cursor
         mysql.connection.commit()
+        # The client's next reads must see what it just wrote
+        if router.enabled and has_request_context() and request.method != 'GET':
+            g.db_read_pin = router.pin()
     except Exception as e:
         mysql.connection.rollback()
         logger.error(f"Database error: {e}")
@@ -67,6 +149,21 @@ def get_db_cursor():
         if cursor:
             cursor.close()
 
+def get_catalog():
+    """In-memory product_details snapshot, or None to query MySQL instead"""
+    import catalog_snapshot
+
+    if not catalog_snapshot.ENABLED:
+        return None
+    # Clients pinned to the primary after a write must not read an older snapshot
+    if current_app.extensions['db_router'].enabled and is_read_pinned():
+        return None
+    try:
+        return catalog_snapshot.current(lambda: get_db_cursor(readonly=True))
+    except Exception as e:
+        logger.error(f"Catalog snapshot refresh failed: {e}")
+        return None
+
 # Simplified validation functions
 def validate_password_strength(password):
     """Basic password validation"""
@@ -99,7 +196,7 @@ def validate_username(username):
     return True, ""
 
 # Simplified Register Route (No Email Verification)
-@app.route('/register', methods=['POST'])
+@api.route('/register', methods=['POST'])
 def register():
     try:
         data = request.get_json()
@@ -147,7 +244,7 @@ def register():
         return jsonify(message="Registration failed. Please try again."), 500
 
 # Simplified Login Route (No Email Verification Check)
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
 def login():
     try:
         data = request.get_json()
@@ -204,7 +301,7 @@ def login():
         return jsonify(message="Login failed"), 500
 
 # Profile Route
-@app.route('/profile', methods=['GET'])
+@api.route('/profile', methods=['GET'])
 @jwt_required()
 def profile():
     try:
@@ -232,7 +329,7 @@ def profile():
         return jsonify(message="Error fetching profile"), 500
 
 # Update profile route
-@app.route('/profile', methods=['PUT'])
+@api.route('/profile', methods=['PUT'])
 @jwt_required()
 def update_profile():
     try:
@@ -273,7 +370,7 @@ def update_profile():
         return jsonify(message="Profile update failed"), 500
 
 # Change password route
-@app.route('/change-password', methods=['POST'])
+@api.route('/change-password', methods=['POST'])
 @jwt_required()
 def change_password():
     try:
@@ -308,13 +405,13 @@ def change_password():
         logger.error(f"Change password error: {e}")
         return jsonify(message="Password change failed"), 500
 
-@app.route('/logout', methods=['POST'])
+@api.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
     return jsonify(message="Logged out successfully"), 200
 
 # Price Alert Routes
-@app.route('/price-alert', methods=['POST'])
+@api.route('/price-alert', methods=['POST'])
 @jwt_required()
 def set_price_alert():
     try:
@@ -339,7 +436,7 @@ def set_price_alert():
         logger.error(f"Price alert error: {e}")
         return jsonify(message="Failed to set price alert"), 500
 
-@app.route('/price-alerts', methods=['GET'])
+@api.route('/price-alerts', methods=['GET'])
 @jwt_required()
 def get_price_alerts():
     try:
@@ -360,7 +457,7 @@ def get_price_alerts():
         logger.error(f"Get price alerts error: {e}")
         return jsonify(message="Failed to fetch price alerts"), 500
 
-@app.route('/check-price-alerts', methods=['GET'])
+@api.route('/check-price-alerts', methods=['GET'])
 @jwt_required()
 def check_price_alerts():
     try:
@@ -423,7 +520,7 @@ def send_price_drop_email(user_email, product_name, current_price, alert_price):
         logger.error(f"Failed to send price drop email to {user_email}: {e}")
 
 # Product Routes
-@app.route('/products', methods=['GET'])
+@api.route('/products', methods=['GET'])
 def get_products():
     try:
         search_query = request.args.get('search', '')
@@ -436,32 +533,40 @@ def get_products():
 
         offset = (page - 1) * per_page
 
-        with get_db_cursor() as cursor:
-            query = "SELECT * FROM product_details WHERE 1=1"
-            params = []
+        catalog = get_catalog()
+        # LIKE wildcards in the search are left to MySQL
+        if catalog is not None and '%' not in search_query and '_' not in search_query:
+            price_range = (float(min_price), float(max_price)) if min_price and max_price else None
+            positions = catalog.filter(search_query, category if category != 'All' else None, price_range)
+            products = catalog.rows(positions[offset:offset + per_page])
+            total_products = len(catalog)
+        else:
+            with get_db_cursor(readonly=True) as cursor:
+                query = "SELECT * FROM product_details WHERE 1=1"
+                params = []
 
-            if search_query:
-                query += " AND name LIKE %s"
-                params.append(f"%{search_query}%")
+                if search_query:
+                    query += " AND name LIKE %s"
+                    params.append(f"%{search_query}%")
 
-            if category != 'All':
-                query += " AND category = %s"
-                params.append(category)
+                if category != 'All':
+                    query += " AND category = %s"
+                    params.append(category)
 
-            if min_price and max_price:
-                query += " AND price BETWEEN %s AND %s"
-                params.append(min_price)
-                params.append(max_price)
+                if min_price and max_price:
+                    query += " AND price BETWEEN %s AND %s"
+                    params.append(min_price)
+                    params.append(max_price)
 
-            query += " LIMIT %s OFFSET %s"
-            params.extend([per_page, offset])
+                query += " LIMIT %s OFFSET %s"
+                params.extend([per_page, offset])
 
-            cursor.execute(query, tuple(params))
-            products = cursor.fetchall()
+                cursor.execute(query, tuple(params))
+                products = cursor.fetchall()
 
-            cursor.execute("SELECT COUNT(*) FROM product_details")
-            total_products = cursor.fetchone()[0]
-            total_pages = (total_products // per_page) + (1 if total_products % per_page > 0 else 0)
+                cursor.execute("SELECT COUNT(*) FROM product_details")
+                total_products = cursor.fetchone()[0]
+        total_pages = (total_products // per_page) + (1 if total_products % per_page > 0 else 0)
 
         product_list = []
         for product in products:
@@ -489,31 +594,85 @@ def get_products():
         logger.error(f"Get products error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/product/<int:id>/price-history', methods=['GET'])
+@api.route('/product/<int:id>/price-history', methods=['GET'])
 def get_price_history(id):
+    """Price history for a product.
+
+    With ?bucket=hour|day|week (and optional ?from=&to= ISO dates) the history
+    is downsampled server-side into min/max/avg/last per bucket.
+    """
+    import history_archive
+
     try:
-        with get_db_cursor() as cursor:
-            cursor.execute('''
+        bucket = request.args.get('bucket')
+        try:
+            start = datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+            end = datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+        except ValueError:
+            return jsonify({'error': 'from and to must be ISO dates'}), 400
+
+        if bucket:
+            if bucket not in BUCKETS:
+                return jsonify({'error': f"bucket must be one of {', '.join(BUCKETS)}"}), 400
+            start, end = resolve_range(bucket, start, end)
+            with get_db_cursor(readonly=True) as cursor:
+                buckets = query_price_buckets(cursor, id, bucket, start, end)
+
+            # Hour buckets come from raw rows, which are in Parquet once archived
+            cutoff = history_archive.hot_cutoff()
+            if bucket == 'hour' and history_archive.archive_enabled() and start < cutoff:
+                archived = history_archive.archived_price_buckets(id, bucket, start, min(end, cutoff))
+                buckets = history_archive.merge_with_hot_buckets(archived, buckets)
+
+            return jsonify(
+                bucket=bucket,
+                start=start.isoformat(),
+                end=end.isoformat(),
+                price_history=[dict(b, bucket_start=b['bucket_start'].isoformat()) for b in buckets]
+            ), 200
+
+        with get_db_cursor(readonly=True) as cursor:
+            query = '''
                 SELECT price, timestamp
                 FROM price_history
                 WHERE product_id = %s
-                ORDER BY timestamp DESC
-            ''', (id,))
+            '''
+            params = [id]
+            if start:
+                query += " AND timestamp >= %s"
+                params.append(start)
+            if end:
+                query += " AND timestamp < %s"
+                params.append(end)
+            query += " ORDER BY timestamp DESC"
+            cursor.execute(query, tuple(params))
             price_history = cursor.fetchall()
 
         price_history_list = [{'price': record[0], 'timestamp': record[1]} for record in price_history]
+
+        if start and history_archive.archive_enabled() and start < history_archive.hot_cutoff():
+            timestamps, prices = history_archive.load_archived_prices(
+                id, start, min(end or datetime.now(), history_archive.hot_cutoff()))
+            price_history_list += [{'price': float(price), 'timestamp': timestamp}
+                                   for timestamp, price in zip(timestamps[::-1].astype(datetime), prices[::-1])]
         return jsonify(price_history=price_history_list), 200
 
     except Exception as e:
         logger.error(f"Get price history error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/products/<int:id>', methods=['GET'])
+@api.route('/products/<int:id>', methods=['GET'])
 def get_product(id):
     try:
-        with get_db_cursor() as cursor:
-            cursor.execute('SELECT * FROM product_details WHERE id = %s', (id,))
-            product = cursor.fetchone()
+        catalog = get_catalog()
+        position = catalog.find(id) if catalog is not None else None
+        if position is not None:
+            product = catalog.rows([position])[0]
+        else:
+            # Not in the snapshot (yet): ask MySQL
+            with get_db_cursor(readonly=True) as cursor:
+                cursor.execute('SELECT * FROM product_details WHERE id = %s', (id,))
+                product = cursor.fetchone()
 
         if product:
             product_data = {
@@ -535,12 +694,16 @@ def get_product(id):
         logger.error(f"Get product error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/products/category/<string:category>', methods=['GET'])
+@api.route('/products/category/<string:category>', methods=['GET'])
 def get_products_by_category(category):
     try:
-        with get_db_cursor() as cursor:
-            cursor.execute('SELECT * FROM product_details WHERE category = %s', (category,))
-            products = cursor.fetchall()
+        catalog = get_catalog()
+        if catalog is not None:
+            products = catalog.rows(catalog.category_rows(category))
+        else:
+            with get_db_cursor(readonly=True) as cursor:
+                cursor.execute('SELECT * FROM product_details WHERE category = %s', (category,))
+                products = cursor.fetchall()
 
         product_list = []
         for product in products:
@@ -563,7 +726,7 @@ def get_products_by_category(category):
         logger.error(f"Get products by category error: {e}")
         return jsonify({'error': str(e)}), 500
     
-@app.route('/products/similar-tvs', methods=['GET'])
+@api.route('/products/similar-tvs', methods=['GET'])
 def get_similar_tvs():
     try:
         size = request.args.get('size')
@@ -572,44 +735,54 @@ def get_similar_tvs():
         
         print(f"Finding similar products - Size: {size}, Exclude: {exclude_id}, Category: {category}")
         
-        with get_db_cursor() as cursor:
-            if size and category == 'TV':
-                # Size-based TV matching
-                cursor.execute('''
-                    SELECT DISTINCT id, name, price, old_price, availability, images, company, ProductURL, category
-                    FROM product_details 
-                    WHERE category = %s 
-                    AND id != %s 
-                    AND (
-                        name LIKE %s OR name LIKE %s OR name LIKE %s OR
-                        name LIKE %s OR name LIKE %s OR name LIKE %s
-                    )
-                    ORDER BY 
-                        CASE WHEN company != (SELECT company FROM product_details WHERE id = %s) THEN 0 ELSE 1 END,
-                        ABS(price - (SELECT price FROM product_details WHERE id = %s)) ASC
-                    LIMIT 8
-                ''', (
-                    category, exclude_id,
-                    f'{size}" %', f'%{size} inch%', f'%{size}"%',
-                    f'%{size}-inch%', f'%{size}inch%', f'%{size} in%',
-                    exclude_id, exclude_id
-                ))
-            else:
-                # Category-based matching for non-TVs
-                cursor.execute('''
-                    SELECT DISTINCT id, name, price, old_price, availability, images, company, ProductURL, category
-                    FROM product_details 
-                    WHERE category = %s 
-                    AND id != %s
-                    ORDER BY 
-                        CASE WHEN company != (SELECT company FROM product_details WHERE id = %s) THEN 0 ELSE 1 END,
-                        ABS(price - (SELECT price FROM product_details WHERE id = %s)) ASC
-                    LIMIT 8
-                ''', (category, exclude_id, exclude_id, exclude_id))
+        catalog = get_catalog()
+        ref_position = None
+        if catalog is not None and not (size and category == 'TV') and exclude_id and exclude_id.isdigit():
+            ref_position = catalog.find(int(exclude_id))
+
+        if ref_position is not None:
+            # Category-based matching from the in-memory catalog
+            products = catalog.rows(catalog.similar_by_company(category, ref_position, 8))
+        else:
+            with get_db_cursor(readonly=True) as cursor:
+                if size and category == 'TV':
+                    # Size-based TV matching
+                    cursor.execute('''
+                        SELECT DISTINCT id, name, price, old_price, availability, images, company, ProductURL, category
+                        FROM product_details 
+                        WHERE category = %s 
+                        AND id != %s 
+                        AND (
+                            name LIKE %s OR name LIKE %s OR name LIKE %s OR
+                            name LIKE %s OR name LIKE %s OR name LIKE %s
+                        )
+                        ORDER BY 
+                            CASE WHEN company != (SELECT company FROM product_details WHERE id = %s) THEN 0 ELSE 1 END,
+                            ABS(price - (SELECT price FROM product_details WHERE id = %s)) ASC
+                        LIMIT 8
+                    ''', (
+                        category, exclude_id,
+                        f'{size}" %', f'%{size} inch%', f'%{size}"%',
+                        f'%{size}-inch%', f'%{size}inch%', f'%{size} in%',
+                        exclude_id, exclude_id
+                    ))
+                else:
+                    # Category-based matching for non-TVs
+                    cursor.execute('''
+                        SELECT DISTINCT id, name, price, old_price, availability, images, company, ProductURL, category
+                        FROM product_details 
+                        WHERE category = %s 
+                        AND id != %s
+                        ORDER BY 
+                            CASE WHEN company != (SELECT company FROM product_details WHERE id = %s) THEN 0 ELSE 1 END,
+                            ABS(price - (SELECT price FROM product_details WHERE id = %s)) ASC
+                        LIMIT 8
+                    ''', (category, exclude_id, exclude_id, exclude_id))
             
-            products = cursor.fetchall()
-            print(f"Found {len(products)} similar products")
+                products = cursor.fetchall()
             
+        print(f"Found {len(products)} similar products")
+
         # Format response with explicit column mapping
         product_list = []
         for product in products:
@@ -641,7 +814,7 @@ def get_similar_tvs():
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/products/similar', methods=['GET'])
+@api.route('/products/similar', methods=['GET'])
 def get_similar_products():
     try:
         product_id = request.args.get('productId')
@@ -650,94 +823,108 @@ def get_similar_products():
         if not product_id:
             return jsonify({'error': 'Product ID required'}), 400
 
-        with get_db_cursor() as cursor:
-            # Get the reference product details
-            cursor.execute('''
-                SELECT id, name, price, old_price, availability, images, company, ProductURL, category, created_at
-                FROM product_details
-                WHERE id = %s
-            ''', (product_id,))
-            
-            ref_product = cursor.fetchone()
-            if not ref_product:
-                return jsonify({'error': 'Product not found'}), 404
+        catalog = get_catalog()
+        ref_position = ref_product = None
+        if catalog is not None and product_id.isdigit():
+            ref_position = catalog.find(int(product_id))
+            if ref_position is not None:
+                ref_product = catalog.rows([ref_position])[0]
 
+        # Nearest prices from the in-memory catalog; unpriced references go to MySQL
+        if ref_product is not None and ref_product[2] is not None:
             ref_price = float(ref_product[2])
             ref_category = ref_product[8]
             ref_company = ref_product[6]
+            products = catalog.rows(catalog.similar_products(ref_position, limit))
+        else:
+            with get_db_cursor(readonly=True) as cursor:
+                # Get the reference product details
+                cursor.execute('''
+                    SELECT id, name, price, old_price, availability, images, company, ProductURL, category, created_at
+                    FROM product_details
+                    WHERE id = %s
+                ''', (product_id,))
+            
+                ref_product = cursor.fetchone()
+                if not ref_product:
+                    return jsonify({'error': 'Product not found'}), 404
 
-            # First try: Different companies, same category, similar price range
-            cursor.execute('''
-                SELECT id, name, price, old_price, availability, images, company, ProductURL, category, created_at
-                FROM product_details
-                WHERE category = %s
-                AND id != %s
-                AND company != %s
-                AND price IS NOT NULL
-                AND price > 0
-                AND price BETWEEN %s AND %s
-                ORDER BY ABS(price - %s) ASC
-                LIMIT %s
-            ''', (
-                ref_category,
-                product_id,
-                ref_company,
-                ref_price * 0.5,  # 50% lower
-                ref_price * 2.0,  # 100% higher
-                ref_price,
-                limit
-            ))
+                ref_price = float(ref_product[2])
+                ref_category = ref_product[8]
+                ref_company = ref_product[6]
 
-            products = cursor.fetchall()
-            
-            # If we don't have enough products, expand the search
-            if len(products) < limit:
-                remaining_limit = limit - len(products)
-                existing_ids = [str(p[0]) for p in products] + [str(product_id)]
-                
+                # First try: Different companies, same category, similar price range
                 cursor.execute('''
                     SELECT id, name, price, old_price, availability, images, company, ProductURL, category, created_at
                     FROM product_details
                     WHERE category = %s
-                    AND id NOT IN ({})
+                    AND id != %s
                     AND company != %s
                     AND price IS NOT NULL
                     AND price > 0
+                    AND price BETWEEN %s AND %s
                     ORDER BY ABS(price - %s) ASC
                     LIMIT %s
-                '''.format(','.join(['%s'] * len(existing_ids))), 
-                (ref_category, *existing_ids, ref_company, ref_price, remaining_limit))
+                ''', (
+                    ref_category,
+                    product_id,
+                    ref_company,
+                    ref_price * 0.5,  # 50% lower
+                    ref_price * 2.0,  # 100% higher
+                    ref_price,
+                    limit
+                ))
+
+                products = cursor.fetchall()
+            
+                # If we don't have enough products, expand the search
+                if len(products) < limit:
+                    remaining_limit = limit - len(products)
+                    existing_ids = [str(p[0]) for p in products] + [str(product_id)]
                 
-                additional_products = cursor.fetchall()
-                products.extend(additional_products)
-
-            # Format response
-            product_list = []
-            for product in products:
-                product_data = {
-                    'id': product[0],
-                    'name': product[1],
-                    'price': float(product[2]),
-                    'old_price': float(product[3]) if product[3] else None,
-                    'availability': product[4],
-                    'images': product[5],
-                    'company': product[6],
-                    'ProductURL': product[7],
-                    'category': product[8],
-                    'created_at': product[9]
-                }
-                product_list.append(product_data)
-
-            return jsonify({
-                'products': product_list,
-                'count': len(product_list),
-                'reference_product': {
-                    'id': ref_product[0],
-                    'price': ref_price,
-                    'category': ref_category,
-                    'company': ref_company
-                }
-            }), 200
+                    cursor.execute('''
+                        SELECT id, name, price, old_price, availability, images, company, ProductURL, category, created_at
+                        FROM product_details
+                        WHERE category = %s
+                        AND id NOT IN ({})
+                        AND company != %s
+                        AND price IS NOT NULL
+                        AND price > 0
+                        ORDER BY ABS(price - %s) ASC
+                        LIMIT %s
+                    '''.format(','.join(['%s'] * len(existing_ids))), 
+                    (ref_category, *existing_ids, ref_company, ref_price, remaining_limit))
+                
+                    additional_products = cursor.fetchall()
+                    products.extend(additional_products)
+
+        # Format response
+        product_list = []
+        for product in products:
+            product_data = {
+                'id': product[0],
+                'name': product[1],
+                'price': float(product[2]),
+                'old_price': float(product[3]) if product[3] else None,
+                'availability': product[4],
+                'images': product[5],
+                'company': product[6],
+                'ProductURL': product[7],
+                'category': product[8],
+                'created_at': product[9]
+            }
+            product_list.append(product_data)
+
+        return jsonify({
+            'products': product_list,
+            'count': len(product_list),
+            'reference_product': {
+                'id': ref_product[0],
+                'price': ref_price,
+                'category': ref_category,
+                'company': ref_company
+            }
+        }), 200
 
     except Exception as e:
         logger.error(f"Similar products fetch error: {e}")
@@ -750,7 +937,7 @@ def get_similar_products():
 
 
 
-@app.route('/products', methods=['POST'])
+@api.route('/products', methods=['POST'])
 def add_product():
     try:
         data = request.get_json()
@@ -769,6 +956,9 @@ def add_product():
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             ''', (name, price, old_price, availability, images, company, ProductURL, category))
 
+        # The next catalog read picks up the new product
+        import catalog_snapshot
+        catalog_snapshot.invalidate()
         return jsonify({'message': 'Product added successfully'}), 201
 
     except Exception as e:
@@ -777,21 +967,29 @@ def add_product():
     
 
 
-@app.route('/api/competitors', methods=['GET'])
+@api.route('/api/competitors', methods=['GET'])
 @jwt_required()
 def get_competitors():
     """Get all competitors with statistics"""
     try:
-        with get_db_cursor() as cursor:
+        with get_db_cursor(readonly=True) as cursor:
             cursor.execute('''
                 SELECT c.*, 
                        COUNT(cp.id) as tracked_products,
                        AVG(cph.price) as avg_competitor_price,
-                       MAX(cph.scraped_at) as last_price_update
+                       MAX(GREATEST(cph.valid_to, COALESCE(cp.last_checked_at, cph.valid_to))) as last_price_update
                 FROM competitors c
                 LEFT JOIN competitor_products cp ON c.id = cp.competitor_id AND cp.is_active = TRUE
+                LEFT JOIN (
+                    SELECT competitor_product_id, MAX(id) AS id
+                    FROM competitor_price_history
+                    GROUP BY competitor_product_id
+                ) latest ON latest.competitor_product_id = cp.id
+                -- The open (latest) interval runs until the mapping was last checked
                 LEFT JOIN competitor_price_history cph ON cp.id = cph.competitor_product_id 
-                    AND cph.scraped_at >= DATE_SUB(NOW(), INTERVAL 7 DAY)
+                    AND IF(cph.id = latest.id,
+                           GREATEST(cph.valid_to, COALESCE(cp.last_checked_at, cph.valid_to)),
+                           cph.valid_to) >= DATE_SUB(NOW(), INTERVAL 7 DAY)
                 WHERE c.status = 'active'
                 GROUP BY c.id
                 ORDER BY c.name
@@ -822,7 +1020,7 @@ def get_competitors():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/competitors', methods=['POST'])
+@api.route('/api/competitors', methods=['POST'])
 @jwt_required()
 def add_competitor():
     """Add a new competitor"""
@@ -855,88 +1053,293 @@ def add_competitor():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/products/<int:product_id>/competitors', methods=['GET'])
+PRODUCT_QUERY = '''
+    SELECT id, name, price, company, category
+    FROM product_details 
+    WHERE id = %s
+'''
+
+PRODUCT_COMPETITORS_QUERY = '''
+    SELECT c.id, c.name, c.website_url,
+           cp.competitor_sku, cp.competitor_url, cp.product_name,
+           cph.price, cph.old_price, cph.availability,
+           GREATEST(cph.valid_to, COALESCE(cp.last_checked_at, cph.valid_to))
+    FROM competitors c
+    JOIN competitor_products cp ON c.id = cp.competitor_id
+    LEFT JOIN competitor_price_history cph ON cp.id = cph.competitor_product_id
+    WHERE cp.product_id = %s AND cp.is_active = TRUE
+    AND (cph.id IS NULL OR cph.id = (
+        SELECT MAX(id) FROM competitor_price_history 
+        WHERE competitor_product_id = cp.id
+    ))
+    ORDER BY c.name
+'''
+
+@api.route('/api/products/<int:product_id>/competitors', methods=['GET'])
 @jwt_required()
 def get_product_competitors(product_id):
     """Get competitor prices for a specific product"""
     try:
         with get_db_cursor() as cursor:
             # Get our product details
-            cursor.execute('''
-                SELECT id, name, price, company, category
-                FROM product_details 
-                WHERE id = %s
-            ''', (product_id,))
+            cursor.execute(PRODUCT_QUERY, (product_id,))
             
             product = cursor.fetchone()
             if not product:
                 return jsonify({'error': 'Product not found'}), 404
             
             # Get competitor data with latest prices
-            cursor.execute('''
-                SELECT c.id, c.name, c.website_url,
-                       cp.competitor_sku, cp.competitor_url, cp.product_name,
-                       cph.price, cph.old_price, cph.availability, cph.scraped_at
-                FROM competitors c
-                JOIN competitor_products cp ON c.id = cp.competitor_id
-                LEFT JOIN competitor_price_history cph ON cp.id = cph.competitor_product_id
-                WHERE cp.product_id = %s AND cp.is_active = TRUE
-                AND (cph.id IS NULL OR cph.id = (
-                    SELECT MAX(id) FROM competitor_price_history 
-                    WHERE competitor_product_id = cp.id
-                ))
-                ORDER BY c.name
-            ''', (product_id,))
+            cursor.execute(PRODUCT_COMPETITORS_QUERY, (product_id,))
             
             competitors = cursor.fetchall()
         
-        # Format response
-        our_product = {
-            'id': product[0],
-            'name': product[1],
-            'price': float(product[2]),
-            'company': product[3],
-            'category': product[4]
-        }
-        
-        competitor_data = []
-        for comp in competitors:
-            competitor_data.append({
-                'competitor_id': comp[0],
-                'competitor_name': comp[1],
-                'website_url': comp[2],
-                'competitor_sku': comp[3],
-                'competitor_url': comp[4],
-                'product_name': comp[5],
-                'current_price': float(comp[6]) if comp[6] else None,
-                'old_price': float(comp[7]) if comp[7] else None,
-                'availability': comp[8],
-                'last_updated': comp[9].isoformat() if comp[9] else None,
-                'price_difference': float(comp[6] - product[2]) if comp[6] else None,
-                'price_difference_percentage': round(((comp[6] - product[2]) / product[2]) * 100, 2) if comp[6] else None
-            })
-        
-        # Calculate market analysis
-        competitor_prices = [c['current_price'] for c in competitor_data if c['current_price']]
-        market_analysis = {
-            'total_competitors': len(competitor_data),
-            'cheaper_options': len([c for c in competitor_data if c['current_price'] and c['current_price'] < our_product['price']]),
-            'more_expensive': len([c for c in competitor_data if c['current_price'] and c['current_price'] > our_product['price']]),
-            'lowest_competitor_price': min(competitor_prices) if competitor_prices else None,
-            'highest_competitor_price': max(competitor_prices) if competitor_prices else None,
-            'average_competitor_price': sum(competitor_prices) / len(competitor_prices) if competitor_prices else None
-        }
+        return jsonify(build_product_competitors(product, competitors)), 200
         
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def build_product_competitors(product, competitors):
+    """Response body for one product and its PRODUCT_COMPETITORS_QUERY rows"""
+    import numpy as np
+    import market_analysis as market_analysis_engine
+
+    our_product = {
+        'id': product[0],
+        'name': product[1],
+        'price': float(product[2]),
+        'company': product[3],
+        'category': product[4]
+    }
+    
+    # Market statistics and price differences from the vectorized engine
+    row_products = np.zeros(len(competitors), dtype='int64')
+    prices = np.array([float(comp[6]) if comp[6] is not None else np.nan for comp in competitors], dtype='float64')
+    differences, percentages = market_analysis_engine.price_differences([our_product['price']], row_products, prices)
+    market_analysis = market_analysis_engine.analyze([our_product['price']], row_products, prices)[0]
+
+    competitor_data = [format_competitor_row(comp, difference, percentage)
+                       for comp, difference, percentage in zip(competitors, differences, percentages)]
+    
+    return {
+        'our_product': our_product,
+        'competitors': competitor_data,
+        'market_analysis': market_analysis
+    }
+
+def fetch_latest_competitor_prices(cursor, product_filter, params):
+    """Our products plus the latest price of each active competitor mapping,
+    in a single set-based query.
+
+    product_filter is a WHERE clause over product_details p. Returns
+    (products, rows): products are (id, name, price, company, category) and
+    rows are (product_id, competitor_id, competitor_name, website_url,
+    competitor_sku, competitor_url, product_name, price, old_price,
+    availability, last_updated).
+    """
+    cursor.execute(f'''
+        SELECT p.id, p.name, p.price, p.company, p.category,
+               c.id, c.name, c.website_url,
+               cp.competitor_sku, cp.competitor_url, cp.product_name,
+               cph.price, cph.old_price, cph.availability,
+               GREATEST(cph.valid_to, COALESCE(cp.last_checked_at, cph.valid_to))
+        FROM product_details p
+        LEFT JOIN competitor_products cp ON cp.product_id = p.id AND cp.is_active = TRUE
+        LEFT JOIN competitors c ON c.id = cp.competitor_id
+        LEFT JOIN (
+            SELECT competitor_product_id, MAX(id) AS id
+            FROM competitor_price_history
+            WHERE competitor_product_id IN (
+                SELECT cp.id FROM competitor_products cp
+                JOIN product_details p ON p.id = cp.product_id
+                WHERE cp.is_active = TRUE AND {product_filter}
+            )
+            GROUP BY competitor_product_id
+        ) latest ON latest.competitor_product_id = cp.id
+        LEFT JOIN competitor_price_history cph ON cph.id = latest.id
+        WHERE {product_filter}
+        ORDER BY p.id, c.name
+    ''', tuple(params) * 2)
+
+    products = []
+    rows = []
+    for record in cursor.fetchall():
+        if not products or products[-1][0] != record[0]:
+            products.append(record[:5])
+        if record[5] is not None:
+            rows.append((record[0],) + record[5:])
+    return products, rows
+
+def format_competitor_row(comp, difference, percentage):
+    """Response entry for a (competitor_id, ..., last_updated) row"""
+    return {
+        'competitor_id': comp[0],
+        'competitor_name': comp[1],
+        'website_url': comp[2],
+        'competitor_sku': comp[3],
+        'competitor_url': comp[4],
+        'product_name': comp[5],
+        'current_price': float(comp[6]) if comp[6] else None,
+        'old_price': float(comp[7]) if comp[7] else None,
+        'availability': comp[8],
+        'last_updated': comp[9].isoformat() if comp[9] else None,
+        'price_difference': float(difference) if comp[6] else None,
+        'price_difference_percentage': float(percentage) if comp[6] and not math.isnan(percentage) else None
+    }
+
+MAX_BATCH_PRODUCTS = 200
+
+@api.route('/api/products/competitors:batch', methods=['POST'])
+@jwt_required()
+def get_products_competitors_batch():
+    """Competitor prices and market analysis for many products in one request.
+
+    Body: {"product_ids": [1, 2, ...]}. The response is keyed by product id
+    and streamed one product at a time.
+    """
+    import numpy as np
+    import market_analysis as market_analysis_engine
+
+    try:
+        data = request.get_json() or {}
+        product_ids = data.get('product_ids')
+        if not isinstance(product_ids, list) or not product_ids:
+            return jsonify({'error': 'product_ids must be a non-empty list'}), 400
+        if len(product_ids) > MAX_BATCH_PRODUCTS:
+            return jsonify({'error': f'At most {MAX_BATCH_PRODUCTS} product_ids per request'}), 400
+        try:
+            product_ids = list(dict.fromkeys(int(pid) for pid in product_ids))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'product_ids must be integers'}), 400
+
+        placeholders = ','.join(['%s'] * len(product_ids))
+        with get_db_cursor() as cursor:
+            products, rows = fetch_latest_competitor_prices(cursor, f'p.id IN ({placeholders})', product_ids)
+
+        positions = {product[0]: i for i, product in enumerate(products)}
+        our_prices = np.array([float(product[2]) if product[2] is not None else np.nan for product in products])
+        row_products = np.array([positions[row[0]] for row in rows], dtype='int64')
+        prices = np.array([float(row[7]) if row[7] is not None else np.nan for row in rows], dtype='float64')
+        analyses = market_analysis_engine.analyze(our_prices, row_products, prices)
+        differences, percentages = market_analysis_engine.price_differences(our_prices, row_products, prices)
+
+        rows_by_product = {}
+        for row, difference, percentage in zip(rows, differences, percentages):
+            rows_by_product.setdefault(row[0], []).append(format_competitor_row(row[1:], difference, percentage))
+
+        not_found = [pid for pid in product_ids if pid not in positions]
+
+        def generate():
+            # Encode and send one product at a time instead of building the whole body
+            yield '{"products": {'
+            for i, (product, analysis) in enumerate(zip(products, analyses)):
+                entry = {
+                    'our_product': {
+                        'id': product[0],
+                        'name': product[1],
+                        'price': float(product[2]) if product[2] is not None else None,
+                        'company': product[3],
+                        'category': product[4]
+                    },
+                    'competitors': rows_by_product.get(product[0], []),
+                    'market_analysis': analysis
+                }
+                yield (',' if i else '') + json.dumps(str(product[0])) + ': ' + json.dumps(entry)
+            yield '}, "not_found": ' + json.dumps(not_found) + '}'
+
+        return Response(generate(), mimetype='application/json'), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/categories/<string:category>/market-analysis', methods=['GET'])
+@jwt_required()
+def get_category_market_analysis(category):
+    """Market analysis for every product in a category in one call"""
+    import numpy as np
+    import market_analysis as market_analysis_engine
+
+    try:
+        with get_db_cursor() as cursor:
+            products, rows = fetch_latest_competitor_prices(cursor, 'p.category = %s', (category,))
+
+        positions = {product[0]: i for i, product in enumerate(products)}
+        our_prices = np.array([float(product[2]) if product[2] is not None else np.nan for product in products])
+        row_products = np.array([positions[row[0]] for row in rows], dtype='int64')
+        prices = np.array([float(row[7]) if row[7] is not None else np.nan for row in rows], dtype='float64')
+        analyses = market_analysis_engine.analyze(our_prices, row_products, prices)
+
         return jsonify({
-            'our_product': our_product,
-            'competitors': competitor_data,
-            'market_analysis': market_analysis
+            'category': category,
+            'summary': market_analysis_engine.summarize(analyses),
+            'products': [{
+                'id': product[0],
+                'name': product[1],
+                'price': float(product[2]) if product[2] is not None else None,
+                'company': product[3],
+                'market_analysis': analysis
+            } for product, analysis in zip(products, analyses)]
         }), 200
-        
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/products/<int:product_id>/competitors', methods=['POST'])
+@api.route('/api/competitor-products/<int:competitor_product_id>/price-history', methods=['GET'])
+@jwt_required()
+def get_competitor_price_history(competitor_product_id):
+    """Competitor price history, expanded from change intervals into a time series"""
+    import history_archive
+
+    try:
+        days = request.args.get('days', 30, type=int)
+        step_hours = request.args.get('stepHours', 6, type=int)
+        end = datetime.now()
+        start = end - timedelta(days=days)
+
+        with get_db_cursor() as cursor:
+            # The open (latest) interval runs until the mapping was last checked
+            cursor.execute('''
+                SELECT cph.price, cph.old_price, cph.availability, cph.valid_from,
+                       IF(cph.id = latest.id,
+                          GREATEST(cph.valid_to, COALESCE(cp.last_checked_at, cph.valid_to)),
+                          cph.valid_to)
+                FROM competitor_price_history cph
+                JOIN competitor_products cp ON cp.id = cph.competitor_product_id
+                JOIN (
+                    SELECT MAX(id) AS id FROM competitor_price_history WHERE competitor_product_id = %s
+                ) latest
+                WHERE cph.competitor_product_id = %s AND cph.valid_from <= %s
+                AND (cph.valid_to >= %s OR cph.id = latest.id)
+                ORDER BY cph.valid_from
+            ''', (competitor_product_id, competitor_product_id, end, start))
+            intervals = [row for row in cursor.fetchall() if row[4] >= start]
+
+            use_archive = history_archive.archive_enabled() and start < history_archive.hot_cutoff()
+            if use_archive:
+                # The archive is partitioned by retailer
+                cursor.execute('SELECT competitor_id FROM competitor_products WHERE id = %s', (competitor_product_id,))
+                mapping = cursor.fetchone()
+
+        if use_archive:
+            intervals = history_archive.load_archived_intervals(
+                competitor_product_id, start, end, competitor_id=mapping[0] if mapping else None) + intervals
+
+        points = expand_price_history(intervals, step=timedelta(hours=max(step_hours, 1)), start=start, end=end)
+        return jsonify({
+            'competitor_product_id': competitor_product_id,
+            'intervals': [{
+                'price': float(row[0]) if row[0] is not None else None,
+                'old_price': float(row[1]) if row[1] is not None else None,
+                'availability': row[2],
+                'valid_from': row[3].isoformat(),
+                'valid_to': row[4].isoformat()
+            } for row in intervals],
+            'price_history': [dict(point, timestamp=point['timestamp'].isoformat()) for point in points]
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/products/<int:product_id>/competitors', methods=['POST'])
 @jwt_required()
 def add_product_competitor(product_id):
     """Add competitor tracking for a product"""
@@ -973,19 +1376,24 @@ def add_product_competitor(product_id):
             
             mapping_id = cursor.lastrowid
         
-        # Trigger immediate price scraping
-        scrape_competitor_price_sync(mapping_id)
+        # Scrape the first price in the background
+        job, _ = get_scrape_jobs().enqueue(mapping_id)
         
         return jsonify({
             'message': 'Competitor tracking added successfully',
-            'mapping_id': mapping_id
+            'mapping_id': mapping_id,
+            'scrape_job_id': job.id
         }), 201
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 def scrape_competitor_price_sync(competitor_product_id):
-    """Synchronously scrape price for a competitor product"""
+    """Synchronously scrape price for a competitor product.
+
+    Returns the stored price data, or None when nothing could be scraped.
+    No cursor is held while the page is being fetched.
+    """
     try:
         with get_db_cursor() as cursor:
             # Get competitor product details
@@ -997,51 +1405,59 @@ def scrape_competitor_price_sync(competitor_product_id):
             ''', (competitor_product_id,))
             
             result = cursor.fetchone()
-            if not result:
-                return False
-            
-            _, competitor_url, competitor_name = result
-            
-            # Scrape the price
-            price_data = scraper.scrape_competitor_price(competitor_url, competitor_name)
-            
-            if price_data:
-                # Store the price data
-                cursor.execute('''
-                    INSERT INTO competitor_price_history 
-                    (competitor_product_id, price, old_price, availability, scraped_at)
-                    VALUES (%s, %s, %s, %s, %s)
-                ''', (
-                    competitor_product_id,
-                    price_data['price'],
-                    price_data['old_price'],
-                    price_data['availability'],
-                    price_data['scraped_at']
-                ))
-                
-                print(f"Price scraped successfully for competitor product {competitor_product_id}: Rs. {price_data['price']}")
-                return True
-            
-            return False
-            
+        if not result:
+            return None
+        
+        _, competitor_url, competitor_name = result
+        
+        # Scrape the price
+        price_data = get_scraper().scrape_competitor_price(competitor_url, competitor_name)
+        if not price_data:
+            return None
+        
+        with get_db_cursor() as cursor:
+            # Store the price data (extends the current interval if unchanged)
+            record_competitor_price(cursor, competitor_product_id, price_data)
+        
+        print(f"Price scraped successfully for competitor product {competitor_product_id}: Rs. {price_data['price']}")
+        return job_result(price_data)
+        
     except Exception as e:
         print(f"Error scraping competitor price: {e}")
-        return False
+        return None
+
+def run_scrape_job(app, competitor_product_id):
+    # Job threads have no request, so give them their own app context (and DB connection)
+    with app.app_context():
+        return scrape_competitor_price_sync(competitor_product_id)
 
-@app.route('/api/scrape/competitor/<int:competitor_product_id>', methods=['POST'])
+@api.route('/api/scrape/competitor/<int:competitor_product_id>', methods=['POST'])
 @jwt_required()
 def manual_scrape_competitor(competitor_product_id):
-    """Manually trigger price scraping for a competitor product"""
+    """Queue price scraping for a competitor product"""
     try:
-        success = scrape_competitor_price_sync(competitor_product_id)
+        job, created = get_scrape_jobs().enqueue(competitor_product_id)
         
-        if success:
-            return jsonify({'message': 'Price scraped successfully'}), 200
-        else:
-            return jsonify({'error': 'Failed to scrape price'}), 500
+        return jsonify({
+            'message': 'Scrape queued' if created else 'Scrape already in progress',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/scrape/jobs/{job.id}'
+        }), 202
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@api.route('/api/scrape/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_scrape_job(job_id):
+    """Report status and result of a queued scrape"""
+    job = get_scrape_jobs().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True)
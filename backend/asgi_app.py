@@ -0,0 +1,430 @@
+"""ASGI deployment of the API.
+
+The product competitor overview and the scrape endpoints are served by
+native async handlers (aiomysql for the database, httpx for fetching
+competitor pages), so a slow query or page fetch only parks a coroutine
+instead of a worker. Every other route falls through to the existing Flask
+app, mounted as WSGI, so the full API keeps working unchanged. That
+includes the /products catalog routes, which Flask answers from the
+in-memory catalog snapshot, and every read the replica router may send to a
+MySQL replica (see db_routing.py), read-your-writes pin included; the
+aiomysql pool here only talks to the primary.
+
+Scrape jobs (native and Flask-queued) live in this process's memory, so a
+status poll has to reach the process that queued the job. The app therefore
+runs as a single process: at startup it takes a MySQL named lock for its
+database, and a second process, e.g. another uvicorn worker, refuses to
+start. Concurrency comes from the event loop, not from workers.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import contextlib
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import aiomysql
+import httpx
+import jwt as pyjwt
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from app import app as flask_app, get_scraper, READ_PIN_HEADER
+from app import PRODUCT_QUERY, PRODUCT_COMPETITORS_QUERY, build_product_competitors
+from competitor_scraper import parse_competitor_price
+from price_history_store import mapping_state_query, latest_rows_query, plan_observation_writes
+from recheck_schedule import UPDATE_SCHEDULE_SQL, plan_schedule_updates
+from scrape_jobs import ScrapeJob, job_result, prune_finished_jobs
+from scrape_resilience import CircuitOpenError, TransientScrapeError, GONE_STATUS_CODES, TRANSIENT_STATUS_CODES
+from url_utils import normalize_url
+
+
+class FlaskJSONResponse(JSONResponse):
+    """Serialise like Flask's jsonify (Decimal, datetime, sorted keys)"""
+
+    def render(self, content):
+        return flask_app.json.dumps(content).encode('utf-8')
+
+
+def error(message, status_code):
+    return FlaskJSONResponse({'error': message}, status_code=status_code)
+
+
+class AuthError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def require_jwt(request):
+    """Verify a flask_jwt_extended access token and return its identity"""
+    header = request.headers.get('Authorization')
+    if not header:
+        raise AuthError('Missing Authorization Header', 401)
+    scheme, _, token = header.partition(' ')
+    if scheme != 'Bearer' or not token:
+        raise AuthError("Bad Authorization header. Expected 'Authorization: Bearer <JWT>'", 422)
+    try:
+        claims = pyjwt.decode(token, flask_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+    except pyjwt.ExpiredSignatureError:
+        raise AuthError('Token has expired', 401)
+    except pyjwt.InvalidTokenError as e:
+        raise AuthError(str(e), 422)
+    if claims.get('type') != 'access':
+        raise AuthError('Only non-refresh tokens are allowed', 422)
+    return claims.get('sub')
+
+
+def jwt_required(handler):
+    async def wrapper(request):
+        try:
+            require_jwt(request)
+        except AuthError as e:
+            # Same body shape as flask_jwt_extended
+            return FlaskJSONResponse({'msg': str(e)}, status_code=e.status_code)
+        return await handler(request)
+    return wrapper
+
+
+async def fetch_rows(request, sql, params=(), one=False):
+    async with request.app.state.db.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(sql, params)
+            return await (cursor.fetchone() if one else cursor.fetchall())
+
+
+@jwt_required
+async def get_product_competitors(request):
+    try:
+        product_id = request.path_params['product_id']
+        product = await fetch_rows(request, PRODUCT_QUERY, (product_id,), one=True)
+        if not product:
+            return error('Product not found', 404)
+        competitors = await fetch_rows(request, PRODUCT_COMPETITORS_QUERY, (product_id,))
+        return FlaskJSONResponse(build_product_competitors(product, competitors))
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+def is_transient_http_error(e):
+    if isinstance(e, (TransientScrapeError, httpx.TransportError)):
+        return True
+    return isinstance(e, httpx.HTTPStatusError) and e.response.status_code in TRANSIENT_STATUS_CODES
+
+
+def is_gone_http_error(e):
+    return isinstance(e, httpx.HTTPStatusError) and e.response.status_code in GONE_STATUS_CODES
+
+
+class AsyncScraper:
+    """Async counterpart of CompetitorScraper.scrape_competitor_price.
+
+    Shares the sync scraper's retry policy, circuit breaker and set of gone
+    (404/410) URLs, so host and page health are the same whichever server
+    fetched. Concurrent fetches of the same URL share one request, and a
+    price scraped within fresh_seconds is reused without touching the network.
+    """
+
+    MAX_RECENT = 1024
+
+    def __init__(self, client, retry_policy, circuit_breaker, fresh_seconds=0, gone=None):
+        self.client = client
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.fresh_seconds = fresh_seconds
+        self.gone = set() if gone is None else gone
+        self._in_flight = {}
+        self._recent = {}
+
+    async def _fetch(self, url):
+        response = await self.client.get(url)
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            raise TransientScrapeError(f"HTTP {response.status_code} from {url}")
+        response.raise_for_status()
+        return response.content
+
+    async def fetch_with_retry(self, url):
+        host = self.circuit_breaker.host_for(url)
+        if not self.circuit_breaker.allow(host):
+            raise CircuitOpenError(f"Circuit open for {host}")
+        attempt = 1
+        while True:
+            try:
+                content = await self._fetch(url)
+                break
+            except Exception as e:
+                if attempt < self.retry_policy.max_attempts and is_transient_http_error(e):
+                    await asyncio.sleep(self.retry_policy.backoff(attempt))
+                    attempt += 1
+                    continue
+                if is_transient_http_error(e):
+                    self.circuit_breaker.record_failure(host)
+                else:
+                    self.circuit_breaker.record_success(host)
+                raise
+        self.circuit_breaker.record_success(host)
+        return content
+
+    async def _scrape(self, url):
+        # Politeness delay, as in the sync scraper; it no longer ties up a worker
+        await asyncio.sleep(random.uniform(2, 5))
+        try:
+            content = await self.fetch_with_retry(url)
+        except Exception as e:
+            if is_gone_http_error(e):
+                self.gone.add(normalize_url(url))
+            raise
+        self.gone.discard(normalize_url(url))
+        # BeautifulSoup parsing is CPU-bound, keep it off the event loop
+        return await asyncio.to_thread(parse_competitor_price, content, url)
+
+    def _done(self, key, task):
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None or not task.result() or self.fresh_seconds <= 0:
+            return
+        now = time.monotonic()
+        self._recent[key] = (now, task.result())
+        if len(self._recent) > self.MAX_RECENT:
+            for stale in [k for k, (at, _) in self._recent.items() if now - at >= self.fresh_seconds]:
+                del self._recent[stale]
+
+    async def scrape_competitor_price(self, url):
+        key = normalize_url(url)
+        recent = self._recent.get(key)
+        if recent and time.monotonic() - recent[0] < self.fresh_seconds:
+            return dict(recent[1])
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._in_flight[key] = asyncio.ensure_future(self._scrape(url))
+            task.add_done_callback(lambda done: self._done(key, done))
+        price_data = await asyncio.shield(task)
+        return dict(price_data) if price_data else None
+
+
+LATEST_PRICE_QUERY = '''
+    SELECT price, old_price, availability
+    FROM competitor_price_history
+    WHERE competitor_product_id = %s
+    ORDER BY id DESC
+    LIMIT 1
+'''
+
+
+async def record_unavailable_mapping(state, competitor_product_id, checked_at):
+    """Back off a mapping whose page is gone, as price_history_store.record_unavailable_mappings does"""
+    async with state.db.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(*mapping_state_query([(competitor_product_id,)]))
+            counts = {r[0]: r[3] for r in await cursor.fetchall()}
+            schedule = plan_schedule_updates(counts, [(cp_id, True, checked_at) for cp_id in counts])
+            if schedule:
+                await cursor.executemany(UPDATE_SCHEDULE_SQL, schedule)
+
+
+async def scrape_competitor_price_async(state, competitor_product_id):
+    """Scrape and store one competitor product's price; None if nothing was scraped"""
+    async with state.db.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute('''
+                SELECT cp.competitor_url, cp.last_checked_at
+                FROM competitor_products cp
+                WHERE cp.id = %s AND cp.is_active = TRUE
+            ''', (competitor_product_id,))
+            result = await cursor.fetchone()
+            if not result:
+                return None
+            competitor_url, last_checked_at = result
+
+            # Checked moments ago (possibly by another worker): answer from the stored price
+            fresh = timedelta(seconds=state.scraper.fresh_seconds)
+            if last_checked_at is not None and datetime.now() - last_checked_at < fresh:
+                await cursor.execute(LATEST_PRICE_QUERY, (competitor_product_id,))
+                latest = await cursor.fetchone()
+                if latest:
+                    return job_result({'price': latest[0], 'old_price': latest[1],
+                                       'availability': latest[2], 'scraped_at': last_checked_at})
+
+    try:
+        price_data = await state.scraper.scrape_competitor_price(competitor_url)
+    except Exception as e:
+        if not is_gone_http_error(e):
+            raise
+        print(f"Error scraping {competitor_url}: {e}")
+        await record_unavailable_mapping(state, competitor_product_id, datetime.now())
+        return None
+    if not price_data:
+        return None
+
+    rows = [(competitor_product_id, price_data['price'], price_data['old_price'],
+             price_data['availability'], price_data['scraped_at'])]
+    async with state.db.acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cursor:
+                # Same steps as price_history_store.record_competitor_prices
+                await cursor.execute(*mapping_state_query(rows))
+                plan = plan_observation_writes(await cursor.fetchall(), rows)
+                latest_rows = []
+                if plan.close:
+                    await cursor.execute(*latest_rows_query(plan.close))
+                    latest_rows = await cursor.fetchall()
+                for sql, params, many in plan.statements(latest_rows):
+                    if many:
+                        await cursor.executemany(sql, params)
+                    else:
+                        await cursor.execute(sql, params)
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+    return job_result(price_data)
+
+
+class AsyncScrapeJobs:
+    """Scrape jobs as event-loop tasks, merged per competitor mapping"""
+
+    def __init__(self, retention_seconds=3600):
+        self.retention_seconds = retention_seconds
+        self._jobs = {}
+        self._in_flight = {}
+
+    def enqueue(self, state, mapping_id):
+        prune_finished_jobs(self._jobs, self.retention_seconds)
+        job_id = self._in_flight.get(mapping_id)
+        if job_id is not None:
+            return self._jobs[job_id], False
+        job = ScrapeJob(mapping_id)
+        self._jobs[job.id] = job
+        self._in_flight[mapping_id] = job.id
+        asyncio.ensure_future(self._run(state, job))
+        return job, True
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    async def _run(self, state, job):
+        job.status = 'running'
+        job.started_at = datetime.now()
+        try:
+            result = await scrape_competitor_price_async(state, job.mapping_id)
+            if result is None:
+                job.status = 'failed'
+                job.error = 'Failed to scrape price'
+            else:
+                job.status = 'succeeded'
+                job.result = result
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now()
+            self._in_flight.pop(job.mapping_id, None)
+
+
+async_scrape_jobs = AsyncScrapeJobs()
+
+
+@jwt_required
+async def manual_scrape_competitor(request):
+    try:
+        job, created = async_scrape_jobs.enqueue(request.app.state, request.path_params['competitor_product_id'])
+        return FlaskJSONResponse({
+            'message': 'Scrape queued' if created else 'Scrape already in progress',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/scrape/jobs/{job.id}'
+        }, status_code=202)
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@jwt_required
+async def get_scrape_job(request):
+    job_id = request.path_params['job_id']
+    # Jobs queued by the mounted Flask routes (e.g. adding a competitor) run on its thread pool
+    job = async_scrape_jobs.get(job_id) or flask_app.extensions['scrape_jobs'].get(job_id)
+    if job is None:
+        return error('Job not found', 404)
+    return FlaskJSONResponse(job.to_dict())
+
+
+def db_config():
+    return {
+        'host': flask_app.config['MYSQL_HOST'],
+        'user': flask_app.config['MYSQL_USER'],
+        'password': flask_app.config['MYSQL_PASSWORD'],
+        'db': flask_app.config['MYSQL_DB'],
+        'autocommit': True,
+    }
+
+
+async def claim_single_process():
+    """Hold the MySQL named lock that marks this as the one API process.
+
+    Returns the connection holding it; closing the connection (or the
+    process dying) releases the lock.
+    """
+    conn = await aiomysql.connect(**db_config())
+    try:
+        async with conn.cursor() as cursor:
+            # The lock only lasts as long as this otherwise idle session
+            await cursor.execute('SET SESSION wait_timeout = 31536000')
+            await cursor.execute('SELECT GET_LOCK(%s, 0)', (f"{flask_app.config['MYSQL_DB']}.asgi_app",))
+            acquired = (await cursor.fetchone())[0]
+    except Exception:
+        conn.close()
+        raise
+    if not acquired:
+        conn.close()
+        raise RuntimeError("Another asgi_app process is already serving this database. Scrape jobs "
+                           "are kept in process memory, so run a single worker (no --workers).")
+    return conn
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    single_process = await claim_single_process()
+    app.state.db = await aiomysql.create_pool(
+        minsize=1,
+        maxsize=int(os.getenv('ASGI_DB_POOL_SIZE', '10')),
+        **db_config()
+    )
+    scraper = get_scraper()
+    client = httpx.AsyncClient(
+        headers=dict(scraper.session.headers),
+        timeout=httpx.Timeout(scraper.REQUEST_TIMEOUT[1], connect=scraper.REQUEST_TIMEOUT[0]),
+        follow_redirects=True
+    )
+    app.state.scraper = AsyncScraper(client, scraper.retry_policy, scraper.circuit_breaker,
+                                     scraper.single_flight.fresh_seconds, scraper.gone)
+    try:
+        yield
+    finally:
+        await client.aclose()
+        app.state.db.close()
+        await app.state.db.wait_closed()
+        single_process.close()
+
+
+routes = [
+    Route('/api/products/{product_id:int}/competitors', get_product_competitors, methods=['GET']),
+    Route('/api/scrape/competitor/{competitor_product_id:int}', manual_scrape_competitor, methods=['POST']),
+    Route('/api/scrape/jobs/{job_id:str}', get_scrape_job, methods=['GET']),
+    # Everything else (and other methods on the paths above) is served by Flask
+    Mount('/', app=WSGIMiddleware(flask_app)),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=["http://localhost:3000"],
+                           allow_methods=['*'], allow_headers=['*'], expose_headers=[READ_PIN_HEADER])],
+    lifespan=lifespan
+)
@@ -0,0 +1,64 @@
+"""Measure cold import cost of the backend entry points.
+
+Imports each module in a fresh interpreter with `python -X importtime`,
+several times, and reports the median total import time and how many
+modules were loaded. Run it before and after a change to see what an
+entry point drags in at startup.
+
+    python bench_importtime.py --runs 5 app tasks update_competitor_prices scrape_test
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ['app', 'tasks', 'update_competitor_prices', 'scrape_test']
+
+
+def import_profile(module):
+    """(total self time in ms, modules loaded, heaviest direct imports) for one cold import"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'unknown error'
+        raise RuntimeError(f"import {module} failed: {last_line}")
+
+    total_us = 0
+    loaded = 0
+    direct = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        loaded += 1
+        # Nesting is shown as two spaces per level; level 1 is what the entry module imports itself
+        if name.startswith('   ') and name[3:4] != ' ':
+            direct.append((int(cumulative_us), name.strip()))
+    direct.sort(reverse=True)
+    return total_us / 1000, loaded, direct[:5]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import time of backend entry points")
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'module':<28}{'median ms':>12}{'modules':>10}  heaviest imports")
+    for module in args.modules:
+        try:
+            runs = [import_profile(module) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{module:<28}{'-':>12}{'-':>10}  {e}")
+            continue
+        median_ms = statistics.median(run[0] for run in runs)
+        heaviest = ', '.join(f"{name} {us / 1000:.0f}ms" for us, name in runs[-1][2][:3])
+        print(f"{module:<28}{median_ms:>12.1f}{runs[-1][1]:>10}  {heaviest}")
+
+
+if __name__ == '__main__':
+    main()
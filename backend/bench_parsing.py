@@ -0,0 +1,131 @@
+"""Benchmark product page parsing in-process vs. in a process pool.
+
+Builds synthetic product pages for each retailer, then parses the same
+batch with 1..N worker processes and prints pages/s and speedup against
+the single-process run. Each page goes through the one parse call a
+pipeline's pool runs: parse_product_page for the crawler (--stage product)
+or parse_price_row for the pipelined price updater (--stage price). With
+--json-ld the pages also embed a schema.org Product block, so the
+structured data fast path is measured instead of the CSS selectors.
+
+    python bench_parsing.py --pages 400 --workers 1 2 4 8
+    python bench_parsing.py --pages 400 --workers 1 --json-ld --stage price
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from product_parsers import parse_product_page
+from update_competitor_prices import parse_price_row
+
+PRODUCT_MARKUP = {
+    'bigdeals': (
+        'https://bigdeals.lk/tv/sample-{n}',
+        '<h1 class="product-name">Sample TV {n}</h1>'
+        '<span class="sell-price">Rs. {price:,}.00</span><span class="m-price">Rs. {old:,}.00</span>'
+        '<a class="cloud-zoom defaultImage" href="/image/{n}.jpg">img</a>'
+    ),
+    'singer': (
+        'https://www.singersl.com/product/sample-{n}',
+        '<h5 class="single-page-product-title">Sample TV {n}</h5>'
+        '<h4 class="fw-bold mb-0 sing-pro-price">Rs. {price:,}'
+        '<span class="text-decoration-line-through text-muted fs-6">Rs. {old:,}</span></h4>'
+        '<a data-fancybox="gallery"><img src="https://cdn.singersl.com/{n}.jpg"></a>'
+    ),
+    'singhagiri': (
+        'https://singhagiri.lk/product/sample-{n}',
+        '<h1 class="product-title">Sample TV {n}</h1>'
+        '<div class="selling-price"><span class="data">Rs {price:,}</span></div>'
+        '<div class="strikeout">Rs {old:,}</div>'
+        '<a data-fancybox="gallery"><img src="/media/{n}.jpg"></a>'
+    ),
+}
+
+# Navigation, filters and related-product blocks make real pages ~100-200 KB
+FILLER = ''.join(
+    f'<div class="col"><a href="/category/{i}"><span class="label">Item {i}</span></a>'
+    f'<ul><li>Spec A {i}</li><li>Spec B {i}</li></ul></div>'
+    for i in range(600)
+)
+
+
+def json_ld_block(n, price, old):
+    product = {
+        '@context': 'https://schema.org',
+        '@type': 'Product',
+        'name': f'Sample TV {n}',
+        'image': f'https://cdn.example.lk/{n}.jpg',
+        'offers': {
+            '@type': 'Offer',
+            'price': f'{price}.00',
+            'priceCurrency': 'LKR',
+            'availability': 'https://schema.org/InStock',
+            'priceSpecification': {'@type': 'UnitPriceSpecification', 'priceType': 'https://schema.org/ListPrice',
+                                   'price': old},
+        },
+    }
+    return f'<script type="application/ld+json">{json.dumps(product)}</script>'
+
+
+def build_pages(count, json_ld=False):
+    pages = []
+    sites = list(PRODUCT_MARKUP)
+    for n in range(count):
+        site_type = sites[n % len(sites)]
+        url_template, markup = PRODUCT_MARKUP[site_type]
+        price = 50000 + n * 10
+        head = json_ld_block(n, price, price + 5000) if json_ld else ''
+        html = (f'<html><head>{head}</head><body><nav>{FILLER}</nav><main>'
+                f'{markup.format(n=n, price=price, old=price + 5000)}</main></body></html>')
+        pages.append((site_type, url_template.format(n=n), html.encode('utf-8')))
+    return pages
+
+
+def parse_one(stage, page):
+    site_type, url, content = page
+    if stage == 'price':
+        return parse_price_row(content, url, [1])
+    return parse_product_page(content, url, (site_type, site_type, 'tv'))
+
+
+def run(pages, workers, stage):
+    started = time.perf_counter()
+    parse = partial(parse_one, stage)
+    if workers == 1:
+        results = [parse(page) for page in pages]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(parse, pages, chunksize=4))
+    elapsed = time.perf_counter() - started
+    assert len(results) == len(pages)
+    return elapsed
+
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, cpu_count})
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=300)
+    parser.add_argument('--workers', type=int, nargs='+', default=default_workers)
+    parser.add_argument('--json-ld', action='store_true', help="embed a JSON-LD Product block in every page")
+    parser.add_argument('--stage', choices=('product', 'price'), default='product',
+                        help="parse call to measure: the crawler's or the price updater's")
+    args = parser.parse_args()
+
+    pages = build_pages(args.pages, args.json_ld)
+    page_kb = sum(len(p[2]) for p in pages) / len(pages) / 1024
+    print(f"{len(pages)} pages, {page_kb:.0f} KB avg, {cpu_count} cores, {args.stage} stage")
+
+    baseline = None
+    for workers in args.workers:
+        elapsed = run(pages, workers, args.stage)
+        baseline = baseline or elapsed
+        print(f"workers={workers:<3} {elapsed:7.2f}s  {len(pages) / elapsed:7.1f} pages/s  "
+              f"speedup x{baseline / elapsed:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Check and benchmark price_parsing against the old per-call regex cleaner.
+
+First runs the fixed corpus of real-world price strings and a seeded fuzz
+corpus (random LKR amounts rendered in random retailer formats) through
+price_parsing and fails loudly on any mismatch. Then times both parsers on
+the same inputs.
+
+    python bench_price_parsing.py --fuzz 20000 --repeat 5
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+from price_parsing import price_cents, price_range_cents, price_to_float
+
+# (text, expected cents of the first price)
+CORPUS = [
+    ('Rs. 123,450.00', 12345000),
+    ('Rs 123,450', 12345000),
+    ('Rs.123,450.00', 12345000),
+    ('LKR 123450', 12345000),
+    ('LKR123,450.50', 12345050),
+    ('රු. 1,23,450/=', 12345000),
+    ('Rs. 12,500/=', 1250000),
+    ('  Rs.\n  89,999.00  ', 8999900),
+    ('Rs. 1,000', 100000),
+    ('Rs. 999.5', 99950),
+    ('Rs. 999.995', 100000),
+    ('Rs. 0.00', 0),
+    ('123450', 12345000),
+    ('Rs. 10,000 - Rs. 12,000', 1000000),
+    ('Price: Rs. 45,990.00 Save 10%', 4599000),
+    ('Rs.', None),
+    ('Call for price', None),
+    ('', None),
+]
+
+# (text, expected (low, high) cents)
+RANGE_CORPUS = [
+    ('Rs. 10,000 - Rs. 12,000', (1000000, 1200000)),
+    ('LKR 10,000.50 – 12,000', (1000050, 1200000)),
+    ('Rs. 45,000 to 55,000', (4500000, 5500000)),
+    ('Rs. 12,000 - 10,000', (1000000, 1200000)),
+    ('Rs. 75,000.00', (7500000, 7500000)),
+    ('Out of stock', None),
+]
+
+PREFIXES = ['Rs. ', 'Rs.', 'Rs ', 'LKR ', 'LKR', 'රු. ', '']
+SUFFIXES = ['', '/=', ' /=', '.00/=', ' only']
+
+
+def group(whole, lakh=False):
+    digits = str(whole)
+    if len(digits) <= 3:
+        return digits
+    head, tail = digits[:-3], digits[-3:]
+    size = 2 if lakh else 3
+    parts = []
+    while head:
+        parts.insert(0, head[-size:])
+        head = head[:-size]
+    return ','.join(parts + [tail])
+
+
+def fuzz_case(rng):
+    """A random (text, expected cents) pair"""
+    whole = rng.choice([rng.randint(0, 999), rng.randint(1000, 99999), rng.randint(100000, 9999999)])
+    fraction = rng.choice([None, None, 0, rng.randint(0, 99)])
+    amount = group(whole, lakh=rng.random() < 0.2) if rng.random() < 0.8 else str(whole)
+    suffix = rng.choice(SUFFIXES)
+    if fraction is not None:
+        amount += f'.{fraction:02d}'
+        if suffix == '.00/=':
+            suffix = '/='
+    text = rng.choice(['', ' ', '\n  ']) + rng.choice(PREFIXES) + amount + suffix + rng.choice(['', ' ', '\n'])
+    return text, whole * 100 + (fraction or 0)
+
+
+def legacy_clean_price(price_text):
+    """The old CompetitorScraper._clean_price, kept here as the baseline"""
+    if not price_text:
+        return 0.0
+    cleaned = re.sub(r'[^\d.]', '', str(price_text).replace(',', ''))
+    try:
+        return float(cleaned) if cleaned else 0.0
+    except ValueError:
+        return 0.0
+
+
+def check(fuzz_count, seed):
+    failures = []
+    for text, expected in CORPUS:
+        if price_cents(text) != expected:
+            failures.append((text, expected, price_cents(text)))
+    for text, expected in RANGE_CORPUS:
+        if price_range_cents(text) != expected:
+            failures.append((text, expected, price_range_cents(text)))
+
+    rng = random.Random(seed)
+    fuzz = [fuzz_case(rng) for _ in range(fuzz_count)]
+    for text, expected in fuzz:
+        if price_cents(text) != expected:
+            failures.append((text, expected, price_cents(text)))
+
+    legacy_wrong = sum(1 for text, expected in fuzz if round(legacy_clean_price(text) * 100) != expected)
+    print(f"corpus: {len(CORPUS) + len(RANGE_CORPUS)} fixed cases, {fuzz_count} fuzz cases, "
+          f"{len(failures)} failures (old cleaner got {legacy_wrong} fuzz cases wrong)")
+    for text, expected, got in failures[:20]:
+        print(f"  {text!r}: expected {expected}, got {got}")
+    return [text for text, _ in fuzz], not failures
+
+
+def bench(func, texts, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and benchmark LKR price parsing")
+    parser.add_argument('--fuzz', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    texts, ok = check(args.fuzz, args.seed)
+    if not ok:
+        sys.exit(1)
+
+    legacy = bench(legacy_clean_price, texts, args.repeat)
+    cents = bench(price_cents, texts, args.repeat)
+    floats = bench(price_to_float, texts, args.repeat)
+    per_call = 1e9 / len(texts)
+    print(f"legacy re.sub per call   {legacy * per_call:8.0f} ns/price")
+    print(f"price_cents              {cents * per_call:8.0f} ns/price  x{legacy / cents:.2f}")
+    print(f"price_to_float           {floats * per_call:8.0f} ns/price  x{legacy / floats:.2f}")
+
+
+if __name__ == '__main__':
+    main()
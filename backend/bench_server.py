@@ -0,0 +1,82 @@
+"""Load-test the API under the WSGI (Flask) and ASGI deployments.
+
+Runs a closed-loop load against each target: `--concurrency` clients each
+send a request, wait for the response, and send the next one, for
+`--duration` seconds. Prints throughput and latency percentiles per target.
+
+    gunicorn -w 4 -b :5000 app:app
+    uvicorn asgi_app:app --port 8000
+    python bench_server.py --target wsgi=http://localhost:5000 --target asgi=http://localhost:8000 \\
+        --path '/products?limit=20' --path /api/products/1/competitors --token $JWT
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_load(base_url, paths, concurrency, duration, headers):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=60,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def worker(offset):
+            nonlocal errors
+            n = offset
+            while time.perf_counter() < deadline:
+                path = paths[n % len(paths)]
+                n += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return sorted(latencies), errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare WSGI and ASGI API throughput and tail latency")
+    parser.add_argument('--target', action='append', required=True,
+                        help="name=base_url, e.g. asgi=http://localhost:8000 (repeatable)")
+    parser.add_argument('--path', action='append', default=None,
+                        help="request path, cycled across requests (repeatable)")
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--token', help="JWT for the /api endpoints")
+    args = parser.parse_args()
+
+    paths = args.path or ['/products?limit=20']
+    headers = {'Authorization': f'Bearer {args.token}'} if args.token else {}
+
+    print(f"{args.concurrency} concurrent clients, {args.duration:.0f}s per target, paths: {', '.join(paths)}")
+    print(f"{'target':<10}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for target in args.target:
+        name, _, base_url = target.partition('=')
+        latencies, errors, elapsed = asyncio.run(
+            run_load(base_url, paths, args.concurrency, args.duration, headers))
+        ms = [latency * 1000 for latency in latencies]
+        print(f"{name:<10}{len(ms):>10}{errors:>8}{len(ms) / elapsed:>10.1f}"
+              f"{percentile(ms, 50):>10.1f}{percentile(ms, 90):>10.1f}{percentile(ms, 99):>10.1f}"
+              f"{(ms[-1] if ms else float('nan')):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
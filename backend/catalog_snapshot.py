@@ -0,0 +1,304 @@
+import os
+import sys
+import threading
+import time
+from decimal import Decimal
+
+import numpy as np
+
+# In-process snapshot of product_details for the catalog routes.
+#
+# The table is small enough to hold in memory, so product filters, category
+# listings and similar-product lookups are answered from columnar arrays
+# instead of MySQL: prices, category and company codes and created_at are
+# NumPy arrays, categories, companies and availability labels are interned
+# once, and each category keeps its rows sorted by price so price ranges are
+# two binary searches and nearest-price lookups walk outwards from one.
+#
+# The snapshot is immutable. current() re-checks the table's version
+# (COUNT(*), MAX(id); product_details is append-only) at most every
+# CATALOG_CHECK_INTERVAL seconds and swaps in a rebuilt snapshot when rows
+# were ingested; invalidate() forces the check on the next read.
+
+CATALOG_COLUMNS = 'id, name, price, old_price, availability, images, company, ProductURL, category, created_at'
+LOAD_QUERY = f'SELECT {CATALOG_COLUMNS} FROM product_details ORDER BY id'
+VERSION_QUERY = 'SELECT COUNT(*), MAX(id) FROM product_details'
+
+ENABLED = os.getenv('CATALOG_SNAPSHOT', '1').lower() not in ('0', 'false', 'no')
+CHECK_INTERVAL = float(os.getenv('CATALOG_CHECK_INTERVAL', '10'))
+
+NAME_SEPARATOR = '\x00'
+
+
+def _fold(value):
+    # MySQL's default collation compares case-insensitively
+    return value.lower() if value is not None else None
+
+
+def _float(value):
+    return float(value) if value is not None else np.nan
+
+
+def _decimal(value):
+    # Prices are DECIMAL(12, 2) columns; hand them back as the driver does
+    return None if np.isnan(value) else Decimal(f'{value:.2f}')
+
+
+def _intern_codes(values):
+    """(distinct values, int32 code per value); None becomes -1"""
+    table = {}
+    distinct = []
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+            continue
+        code = table.get(value)
+        if code is None:
+            code = table[value] = len(distinct)
+            distinct.append(sys.intern(value))
+        codes[i] = code
+    return distinct, codes
+
+
+class _PriceIndex:
+    """Row positions of one category: in id order, and the priced ones by price"""
+
+    __slots__ = ('positions', 'by_price', 'sorted_prices', 'unpriced')
+
+    def __init__(self, positions, prices):
+        priced = ~np.isnan(prices[positions])
+        order = np.argsort(prices[positions[priced]], kind='stable')
+        self.positions = positions
+        self.by_price = positions[priced][order]
+        self.sorted_prices = prices[self.by_price]
+        self.unpriced = positions[~priced]
+
+    def price_range(self, low, high):
+        """Positions priced within [low, high], in id order"""
+        lo = np.searchsorted(self.sorted_prices, low, side='left')
+        hi = np.searchsorted(self.sorted_prices, high, side='right')
+        return np.sort(self.by_price[lo:hi])
+
+
+class CatalogSnapshot:
+    """Immutable, array-backed copy of product_details"""
+
+    def __init__(self, rows):
+        count = len(rows)
+        self.version = (count, rows[-1][0] if rows else None)
+        self.ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+        self.prices = np.fromiter((_float(row[2]) for row in rows), dtype=np.float64, count=count)
+        self.old_prices = np.fromiter((_float(row[3]) for row in rows), dtype=np.float64, count=count)
+        self.created_at = np.array([row[9] for row in rows], dtype='datetime64[us]')
+        self.names = [row[1] for row in rows]
+        self.images = [row[5] for row in rows]
+        self.urls = [row[7] for row in rows]
+        self.availability_labels, self.availability_codes = _intern_codes([row[4] for row in rows])
+        self.companies, self.company_codes = _intern_codes([row[6] for row in rows])
+        self.categories, self.category_codes = _intern_codes([row[8] for row in rows])
+
+        # Lowercased names joined into one string; a search is str.find over it
+        self._name_blob = NAME_SEPARATOR.join(_fold(name or '') for name in self.names)
+        lengths = np.fromiter((len(name or '') + 1 for name in self.names), dtype=np.int64, count=count)
+        self._name_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if count else lengths
+
+        self._all = _PriceIndex(np.arange(count), self.prices)
+        self._by_category = {}
+        for key in {_fold(category) for category in self.categories}:
+            positions = np.flatnonzero(np.isin(self.category_codes, self._codes(self.categories, key)))
+            self._by_category[key] = _PriceIndex(positions, self.prices)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _codes(values, key):
+        return np.array([code for code, value in enumerate(values) if _fold(value) == key], dtype=np.int32)
+
+    def find(self, product_id):
+        """Row position of a product id, or None"""
+        position = np.searchsorted(self.ids, product_id)
+        if position < len(self.ids) and self.ids[position] == product_id:
+            return int(position)
+        return None
+
+    def rows(self, positions):
+        """product_details rows (id, name, price, old_price, availability, images,
+        company, ProductURL, category, created_at), as the database returns them"""
+        labels, companies, categories = self.availability_labels, self.companies, self.categories
+        result = []
+        for i in positions:
+            availability, company, category = (
+                self.availability_codes[i], self.company_codes[i], self.category_codes[i])
+            result.append((
+                int(self.ids[i]), self.names[i], _decimal(self.prices[i]), _decimal(self.old_prices[i]),
+                labels[availability] if availability >= 0 else None, self.images[i],
+                companies[company] if company >= 0 else None, self.urls[i],
+                categories[category] if category >= 0 else None, self.created_at[i].item(),
+            ))
+        return result
+
+    def category_rows(self, category):
+        """Positions of a category's products in id order"""
+        index = self._by_category.get(_fold(category))
+        return index.positions if index is not None else np.empty(0, dtype=np.int64)
+
+    def name_matches(self, search):
+        """Boolean mask of products whose name contains search, ignoring case"""
+        mask = np.zeros(len(self), dtype=bool)
+        needle = _fold(search)
+        if NAME_SEPARATOR in needle:
+            return mask
+        blob, starts = self._name_blob, self._name_starts
+        at = blob.find(needle)
+        while at >= 0:
+            position = int(np.searchsorted(starts, at, side='right')) - 1
+            mask[position] = True
+            # Continue from the next name; one match per product is enough
+            next_start = starts[position + 1] if position + 1 < len(starts) else len(blob)
+            at = blob.find(needle, next_start)
+        return mask
+
+    def filter(self, search=None, category=None, price_range=None):
+        """Positions matching the /products filters, in id order"""
+        if category is not None:
+            index = self._by_category.get(_fold(category))
+            if index is None:
+                return np.empty(0, dtype=np.int64)
+        else:
+            index = self._all
+        positions = index.price_range(*price_range) if price_range is not None else index.positions
+        if search:
+            positions = positions[self.name_matches(search)[positions]]
+        return positions
+
+    def _company_codes_like(self, position):
+        """Company codes equal (ignoring case) to the company at position; None if it has none"""
+        company = self.company_codes[position]
+        if company < 0:
+            return None
+        return self._codes(self.companies, _fold(self.companies[company]))
+
+    def _other_company(self, position, positions):
+        """Mask over positions whose company differs from the one at position,
+        as SQL company != x decides it: NULL on either side never differs"""
+        same = self._company_codes_like(position)
+        codes = self.company_codes[positions]
+        if same is None:
+            return np.zeros(len(codes), dtype=bool)
+        return (codes >= 0) & ~np.isin(codes, same)
+
+    def _company_test(self, position, other):
+        """Per-position predicate version of _other_company (other=False negates it)"""
+        same = self._company_codes_like(position)
+        same = set() if same is None else set(same.tolist())
+        codes, has_company = self.company_codes, self.company_codes[position] >= 0
+        if other:
+            return lambda p: has_company and codes[p] >= 0 and codes[p] not in same
+        return lambda p: not has_company or codes[p] < 0 or codes[p] in same
+
+    def nearest(self, category, price, limit, accept, low=-np.inf, high=np.inf):
+        """Up to limit positions of a category priced within [low, high] for which
+        accept(position) holds, closest to price first"""
+        index = self._by_category.get(_fold(category))
+        if index is None or limit <= 0:
+            return []
+        prices, by_price = index.sorted_prices, index.by_price
+        lo = int(np.searchsorted(prices, low, side='left'))
+        hi = int(np.searchsorted(prices, high, side='right'))
+        right = min(max(int(np.searchsorted(prices, price)), lo), hi)
+        left = right - 1
+        found = []
+        while len(found) < limit and (left >= lo or right < hi):
+            if right >= hi or (left >= lo and price - prices[left] <= prices[right] - price):
+                candidate = int(by_price[left])
+                left -= 1
+            else:
+                candidate = int(by_price[right])
+                right += 1
+            if accept(candidate):
+                found.append(candidate)
+        return found
+
+    def similar_products(self, position, limit):
+        """/products/similar: other companies' products in the same category,
+        those priced within half to double the reference price first, each
+        group closest in price first"""
+        price = self.prices[position]
+        code = self.category_codes[position]
+        category = self.categories[code] if code >= 0 else None
+        other = self._company_test(position, other=True)
+        positive = np.nextafter(0, 1)
+        found = self.nearest(category, price, limit, lambda p: p != position and other(p),
+                             max(price * 0.5, positive), price * 2.0)
+        taken = set(found)
+        return found + self.nearest(category, price, limit - len(found),
+                                    lambda p: p != position and p not in taken and other(p), positive)
+
+    def similar_by_company(self, category, position, limit):
+        """/products/similar-tvs: a category's products other than position, other
+        companies first, then closest in price (unpriced rows sort first, as in MySQL)"""
+        index = self._by_category.get(_fold(category))
+        if index is None:
+            return []
+        price = self.prices[position]
+        found = []
+        for other in (True, False):
+            test = self._company_test(position, other)
+            accept = lambda p: p != position and test(p)
+            unpriced = index.unpriced[index.unpriced != position]
+            ordered = unpriced[self._other_company(position, unpriced) == other].tolist()
+            if np.isnan(price):
+                priced = index.by_price[index.by_price != position]
+                ordered += np.sort(priced[self._other_company(position, priced) == other]).tolist()
+            else:
+                ordered += self.nearest(category, price, limit - len(found), accept)
+            found.extend(ordered[:limit - len(found)])
+            if len(found) >= limit:
+                break
+        return found
+
+
+_snapshot = None
+_checked_at = 0.0
+_refresh_lock = threading.Lock()
+
+
+def load(cursor):
+    """Build a snapshot of product_details and make it the current one"""
+    global _snapshot
+    cursor.execute(LOAD_QUERY)
+    _snapshot = CatalogSnapshot(cursor.fetchall())
+    return _snapshot
+
+
+def current(open_cursor):
+    """The current snapshot, rebuilt first if product_details changed.
+
+    open_cursor() returns a cursor context manager. Only one caller checks
+    the version at a time; the others keep reading the previous snapshot
+    meanwhile, and only wait when there is none yet.
+    """
+    global _checked_at
+    if time.monotonic() - _checked_at < CHECK_INTERVAL and _snapshot is not None:
+        return _snapshot
+    if not _refresh_lock.acquire(blocking=_snapshot is None):
+        return _snapshot
+    try:
+        if time.monotonic() - _checked_at >= CHECK_INTERVAL or _snapshot is None:
+            with open_cursor() as cursor:
+                cursor.execute(VERSION_QUERY)
+                version = tuple(cursor.fetchone())
+                if _snapshot is None or _snapshot.version != version:
+                    load(cursor)
+            _checked_at = time.monotonic()
+    finally:
+        _refresh_lock.release()
+    return _snapshot
+
+
+def invalidate():
+    """Check for new rows on the next read, e.g. right after an ingestion"""
+    global _checked_at
+    _checked_at = 0.0
@@ -1,13 +1,29 @@
 import requests
-from bs4 import BeautifulSoup
-import re
+import os
 import time
 import random
 from urllib.parse import urlparse
-from datetime import datetime
+from scrape_resilience import RetryPolicy, CircuitBreaker, CircuitOpenError, TransientScrapeError
+from scrape_resilience import TRANSIENT_STATUS_CODES, is_gone_error, is_transient_error
+from single_flight import SingleFlight
+from url_utils import normalize_url
+from retailers import retailer_for_url
+from structured_data import hit_rates
 
 class CompetitorScraper:
-    def __init__(self):
+    # (connect, read) timeouts: a host that is down fails fast on connect
+    REQUEST_TIMEOUT = (10, 30)
+
+    def __init__(self, retry_policy=None, circuit_breaker=None, fresh_seconds=None):
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        # Concurrent scrapes of the same URL share one fetch, and a price
+        # scraped within fresh_seconds is reused without touching the network
+        if fresh_seconds is None:
+            fresh_seconds = float(os.getenv('SCRAPE_FRESH_SECONDS', '30'))
+        self.single_flight = SingleFlight(fresh_seconds)
+        # Normalized URLs that answered 404/410 on their last scrape
+        self.gone = set()
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -17,136 +33,90 @@ class CompetitorScraper:
             'Connection': 'keep-alive'
         })
     
+    def is_gone(self, url):
+        """Whether the last scrape of url found the page removed (404/410)"""
+        return normalize_url(url) in self.gone
+
+    def is_host_available(self, url):
+        """Check the circuit breaker before spending time on a URL"""
+        return self.circuit_breaker.available(self.circuit_breaker.host_for(url))
+
+    def _fetch(self, url):
+        """Single GET; transient HTTP statuses are raised as retryable errors"""
+        response = self.session.get(url, timeout=self.REQUEST_TIMEOUT)
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            raise TransientScrapeError(f"HTTP {response.status_code} from {url}")
+        response.raise_for_status()
+        return response
+
+    def fetch_with_retry(self, url):
+        """Fetch url through the retry policy and the host's circuit breaker"""
+        host = self.circuit_breaker.host_for(url)
+        if not self.circuit_breaker.allow(host):
+            raise CircuitOpenError(f"Circuit open for {host}")
+        try:
+            response = self.retry_policy.call(self._fetch, url)
+        except Exception as e:
+            if is_transient_error(e):
+                self.circuit_breaker.record_failure(host)
+            else:
+                # The host answered (e.g. 404), so it is up
+                self.circuit_breaker.record_success(host)
+            raise
+        self.circuit_breaker.record_success(host)
+        return response
+
     def scrape_competitor_price(self, url, competitor_name):
         """Scrape price from competitor URL"""
+        price_data = self.single_flight.do(normalize_url(url), self._scrape_competitor_price, url, competitor_name)
+        # Callers share the result, so each gets its own copy
+        return dict(price_data) if price_data else None
+
+    def _scrape_competitor_price(self, url, competitor_name):
         try:
+            if not self.is_host_available(url):
+                raise CircuitOpenError(f"Circuit open for {urlparse(url).netloc}")
+
             # Add delay to be respectful
             time.sleep(random.uniform(2, 5))
             
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
+            response = self.fetch_with_retry(url)
+            self.gone.discard(normalize_url(url))
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Site-specific price extraction
-            domain = urlparse(url).netloc.lower()
-            
-            if 'bigdeals.lk' in domain:
-                return self._extract_bigdeals_price(soup)
-            elif 'singersl.com' in domain:
-                return self._extract_singer_price(soup)
-            elif 'singhagiri.lk' in domain:
-                return self._extract_singhagiri_price(soup)
-            else:
-                return self._extract_generic_price(soup)
+            # One page at a time here, so it is parsed inline; the process
+            # pool only pays off in the pipelined updater
+            return parse_competitor_price(response.content, url)
                 
-        except Exception as e:
-            print(f"Error scraping {url}: {e}")
+        except CircuitOpenError as e:
+            # Callers tell a deferral from a failure with is_host_available()
+            print(f"Deferred {url}: {e}")
             return None
-    
-    def _extract_bigdeals_price(self, soup):
-        """Extract price from BigDeals"""
-        try:
-            price_tag = soup.find('span', class_='sell-price')
-            old_price_tag = soup.find('span', class_='m-price')
-            
-            current_price = self._clean_price(price_tag.text if price_tag else '0')
-            old_price = self._clean_price(old_price_tag.text if old_price_tag else '0')
-            
-            return {
-                'price': current_price,
-                'old_price': old_price if old_price > 0 else None,
-                'availability': 'In Stock',
-                'scraped_at': datetime.now()
-            }
         except Exception as e:
-            print(f"Error extracting BigDeals price: {e}")
-            return None
-    
-    def _extract_singer_price(self, soup):
-        """Extract price from Singer"""
-        try:
-            price_selectors = [
-                'h4.fw-bold.mb-0.sing-pro-price',
-                'h4.text-primary.fw-bold.mb-0.productprice',
-                '.price'
-            ]
-            
-            current_price = 0
-            for selector in price_selectors:
-                price_tag = soup.select_one(selector)
-                if price_tag:
-                    current_price = self._clean_price(price_tag.get_text())
-                    break
-            
-            old_price_tag = soup.select_one('span.text-decoration-line-through')
-            old_price = self._clean_price(old_price_tag.get_text() if old_price_tag else '0')
-            
-            return {
-                'price': current_price,
-                'old_price': old_price if old_price > 0 else None,
-                'availability': 'In Stock',
-                'scraped_at': datetime.now()
-            }
-        except Exception as e:
-            print(f"Error extracting Singer price: {e}")
-            return None
-    
-    def _extract_singhagiri_price(self, soup):
-        """Extract price from Singhagiri"""
-        try:
-            selling_price_tag = soup.select_one('div.selling-price span.data')
-            current_price = self._clean_price(selling_price_tag.get_text() if selling_price_tag else '0')
-            
-            old_price_tag = soup.select_one('div.strikeout')
-            old_price = self._clean_price(old_price_tag.get_text() if old_price_tag else '0')
-            
-            return {
-                'price': current_price,
-                'old_price': old_price if old_price > 0 else None,
-                'availability': 'In Stock',
-                'scraped_at': datetime.now()
-            }
-        except Exception as e:
-            print(f"Error extracting Singhagiri price: {e}")
-            return None
-    
-    def _extract_generic_price(self, soup):
-        """Generic price extraction for unknown sites"""
-        try:
-            price_selectors = [
-                '.price', '.product-price', '.current-price',
-                '[class*="price"]', '[data-price]',
-                '.cost', '.amount', '.value'
-            ]
-            
-            for selector in price_selectors:
-                price_tag = soup.select_one(selector)
-                if price_tag:
-                    price_text = price_tag.get_text()
-                    price = self._clean_price(price_text)
-                    if price > 0:
-                        return {
-                            'price': price,
-                            'old_price': None,
-                            'availability': 'In Stock',
-                            'scraped_at': datetime.now()
-                        }
-            
-            return None
-        except Exception as e:
-            print(f"Error with generic price extraction: {e}")
+            if is_gone_error(e):
+                self.gone.add(normalize_url(url))
+            print(f"Error scraping {url}: {e}")
             return None
-    
-    def _clean_price(self, price_text):
-        """Clean and convert price text to float"""
-        if not price_text:
-            return 0.0
-        
-        # Remove currency symbols and formatting
-        cleaned = re.sub(r'[^\d.]', '', str(price_text).replace(',', ''))
-        
-        try:
-            return float(cleaned) if cleaned else 0.0
-        except ValueError:
-            return 0.0
+
+
+def hit_rate_key(url):
+    """Structured data hit rates are kept per retailer domain (or host, for unregistered sites)"""
+    return retailer_for_url(url).domain or urlparse(url).hostname
+
+
+def extract_price_fields(content, url):
+    """Process-pool entry point: raw page bytes in, ((price, old_price, availability) or None, source) out"""
+    price_data, source = retailer_for_url(url).extract_price_content(content)
+    if not price_data:
+        return None, source
+    return (price_data['price'], price_data['old_price'], price_data['availability']), source
+
+
+def parse_competitor_price(content, url):
+    """Parse a fetched competitor page into price data.
+
+    Takes the raw response body so it can also run in a worker process.
+    Structured data (JSON-LD, microdata) is tried before the CSS selectors.
+    """
+    price_data, source = retailer_for_url(url).extract_price_content(content)
+    hit_rates.record(hit_rate_key(url), source)
+    return price_data
@@ -0,0 +1,105 @@
+import hashlib
+import math
+import os
+import threading
+
+from url_utils import canonical_url
+
+# Crawl frontier deduplication. Every product URL the crawler finds is
+# canonicalized and reduced to a 64-bit fingerprint; a URL is fetched only
+# the first time its fingerprint is claimed in a run, however many listing
+# pages or categories link to it.
+#
+# Normal crawls keep the fingerprints in a set of ints. Very large crawls
+# switch to a Bloom filter, which takes about 1.2 bytes per URL at a 1%
+# false-positive rate; a false positive means a product is skipped for that
+# run and picked up by the next one.
+
+BLOOM_THRESHOLD = int(os.getenv('CRAWL_BLOOM_THRESHOLD', '1000000'))
+BLOOM_ERROR_RATE = float(os.getenv('CRAWL_BLOOM_ERROR_RATE', '0.01'))
+
+
+def url_fingerprint(url):
+    """64-bit fingerprint of an already canonical URL"""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class FingerprintSet:
+    """Exact set of URL fingerprints"""
+
+    def __init__(self):
+        self._fingerprints = set()
+
+    def add(self, fingerprint):
+        """Add a fingerprint; returns False if it was already present"""
+        if fingerprint in self._fingerprints:
+            return False
+        self._fingerprints.add(fingerprint)
+        return True
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over URL fingerprints.
+
+    The k bit positions are derived from the 64-bit fingerprint by double
+    hashing, so no extra hashing is done per probe.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+
+    def _positions(self, fingerprint):
+        h1 = fingerprint & 0xFFFFFFFF
+        h2 = (fingerprint >> 32) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, fingerprint):
+        """Add a fingerprint; returns False if it was (probably) already present"""
+        added = False
+        for position in self._positions(fingerprint):
+            byte, bit = divmod(position, 8)
+            if not self._bits[byte] & (1 << bit):
+                self._bits[byte] |= 1 << bit
+                added = True
+        if added:
+            self._count += 1
+        return added
+
+    def __len__(self):
+        return self._count
+
+
+class CrawlFrontier:
+    """Hands out each canonical product URL once per crawl.
+
+    expected_urls picks the backing store: an exact fingerprint set, or a
+    Bloom filter sized for the crawl once it reaches BLOOM_THRESHOLD.
+    """
+
+    def __init__(self, expected_urls=None, bloom_threshold=BLOOM_THRESHOLD, error_rate=BLOOM_ERROR_RATE):
+        if expected_urls and expected_urls >= bloom_threshold:
+            self._seen = BloomFilter(expected_urls, error_rate)
+        else:
+            self._seen = FingerprintSet()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def claim(self, url):
+        """Canonical URL if it has not been claimed yet in this crawl, else None"""
+        url = canonical_url(url)
+        fingerprint = url_fingerprint(url)
+        with self._lock:
+            if self._seen.add(fingerprint):
+                return url
+            self.duplicates += 1
+        return None
+
+    def __len__(self):
+        return len(self._seen)
@@ -0,0 +1,33 @@
+import os
+from contextlib import contextmanager
+
+# Plain mysql.connector access for scripts and Celery workers, which have no
+# use for the Flask app and its extensions.
+
+
+def get_database_connection():
+    """Get database connection"""
+    import mysql.connector
+
+    return mysql.connector.connect(
+        host=os.getenv('MYSQL_HOST', 'localhost'),
+        user=os.getenv('MYSQL_USER', 'tracker_user'),
+        password=os.getenv('MYSQL_PASSWORD', 'password'),
+        database=os.getenv('MYSQL_DB', 'price_tracker')
+    )
+
+
+@contextmanager
+def db_cursor():
+    """Cursor on its own connection; committed on success, rolled back on error"""
+    conn = get_database_connection()
+    try:
+        cursor = conn.cursor()
+        yield cursor
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
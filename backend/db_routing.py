@@ -0,0 +1,198 @@
+import itertools
+import os
+import threading
+import time
+
+from itsdangerous import BadSignature, Signer
+
+# Read routing for the API. Catalog browsing reads (product lists, price
+# history, the competitor overview) can be served by MySQL replicas so they
+# do not compete with scrape-run writes on the primary:
+#
+#   MYSQL_REPLICA_HOSTS=replica1:3306,replica2:3306
+#
+# Replicas share the primary's user, password and database unless
+# MYSQL_REPLICA_USER / MYSQL_REPLICA_PASSWORD are set. A replica is used
+# only while its measured lag (Seconds_Behind_Source, re-checked every
+# DB_LAG_CHECK_INTERVAL seconds) is at most DB_MAX_REPLICA_LAG; otherwise,
+# or when no replica is configured or reachable, reads go to the primary.
+#
+# Read-your-writes: after a client writes, its reads are pinned to the
+# primary for DB_READ_PIN_SECONDS, longer than any lag a replica is allowed
+# to have. The pin travels with the client as a signed token holding the
+# time of its last write (a cookie, also echoed in a response header), so
+# whichever API worker or host serves the next read honours it.
+
+REPLICA_HOSTS = os.getenv('MYSQL_REPLICA_HOSTS', '')
+MAX_REPLICA_LAG = float(os.getenv('DB_MAX_REPLICA_LAG', '5'))
+LAG_CHECK_INTERVAL = float(os.getenv('DB_LAG_CHECK_INTERVAL', '2'))
+READ_PIN_SECONDS = float(os.getenv('DB_READ_PIN_SECONDS', str(MAX_REPLICA_LAG + LAG_CHECK_INTERVAL + 1)))
+REPLICA_POOL_SIZE = int(os.getenv('DB_REPLICA_POOL_SIZE', '5'))
+# How long an unreachable replica is skipped before it is tried again
+REPLICA_RETRY_AFTER = 30.0
+
+
+def parse_hosts(value):
+    """[(host, port)] from 'host[:port],...'"""
+    hosts = []
+    for entry in value.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, port = entry.partition(':')
+        hosts.append((host, int(port) if port else 3306))
+    return hosts
+
+
+def replication_lag(cursor):
+    """Seconds the replica is behind its source, or None if it is not replicating"""
+    try:
+        cursor.execute('SHOW REPLICA STATUS')
+    except Exception:
+        # MySQL before 8.0.22
+        cursor.execute('SHOW SLAVE STATUS')
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    status = dict(zip([column[0] for column in cursor.description], row))
+    lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+    return None if lag is None else float(lag)
+
+
+class Replica:
+    """Connection pool and cached lag measurement for one replica"""
+
+    def __init__(self, host, port, pool_size=REPLICA_POOL_SIZE):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.lag = None
+        self.checked_at = 0.0
+        self.unavailable_until = 0.0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'Replica({self.host}:{self.port}, lag={self.lag})'
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    from mysql.connector import pooling
+
+                    self._pool = pooling.MySQLConnectionPool(
+                        pool_name=f'replica-{self.host}-{self.port}',
+                        pool_size=self.pool_size,
+                        host=self.host,
+                        port=self.port,
+                        user=os.getenv('MYSQL_REPLICA_USER', os.getenv('MYSQL_USER', 'tracker_user')),
+                        password=os.getenv('MYSQL_REPLICA_PASSWORD', os.getenv('MYSQL_PASSWORD', 'password')),
+                        database=os.getenv('MYSQL_DB', 'price_tracker'),
+                    )
+        return self._pool
+
+    def connect(self, now, max_lag):
+        """A pooled connection if the replica is reachable and fresh enough, else None"""
+        if now < self.unavailable_until:
+            return None
+        if self.checked_at and now - self.checked_at < LAG_CHECK_INTERVAL and not self._fresh(max_lag):
+            return None
+        from mysql.connector.errors import PoolError
+
+        try:
+            conn = self._get_pool().get_connection()
+        except PoolError:
+            # Every pooled connection is in use; the primary takes this read
+            return None
+        except Exception:
+            self.unavailable_until = now + REPLICA_RETRY_AFTER
+            return None
+        try:
+            if now - self.checked_at >= LAG_CHECK_INTERVAL:
+                cursor = conn.cursor()
+                self.lag = replication_lag(cursor)
+                cursor.close()
+                self.checked_at = now
+        except Exception:
+            conn.close()
+            self.lag = None
+            self.unavailable_until = now + REPLICA_RETRY_AFTER
+            return None
+        if not self._fresh(max_lag):
+            conn.close()
+            return None
+        return conn
+
+    def _fresh(self, max_lag):
+        return self.lag is not None and self.lag <= max_lag
+
+
+class ReadPins:
+    """Signed tokens that keep a client's reads on the primary for a while"""
+
+    def __init__(self, secret, seconds):
+        self.seconds = seconds
+        self._signer = Signer(secret, salt='db-read-pin')
+
+    def issue(self, now=None):
+        """Token for a client that just wrote"""
+        now = time.time() if now is None else now
+        return self._signer.sign(repr(now)).decode('ascii')
+
+    def is_pinned(self, token, now=None):
+        """Whether token was issued by us less than `seconds` ago"""
+        if not token:
+            return False
+        try:
+            written_at = float(self._signer.unsign(token))
+        except (BadSignature, ValueError):
+            return False
+        now = time.time() if now is None else now
+        return 0 <= now - written_at < self.seconds
+
+
+class ReplicaRouter:
+    """Picks a replica connection for read-only work, or None for the primary"""
+
+    def __init__(self, replicas, secret, max_lag=MAX_REPLICA_LAG, pin_seconds=READ_PIN_SECONDS):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.pins = ReadPins(secret, pin_seconds)
+        self._next = itertools.cycle(range(len(replicas))) if replicas else None
+        self._next_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, secret):
+        return cls([Replica(host, port) for host, port in parse_hosts(REPLICA_HOSTS)], secret)
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    @property
+    def pin_seconds(self):
+        return self.pins.seconds
+
+    def pin(self):
+        """Token keeping a client's reads on the primary until its writes have replicated"""
+        return self.pins.issue()
+
+    def is_pinned(self, token):
+        return self.pins.is_pinned(token)
+
+    def read_connection(self, pin=None):
+        """Connection to a fresh replica, round-robin; None means use the primary.
+
+        pin is the client's read pin token, if it sent one.
+        """
+        if not self.enabled or self.is_pinned(pin):
+            return None
+        with self._next_lock:
+            start = next(self._next)
+        now = time.monotonic()
+        for offset in range(len(self.replicas)):
+            conn = self.replicas[(start + offset) % len(self.replicas)].connect(now, self.max_lag)
+            if conn is not None:
+                return conn
+        return None
@@ -0,0 +1,254 @@
+"""EXPLAIN the API's hot queries and flag any that fall back to a full scan.
+
+Runs against a scratch MySQL database with the migrations applied, e.g. a
+local container:
+
+    docker run -d --name price-tracker-mysql -p 3306:3306 -e MYSQL_DATABASE=price_tracker \\
+        -e MYSQL_USER=tracker_user -e MYSQL_PASSWORD=password -e MYSQL_ROOT_PASSWORD=root mysql:8.0
+    python migrate.py
+    python explain_check.py --seed 20000
+
+--seed fills the tables with synthetic rows first, since the optimizer
+happily scans near-empty tables. A table access of type ALL (full table
+scan) or index (full index scan) is flagged unless the query is listed as
+scanning by design. Exits non-zero when anything is flagged.
+"""
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+
+from db import get_database_connection
+
+# Access types that read a whole table or index
+SCAN_TYPES = ('ALL', 'index')
+
+CATEGORIES = ['tv', 'laptops', 'mobile_phones', 'TV']
+COMPANIES = ['bigdeals.lk', 'singersl.com', 'singhagiri.lk']
+
+
+class CapturingCursor:
+    """Stands in for a cursor to record the SQL a helper would run"""
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, sql, params=()):
+        self.executed.append((sql, tuple(params)))
+
+    def fetchall(self):
+        return []
+
+    def fetchone(self):
+        return None
+
+
+def hot_queries():
+    """(name, sql, params, scan_allowed_on) for every query on a hot path.
+
+    Queries built by module-level constants or helpers are taken from the
+    code itself; inline route queries are mirrored here and must be kept in
+    step with app.py.
+    """
+    from app import PRODUCT_QUERY, PRODUCT_COMPETITORS_QUERY, fetch_latest_competitor_prices
+    from price_history_rollups import RAW_BUCKETS_SQL, RAW_BUCKET_START, DAILY_BUCKETS_SQL
+    from price_history_store import mapping_state_query, latest_rows_query
+
+    now = datetime.now()
+    week_ago = now - timedelta(days=7)
+    captured = CapturingCursor()
+    fetch_latest_competitor_prices(captured, 'p.category = %s', ('tv',))
+    category_competitors_sql, category_competitors_params = captured.executed[0]
+
+    return [
+        ('products: category + price filter',
+         'SELECT * FROM product_details WHERE 1=1 AND category = %s AND price BETWEEN %s AND %s LIMIT %s OFFSET %s',
+         ('tv', 10000, 200000, 10, 0), ()),
+        ('products: total count',
+         'SELECT COUNT(*) FROM product_details', (), ('product_details',)),
+        ('product by id', 'SELECT * FROM product_details WHERE id = %s', (1,), ()),
+        ('products by category', 'SELECT * FROM product_details WHERE category = %s', ('tv',), ()),
+        ('similar products: other companies in price band', '''
+            SELECT id, name, price, old_price, availability, images, company, ProductURL, category, created_at
+            FROM product_details
+            WHERE category = %s AND id != %s AND company != %s
+            AND price IS NOT NULL AND price > 0 AND price BETWEEN %s AND %s
+            ORDER BY ABS(price - %s) ASC
+            LIMIT %s
+        ''', ('tv', 1, 'singersl.com', 25000, 100000, 50000, 8), ()),
+        ('similar tvs by category', '''
+            SELECT DISTINCT id, name, price, old_price, availability, images, company, ProductURL, category
+            FROM product_details
+            WHERE category = %s AND id != %s
+            ORDER BY
+                CASE WHEN company != (SELECT company FROM product_details WHERE id = %s) THEN 0 ELSE 1 END,
+                ABS(price - (SELECT price FROM product_details WHERE id = %s)) ASC
+            LIMIT 8
+        ''', ('TV', 1, 1, 1), ()),
+        ('price alert upsert lookup',
+         'SELECT * FROM price_alerts WHERE user_id = %s AND product_id = %s', (1, 1), ()),
+        ('price alerts of a user', '''
+            SELECT p.name, pa.alert_price
+            FROM price_alerts pa
+            JOIN product_details p ON pa.product_id = p.id
+            WHERE pa.user_id = %s
+        ''', (1,), ()),
+        ('product competitor lookup', PRODUCT_QUERY, (1,), ()),
+        ('product competitors with latest prices', PRODUCT_COMPETITORS_QUERY, (1,), ()),
+        ('category competitors with latest prices', category_competitors_sql, category_competitors_params, ()),
+        ('competitor price history', '''
+            SELECT cph.price, cph.old_price, cph.availability, cph.valid_from,
+                   IF(cph.id = latest.id,
+                      GREATEST(cph.valid_to, COALESCE(cp.last_checked_at, cph.valid_to)),
+                      cph.valid_to)
+            FROM competitor_price_history cph
+            JOIN competitor_products cp ON cp.id = cph.competitor_product_id
+            JOIN (
+                SELECT MAX(id) AS id FROM competitor_price_history WHERE competitor_product_id = %s
+            ) latest
+            WHERE cph.competitor_product_id = %s AND cph.valid_from <= %s
+            AND (cph.valid_to >= %s OR cph.id = latest.id)
+            ORDER BY cph.valid_from
+        ''', (1, 1, now, now - timedelta(days=30)), ()),
+        # The competitor overview aggregates every active mapping's history by design
+        ('competitors overview', '''
+            SELECT c.*, COUNT(cp.id), AVG(cph.price),
+                   MAX(GREATEST(cph.valid_to, COALESCE(cp.last_checked_at, cph.valid_to)))
+            FROM competitors c
+            LEFT JOIN competitor_products cp ON c.id = cp.competitor_id AND cp.is_active = TRUE
+            LEFT JOIN (
+                SELECT competitor_product_id, MAX(id) AS id
+                FROM competitor_price_history
+                GROUP BY competitor_product_id
+            ) latest ON latest.competitor_product_id = cp.id
+            LEFT JOIN competitor_price_history cph ON cp.id = cph.competitor_product_id
+                AND IF(cph.id = latest.id,
+                       GREATEST(cph.valid_to, COALESCE(cp.last_checked_at, cph.valid_to)),
+                       cph.valid_to) >= DATE_SUB(NOW(), INTERVAL 7 DAY)
+            WHERE c.status = 'active'
+            GROUP BY c.id
+            ORDER BY c.name
+        ''', (), ('competitors', 'competitor_price_history')),
+        ('price store: mapping state',) + mapping_state_query([(1,), (2,), (3,)]) + ((),),
+        ('price store: latest intervals',) + latest_rows_query([1, 2, 3]) + ((),),
+        ('updater: due mappings', '''
+            SELECT cp.id, cp.competitor_url
+            FROM competitor_products cp
+            JOIN competitors c ON cp.competitor_id = c.id
+            WHERE cp.is_active = TRUE AND c.status = 'active'
+              AND (cp.next_check_at IS NULL OR cp.next_check_at <= NOW())
+        ''', (), ('competitors',)),
+        ('price history: hourly buckets',
+         RAW_BUCKETS_SQL.format(bucket_start=RAW_BUCKET_START['hour']), (1, week_ago, now), ()),
+        ('price history: daily rollups', DAILY_BUCKETS_SQL, (1, week_ago.date(), now.date()), ()),
+    ]
+
+
+def explain(cursor, sql, params):
+    cursor.execute('EXPLAIN ' + sql, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def full_scans(plan, allowed_tables=()):
+    """Plan rows that read a whole table or index, minus the allowed tables"""
+    flagged = []
+    for row in plan:
+        table = row.get('table') or ''
+        if row.get('type') not in SCAN_TYPES or table.startswith('<') or table in allowed_tables:
+            continue
+        flagged.append(row)
+    return flagged
+
+
+def seed(conn, products):
+    """Fill an empty scratch database with synthetic rows, then ANALYZE"""
+    rng = random.Random(1)
+    cursor = conn.cursor()
+    now = datetime.now()
+    cursor.execute("INSERT INTO users (username, email, password) VALUES ('explain', 'explain@example.com', 'x')")
+    user_id = cursor.lastrowid
+    cursor.executemany(
+        'INSERT INTO competitors (name, website_url) VALUES (%s, %s)',
+        [(company, f'https://{company}') for company in COMPANIES])
+
+    rows = []
+    for n in range(products):
+        price = rng.randint(5000, 500000)
+        rows.append((f'Product {n}', price, price + 5000, 'In Stock', f'https://img.example.lk/{n}.jpg',
+                     rng.choice(COMPANIES), f'https://shop.example.lk/product/{n}', rng.choice(CATEGORIES)))
+    cursor.executemany('''
+        INSERT INTO product_details (name, price, old_price, availability, images, company, ProductURL, category)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ''', rows)
+    cursor.execute('SELECT MIN(id), MAX(id) FROM product_details')
+    first_id, last_id = cursor.fetchone()
+    cursor.execute('SELECT id FROM competitors')
+    competitor_ids = [row[0] for row in cursor.fetchall()]
+
+    cursor.executemany(
+        'INSERT INTO competitor_products (product_id, competitor_id, competitor_url) VALUES (%s, %s, %s)',
+        [(product_id, rng.choice(competitor_ids), f'https://competitor.example.lk/p/{product_id}')
+         for product_id in range(first_id, last_id + 1, 2)])
+    cursor.execute('SELECT id FROM competitor_products')
+    mapping_ids = [row[0] for row in cursor.fetchall()]
+
+    history = []
+    for mapping_id in mapping_ids:
+        t = now - timedelta(days=60)
+        for _ in range(5):
+            end = t + timedelta(days=rng.randint(1, 12))
+            history.append((mapping_id, rng.randint(5000, 500000), None, 'In Stock', t, t, end))
+            t = end
+    cursor.executemany('''
+        INSERT INTO competitor_price_history
+        (competitor_product_id, price, old_price, availability, scraped_at, valid_from, valid_to)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ''', history)
+
+    cursor.executemany(
+        'INSERT INTO price_history (product_id, price, timestamp) VALUES (%s, %s, %s)',
+        [(rng.randint(first_id, last_id), rng.randint(5000, 500000), now - timedelta(hours=rng.randint(0, 24 * 30)))
+         for _ in range(products * 5)])
+    cursor.executemany(
+        'INSERT INTO price_alerts (user_id, product_id, alert_price) VALUES (%s, %s, %s)',
+        [(user_id, product_id, 10000) for product_id in range(first_id, min(last_id, first_id + 50) + 1)])
+
+    for table in ('product_details', 'competitors', 'competitor_products', 'competitor_price_history',
+                  'price_history', 'price_alerts', 'users'):
+        cursor.execute(f'ANALYZE TABLE {table}')
+        cursor.fetchall()
+    conn.commit()
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag hot queries that fall back to full scans")
+    parser.add_argument('--seed', type=int, metavar='PRODUCTS',
+                        help="insert this many synthetic products (and related rows) first; scratch databases only")
+    parser.add_argument('--verbose', action='store_true', help="print every plan row")
+    args = parser.parse_args()
+
+    conn = get_database_connection()
+    if args.seed:
+        seed(conn, args.seed)
+
+    cursor = conn.cursor()
+    flagged_queries = 0
+    for name, sql, params, allowed_tables in hot_queries():
+        plan = explain(cursor, sql, params)
+        flagged = full_scans(plan, allowed_tables)
+        print(f"{'FULL SCAN' if flagged else 'ok':<10} {name}")
+        for row in (plan if args.verbose else flagged):
+            print(f"           {row.get('table')}: type={row.get('type')} key={row.get('key')} "
+                  f"rows={row.get('rows')} extra={row.get('Extra')}")
+        flagged_queries += bool(flagged)
+    cursor.close()
+    conn.close()
+
+    print(f"{flagged_queries} queries with full scans")
+    sys.exit(1 if flagged_queries else 0)
+
+
+if __name__ == '__main__':
+    main()
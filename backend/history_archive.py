@@ -0,0 +1,343 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # archive support is optional
+    np = pa = ds = None
+
+# Cold price history tiering. Rows older than HISTORY_HOT_DAYS are moved out
+# of MySQL into Parquet files partitioned by retailer and month:
+#
+#   <archive_dir>/competitor_price_history/competitor_id=3/month=2025-01/part-....parquet
+#   <archive_dir>/price_history/company=singersl.com/month=2025-01/part-....parquet
+#
+# and read back with vectorized filters/aggregations for long-range queries.
+
+ARCHIVE_DIR = os.getenv('HISTORY_ARCHIVE_DIR')
+HOT_DAYS = int(os.getenv('HISTORY_HOT_DAYS', '180'))
+CHUNK_SIZE = 50000
+# company partition for price_history rows whose product is gone
+UNKNOWN_COMPANY = 'unknown'
+
+COMPETITOR_HISTORY_SCHEMA = None
+PRICE_HISTORY_SCHEMA = None
+if pa is not None:
+    COMPETITOR_HISTORY_SCHEMA = pa.schema([
+        ('id', pa.int64()),
+        ('competitor_product_id', pa.int64()),
+        ('price', pa.float64()),
+        ('old_price', pa.float64()),
+        ('availability', pa.string()),
+        ('valid_from', pa.timestamp('us')),
+        ('valid_to', pa.timestamp('us')),
+        ('competitor_id', pa.int64()),
+        ('month', pa.string()),
+    ])
+    PRICE_HISTORY_SCHEMA = pa.schema([
+        ('product_id', pa.int64()),
+        ('price', pa.float64()),
+        ('timestamp', pa.timestamp('us')),
+        ('company', pa.string()),
+        ('month', pa.string()),
+    ])
+
+
+def archive_enabled():
+    return ARCHIVE_DIR is not None and pa is not None
+
+
+def hot_cutoff(hot_days=None):
+    """Oldest timestamp still guaranteed to be in MySQL"""
+    return datetime.now() - timedelta(days=HOT_DAYS if hot_days is None else hot_days)
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("History archiving needs numpy and pyarrow installed")
+
+
+def _column(rows, index, arrow_type):
+    values = [row[index] for row in rows]
+    if pa.types.is_floating(arrow_type):
+        # MySQL DECIMAL columns arrive as Decimal
+        values = [float(v) if v is not None else None for v in values]
+    return pa.array(values, type=arrow_type)
+
+
+def _write_chunk(rows, schema, columns, partition_by, path, basename):
+    arrays = [_column(rows, i, schema.field(name).type) for i, name in enumerate(columns)]
+    table = pa.Table.from_arrays(arrays, schema=schema)
+    ds.write_dataset(
+        table, path, format='parquet',
+        partitioning=ds.partitioning(pa.schema([schema.field(name) for name in partition_by]), flavor='hive'),
+        basename_template=basename + '-{i}.parquet',
+        existing_data_behavior='overwrite_or_ignore'
+    )
+
+
+COMPETITOR_ARCHIVE_COLUMNS = '''
+    cph.id, cph.competitor_product_id, cph.price, cph.old_price, cph.availability,
+    cph.valid_from, cph.valid_to, cp.competitor_id
+'''
+
+
+def _write_competitor_rows(rows, path, basename):
+    rows = [row + (row[5].strftime('%Y-%m'),) for row in rows]
+    _write_chunk(rows, COMPETITOR_HISTORY_SCHEMA, COMPETITOR_HISTORY_SCHEMA.names,
+                 ['competitor_id', 'month'], path, basename)
+
+
+def archive_competitor_price_history(conn, archive_dir=None, hot_days=None):
+    """Move closed competitor price intervals older than the cutoff to Parquet"""
+    _require_pyarrow()
+    archive_dir = archive_dir or ARCHIVE_DIR
+    cutoff = hot_cutoff(hot_days)
+    path = os.path.join(archive_dir, 'competitor_price_history')
+    run_id = int(time.time())
+
+    cursor = conn.cursor()
+    archived = 0
+    last_id = 0
+    while True:
+        # Keyset pagination keeps each chunk an index range scan
+        cursor.execute(f'''
+            SELECT {COMPETITOR_ARCHIVE_COLUMNS}
+            FROM competitor_price_history cph
+            JOIN competitor_products cp ON cp.id = cph.competitor_product_id
+            WHERE cph.valid_to < %s AND cph.id > %s
+            -- The latest interval is still open (it runs until cp.last_checked_at)
+            AND cph.id < (SELECT MAX(id) FROM competitor_price_history WHERE competitor_product_id = cph.competitor_product_id)
+            ORDER BY cph.id
+            LIMIT %s
+        ''', (cutoff, last_id, CHUNK_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        _write_competitor_rows(rows, path, f'part-{run_id}-{last_id}')
+        cursor.executemany('DELETE FROM competitor_price_history WHERE id = %s', [(row[0],) for row in rows])
+        conn.commit()
+        archived += len(rows)
+        last_id = rows[-1][0]
+
+    cursor.close()
+    print(f"Archived {archived} competitor_price_history rows older than {cutoff:%Y-%m-%d}")
+    return archived
+
+
+def export_competitor_partition(conn, partition, open_ids, closed_at, archive_dir=None):
+    """Copy every interval in a competitor_price_history partition to Parquet
+    before the partition is dropped; nothing is deleted here.
+
+    The still-open intervals in open_ids are written as ending at closed_at,
+    the partition's upper bound, where the maintenance task continues them.
+    """
+    _require_pyarrow()
+    path = os.path.join(archive_dir or ARCHIVE_DIR, 'competitor_price_history')
+    run_id = int(time.time())
+
+    cursor = conn.cursor()
+    exported = 0
+    last_id = 0
+    while True:
+        cursor.execute(f'''
+            SELECT {COMPETITOR_ARCHIVE_COLUMNS}
+            FROM competitor_price_history PARTITION ({partition}) cph
+            -- The whole partition is dropped, so intervals of deleted mappings
+            -- are kept too (under a null competitor_id)
+            LEFT JOIN competitor_products cp ON cp.id = cph.competitor_product_id
+            WHERE cph.id > %s
+            ORDER BY cph.id
+            LIMIT %s
+        ''', (last_id, CHUNK_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        rows = [row[:6] + (closed_at,) + row[7:] if row[0] in open_ids else row for row in rows]
+        _write_competitor_rows(rows, path, f'{partition}-{run_id}-{last_id}')
+        exported += len(rows)
+        last_id = rows[-1][0]
+
+    cursor.close()
+    return exported
+
+
+def archive_price_history(conn, archive_dir=None, hot_days=None):
+    """Move price_history rows older than the cutoff to Parquet, a month at a time.
+
+    Each month is read in CHUNK_SIZE pages by id, and every page is written
+    to a file named after its month and first id, so a run interrupted
+    between writing and deleting overwrites the same files when rerun
+    instead of archiving the rows twice. Rows whose product no longer exists
+    (databases created before the foreign key) are archived under
+    UNKNOWN_COMPANY, since every id in a page's range is deleted.
+    """
+    _require_pyarrow()
+    archive_dir = archive_dir or ARCHIVE_DIR
+    cutoff = hot_cutoff(hot_days)
+    path = os.path.join(archive_dir, 'price_history')
+
+    cursor = conn.cursor()
+    cursor.execute('SELECT MIN(timestamp) FROM price_history WHERE timestamp < %s', (cutoff,))
+    oldest = cursor.fetchone()[0]
+    archived = 0
+    month = datetime(oldest.year, oldest.month, 1) if oldest else cutoff
+    while month < cutoff:
+        next_month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+        month_end = min(next_month, cutoff)
+        last_id = 0
+        while True:
+            cursor.execute('''
+                SELECT ph.id, ph.product_id, ph.price, ph.timestamp, COALESCE(p.company, %s)
+                FROM price_history ph
+                LEFT JOIN product_details p ON p.id = ph.product_id
+                WHERE ph.timestamp >= %s AND ph.timestamp < %s AND ph.id > %s
+                ORDER BY ph.id
+                LIMIT %s
+            ''', (UNKNOWN_COMPANY, month, month_end, last_id, CHUNK_SIZE))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            first_id, last_id = rows[0][0], rows[-1][0]
+            _write_chunk([row[1:] + (month.strftime('%Y-%m'),) for row in rows], PRICE_HISTORY_SCHEMA,
+                         PRICE_HISTORY_SCHEMA.names, ['company', 'month'], path, f'part-{month:%Y%m}-{first_id}')
+            cursor.execute('''
+                DELETE FROM price_history WHERE timestamp >= %s AND timestamp < %s AND id BETWEEN %s AND %s
+            ''', (month, month_end, first_id, last_id))
+            conn.commit()
+            archived += len(rows)
+        month = next_month
+
+    cursor.close()
+    print(f"Archived {archived} price_history rows older than {cutoff:%Y-%m-%d}")
+    return archived
+
+
+def _month_filter(start, end):
+    # Partition pruning: only open the month directories that can match
+    months = []
+    month = datetime(start.year, start.month, 1)
+    while month <= end:
+        months.append(month.strftime('%Y-%m'))
+        month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return ds.field('month').isin(months)
+
+
+def _dataset(archive_dir, table_name):
+    path = os.path.join(archive_dir or ARCHIVE_DIR, table_name)
+    if not os.path.isdir(path):
+        return None
+    return ds.dataset(path, format='parquet', partitioning='hive')
+
+
+def load_archived_intervals(competitor_product_id, start, end, archive_dir=None, competitor_id=None):
+    """Archived competitor price intervals overlapping [start, end], as
+    (price, old_price, availability, valid_from, valid_to) tuples.
+
+    Files are partitioned by the month an interval started in, so months
+    after end are pruned; earlier months can hold intervals still running at
+    start and are filtered on valid_to instead. Passing the mapping's
+    competitor_id also prunes every other retailer's directory.
+    """
+    _require_pyarrow()
+    dataset = _dataset(archive_dir, 'competitor_price_history')
+    if dataset is None:
+        return []
+    partition_filter = ds.field('month') <= end.strftime('%Y-%m')
+    if competitor_id is not None:
+        partition_filter &= ds.field('competitor_id') == competitor_id
+    table = dataset.to_table(
+        columns=['price', 'old_price', 'availability', 'valid_from', 'valid_to'],
+        filter=partition_filter
+        & (ds.field('competitor_product_id') == competitor_product_id)
+        & (ds.field('valid_to') >= pa.scalar(start, pa.timestamp('us')))
+        & (ds.field('valid_from') <= pa.scalar(end, pa.timestamp('us')))
+    )
+    columns = [table.column(name).to_pylist() for name in table.column_names]
+    return sorted(zip(*columns), key=lambda row: row[3])
+
+
+def load_archived_prices(product_id, start, end, archive_dir=None):
+    """Archived (price, timestamp) rows for a product within [start, end)"""
+    _require_pyarrow()
+    dataset = _dataset(archive_dir, 'price_history')
+    if dataset is None:
+        return np.array([], dtype='datetime64[us]'), np.array([], dtype='float64')
+    table = dataset.to_table(
+        columns=['timestamp', 'price'],
+        filter=_month_filter(start, end)
+        & (ds.field('product_id') == product_id)
+        & (ds.field('timestamp') >= pa.scalar(start, pa.timestamp('us')))
+        & (ds.field('timestamp') < pa.scalar(end, pa.timestamp('us')))
+    )
+    timestamps = table.column('timestamp').to_numpy().astype('datetime64[us]')
+    prices = table.column('price').to_numpy(zero_copy_only=False).astype('float64')
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], prices[order]
+
+
+def _bucket_keys(timestamps, bucket):
+    if bucket == 'hour':
+        return timestamps.astype('datetime64[h]').astype('datetime64[us]')
+    days = timestamps.astype('datetime64[D]')
+    if bucket == 'week':
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday like MySQL WEEKDAY()
+        days = days - ((days.astype('int64') + 3) % 7).astype('timedelta64[D]')
+    return days.astype('datetime64[us]')
+
+
+def bucket_prices(timestamps, prices, bucket):
+    """Vectorized min/max/avg/last per bucket over time-sorted arrays"""
+    if len(prices) == 0:
+        return []
+    keys = _bucket_keys(timestamps, bucket)
+    boundaries = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(prices)]))
+
+    mins = np.minimum.reduceat(prices, starts)
+    maxs = np.maximum.reduceat(prices, starts)
+    counts = ends - starts
+    avgs = np.add.reduceat(prices, starts) / counts
+    lasts = prices[ends - 1]
+
+    return [{
+        'bucket_start': keys[s].astype(datetime),
+        'min': float(mn),
+        'max': float(mx),
+        'avg': float(avg),
+        'last': float(last),
+        'samples': int(count),
+    } for s, mn, mx, avg, last, count in zip(starts, mins, maxs, avgs, lasts, counts)]
+
+
+def archived_price_buckets(product_id, bucket, start, end, archive_dir=None):
+    timestamps, prices = load_archived_prices(product_id, start, end, archive_dir)
+    return bucket_prices(timestamps, prices, bucket)
+
+
+def merge_with_hot_buckets(archived, hot):
+    """Join archived buckets onto MySQL buckets, combining a shared boundary bucket"""
+    from price_history_rollups import merge_bucket
+
+    if archived and hot and archived[-1]['bucket_start'] == hot[0]['bucket_start']:
+        return archived[:-1] + [merge_bucket(archived[-1], hot[0])] + hot[1:]
+    return archived + hot
+
+
+if __name__ == '__main__':
+    import argparse
+    from db import get_database_connection
+
+    parser = argparse.ArgumentParser(description="Move cold price history from MySQL to Parquet")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR, required=ARCHIVE_DIR is None)
+    parser.add_argument('--hot-days', type=int, default=HOT_DAYS)
+    args = parser.parse_args()
+
+    conn = get_database_connection()
+    archive_competitor_price_history(conn, args.archive_dir, args.hot_days)
+    archive_price_history(conn, args.archive_dir, args.hot_days)
+    conn.close()
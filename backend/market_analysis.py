@@ -0,0 +1,99 @@
+import numpy as np
+
+# Batch market analysis over flat NumPy arrays.
+#
+# Input is one row per (our product, competitor mapping): the row's product
+# position and the competitor's latest price (NaN when it has never been
+# scraped). Every per-product statistic is computed with grouped reductions
+# over all rows at once instead of Python loops per product.
+
+
+def _none_if_nan(value, digits=None):
+    if value is None or np.isnan(value):
+        return None
+    value = float(value)
+    return round(value, digits) if digits is not None else value
+
+
+def price_differences(our_prices, row_products, competitor_prices):
+    """Per-row absolute and percentage difference from our price"""
+    ours = np.asarray(our_prices, dtype='float64')[row_products]
+    difference = competitor_prices - ours
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentage = np.where(ours > 0, np.round(difference / ours * 100, 2), np.nan)
+    return difference, percentage
+
+
+def analyze(our_prices, row_products, competitor_prices):
+    """Market statistics for many products in one pass.
+
+    our_prices: our price per product (length n)
+    row_products: product position (0..n-1) for each competitor row
+    competitor_prices: latest competitor price per row, NaN if unknown
+
+    Returns a list of n market_analysis dicts.
+    """
+    our_prices = np.asarray(our_prices, dtype='float64')
+    row_products = np.asarray(row_products, dtype='int64')
+    competitor_prices = np.asarray(competitor_prices, dtype='float64')
+    n = len(our_prices)
+
+    total = np.bincount(row_products, minlength=n)
+
+    # Competitor prices of 0 mean the scrape found no price, as before
+    priced = ~np.isnan(competitor_prices) & (competitor_prices > 0)
+    idx = row_products[priced]
+    prices = competitor_prices[priced]
+    ours = our_prices[idx]
+
+    counts = np.bincount(idx, minlength=n)
+    cheaper = np.bincount(idx, weights=prices < ours, minlength=n).astype('int64')
+    more_expensive = np.bincount(idx, weights=prices > ours, minlength=n).astype('int64')
+    equal = counts - cheaper - more_expensive
+    sums = np.bincount(idx, weights=prices, minlength=n)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average = np.where(counts > 0, sums / counts, np.nan)
+        # Share of competitors priced below us, counting ties as half; undefined
+        # without our own price, where every comparison is False
+        percentile_rank = np.where((counts > 0) & ~np.isnan(our_prices),
+                                   (cheaper + 0.5 * equal) / counts * 100, np.nan)
+        price_index = np.where((counts > 0) & (average > 0), our_prices / average * 100, np.nan)
+
+    # Sorting by (product, price) puts each product's prices in one ascending run
+    order = np.lexsort((prices, idx))
+    sorted_prices = prices[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    has_prices = counts > 0
+    lowest = np.full(n, np.nan)
+    highest = np.full(n, np.nan)
+    median = np.full(n, np.nan)
+    lowest[has_prices] = sorted_prices[starts[has_prices]]
+    highest[has_prices] = sorted_prices[starts[has_prices] + counts[has_prices] - 1]
+    lower_mid = starts + (counts - 1) // 2
+    upper_mid = starts + counts // 2
+    median[has_prices] = (sorted_prices[lower_mid[has_prices]] + sorted_prices[upper_mid[has_prices]]) / 2
+
+    return [{
+        'total_competitors': int(total[i]),
+        'cheaper_options': int(cheaper[i]),
+        'more_expensive': int(more_expensive[i]),
+        'lowest_competitor_price': _none_if_nan(lowest[i]),
+        'highest_competitor_price': _none_if_nan(highest[i]),
+        'average_competitor_price': _none_if_nan(average[i]),
+        'median_competitor_price': _none_if_nan(median[i]),
+        'percentile_rank': _none_if_nan(percentile_rank[i], 1),
+        'price_index': _none_if_nan(price_index[i], 1),
+    } for i in range(n)]
+
+
+def summarize(analyses):
+    """Category-level summary over the output of analyze()"""
+    with_prices = [a for a in analyses if a['lowest_competitor_price'] is not None]
+    indices = [a['price_index'] for a in with_prices if a['price_index'] is not None]
+    return {
+        'products': len(analyses),
+        'products_with_competitor_prices': len(with_prices),
+        'cheapest_in_market': sum(1 for a in with_prices if a['cheaper_options'] == 0),
+        'median_price_index': round(float(np.median(indices)), 1) if indices else None,
+    }
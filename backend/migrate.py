@@ -0,0 +1,161 @@
+"""Apply the versioned SQL migrations in migrations/ in order.
+
+Files are named NNN_description.sql and applied once each; applied versions
+are recorded in schema_migrations together with a checksum, and a file that
+changed after it was applied is reported instead of being re-run.
+
+    python migrate.py              # apply everything pending
+    python migrate.py --status     # list applied and pending migrations
+    python migrate.py --baseline 6 # existing database: record 001-006 as applied without running them
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+
+from db import get_database_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+CREATE_MIGRATIONS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT NOT NULL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+RECORD_MIGRATION_SQL = 'INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)'
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, encoding='utf-8') as f:
+            self.sql = f.read()
+        self.checksum = hashlib.sha256(self.sql.encode('utf-8')).hexdigest()
+
+    def statements(self):
+        return split_statements(self.sql)
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Migrations in version order; duplicate versions are an error"""
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {filename}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def split_statements(sql):
+    """Split a migration into statements on ';' at the end of a line, dropping -- comments"""
+    statements = []
+    current = []
+    for line in sql.splitlines():
+        if line.strip().startswith('--'):
+            continue
+        current.append(line)
+        if line.rstrip().endswith(';'):
+            statement = '\n'.join(current).strip().rstrip(';').strip()
+            if statement:
+                statements.append(statement)
+            current = []
+    tail = '\n'.join(current).strip()
+    if tail:
+        statements.append(tail)
+    return statements
+
+
+def applied_migrations(cursor):
+    cursor.execute(CREATE_MIGRATIONS_TABLE_SQL)
+    cursor.execute('SELECT version, checksum FROM schema_migrations')
+    return dict(cursor.fetchall())
+
+
+def migrate(conn, migrations, target=None, baseline=None, dry_run=False):
+    """Apply pending migrations up to target; returns the versions applied.
+
+    MySQL commits DDL implicitly, so each migration is recorded right after
+    it ran: a failure leaves earlier migrations applied and recorded.
+    """
+    cursor = conn.cursor()
+    applied = applied_migrations(cursor)
+    conn.commit()
+
+    for migration in migrations:
+        if migration.version in applied and applied[migration.version] != migration.checksum:
+            print(f"WARNING: {migration.path} changed after it was applied")
+
+    done = []
+    for migration in migrations:
+        if migration.version in applied or (target is not None and migration.version > target):
+            continue
+        if baseline is not None and migration.version <= baseline:
+            print(f"Baseline {migration.version:03d}_{migration.name} (not run)")
+        elif dry_run:
+            print(f"Pending {migration.version:03d}_{migration.name}: {len(migration.statements())} statements")
+            continue
+        else:
+            print(f"Applying {migration.version:03d}_{migration.name}")
+            for statement in migration.statements():
+                cursor.execute(statement)
+        cursor.execute(RECORD_MIGRATION_SQL, (migration.version, migration.name, migration.checksum))
+        conn.commit()
+        done.append(migration.version)
+    cursor.close()
+    return done
+
+
+def print_status(conn, migrations):
+    cursor = conn.cursor()
+    applied = applied_migrations(cursor)
+    conn.commit()
+    cursor.close()
+    for migration in migrations:
+        if migration.version not in applied:
+            state = 'pending'
+        elif applied[migration.version] != migration.checksum:
+            state = 'applied (file changed since)'
+        else:
+            state = 'applied'
+        print(f"{migration.version:03d}_{migration.name:<45} {state}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    parser.add_argument('--status', action='store_true', help="list migrations and whether they are applied")
+    parser.add_argument('--target', type=int, help="stop after this version")
+    parser.add_argument('--baseline', type=int,
+                        help="record migrations up to this version as applied without running them")
+    parser.add_argument('--dry-run', action='store_true', help="list pending migrations without applying them")
+    args = parser.parse_args()
+
+    migrations = load_migrations()
+    conn = get_database_connection()
+    try:
+        if args.status:
+            print_status(conn, migrations)
+            return
+        done = migrate(conn, migrations, args.target, args.baseline, args.dry_run)
+        if not args.dry_run:
+            print(f"{len(done)} migrations applied" if done else "Schema is up to date")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
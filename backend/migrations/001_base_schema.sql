@@ -0,0 +1,86 @@
+-- Base schema: the tables as the backend used them before the later
+-- migrations in this directory. Existing databases already have these
+-- tables; mark them with `python migrate.py --baseline 1` (or up to the last
+-- migration already applied by hand) instead of running this file.
+
+CREATE TABLE IF NOT EXISTS users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(50) NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_login DATETIME NULL,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    UNIQUE KEY uq_users_username (username),
+    UNIQUE KEY uq_users_email (email)
+);
+
+-- One row per scrape of one of our retailers' products
+CREATE TABLE IF NOT EXISTS product_details (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(500) NOT NULL,
+    price DECIMAL(12, 2) NULL,
+    old_price DECIMAL(12, 2) NULL,
+    availability VARCHAR(50) NULL,
+    images VARCHAR(1000) NULL,
+    company VARCHAR(100) NULL,
+    ProductURL VARCHAR(500) NULL,
+    category VARCHAR(100) NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS price_history (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    product_id INT NOT NULL,
+    price DECIMAL(12, 2) NOT NULL,
+    timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_price_history_product FOREIGN KEY (product_id) REFERENCES product_details (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS price_alerts (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    product_id INT NOT NULL,
+    alert_price DECIMAL(12, 2) NOT NULL,
+    triggered BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_price_alerts_user FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+    CONSTRAINT fk_price_alerts_product FOREIGN KEY (product_id) REFERENCES product_details (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS competitors (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    website_url VARCHAR(500) NOT NULL,
+    logo_url VARCHAR(500) NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'active',
+    scrape_frequency_hours INT NOT NULL DEFAULT 24,
+    last_scraped DATETIME NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Which competitor listing corresponds to which of our products
+CREATE TABLE IF NOT EXISTS competitor_products (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    product_id INT NOT NULL,
+    competitor_id INT NOT NULL,
+    competitor_sku VARCHAR(100) NULL,
+    competitor_url VARCHAR(1000) NOT NULL,
+    product_name VARCHAR(500) NULL,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_competitor_products_product FOREIGN KEY (product_id) REFERENCES product_details (id) ON DELETE CASCADE,
+    CONSTRAINT fk_competitor_products_competitor FOREIGN KEY (competitor_id) REFERENCES competitors (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS competitor_price_history (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    competitor_product_id INT NOT NULL,
+    price DECIMAL(12, 2) NULL,
+    old_price DECIMAL(12, 2) NULL,
+    availability VARCHAR(50) NULL,
+    scraped_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_cph_competitor_product (competitor_product_id),
+    CONSTRAINT fk_cph_competitor_product FOREIGN KEY (competitor_product_id) REFERENCES competitor_products (id) ON DELETE CASCADE
+);
@@ -0,0 +1,51 @@
+-- Convert competitor_price_history to run-length storage (MySQL 8.0+).
+--
+-- Adds a [valid_from, valid_to] interval to every row, then collapses each run
+-- of consecutive identical observations (price, old_price, availability) for a
+-- mapping into its first row, whose valid_to becomes the last scrape of the run.
+-- Run during a quiet period; the scraper must not write while this runs.
+
+ALTER TABLE competitor_price_history
+    ADD COLUMN valid_from DATETIME NULL,
+    ADD COLUMN valid_to DATETIME NULL;
+
+UPDATE competitor_price_history
+SET valid_from = scraped_at, valid_to = scraped_at;
+
+-- Number the runs: a row starts a new run when any value differs from the previous scrape
+CREATE TEMPORARY TABLE cph_runs AS
+SELECT id, competitor_product_id, scraped_at,
+       SUM(is_change) OVER (PARTITION BY competitor_product_id ORDER BY scraped_at, id) AS run_no
+FROM (
+    SELECT id, competitor_product_id, scraped_at,
+           CASE WHEN LAG(price) OVER w <=> price
+                 AND LAG(old_price) OVER w <=> old_price
+                 AND LAG(availability) OVER w <=> availability
+                 AND LAG(id) OVER w IS NOT NULL
+                THEN 0 ELSE 1 END AS is_change
+    FROM competitor_price_history
+    WINDOW w AS (PARTITION BY competitor_product_id ORDER BY scraped_at, id)
+) flagged;
+
+CREATE TEMPORARY TABLE cph_run_bounds AS
+SELECT MIN(id) AS keep_id, MAX(scraped_at) AS run_end
+FROM cph_runs
+GROUP BY competitor_product_id, run_no;
+
+ALTER TABLE cph_run_bounds ADD PRIMARY KEY (keep_id);
+
+UPDATE competitor_price_history cph
+JOIN cph_run_bounds b ON b.keep_id = cph.id
+SET cph.valid_to = b.run_end;
+
+DELETE cph FROM competitor_price_history cph
+LEFT JOIN cph_run_bounds b ON b.keep_id = cph.id
+WHERE b.keep_id IS NULL;
+
+DROP TEMPORARY TABLE cph_runs;
+DROP TEMPORARY TABLE cph_run_bounds;
+
+ALTER TABLE competitor_price_history
+    MODIFY valid_from DATETIME NOT NULL,
+    MODIFY valid_to DATETIME NOT NULL,
+    ADD INDEX idx_cph_product_valid_to (competitor_product_id, valid_to);
@@ -0,0 +1,17 @@
+-- Daily rollups of price_history backing the downsampled
+-- /product/<id>/price-history?bucket=... endpoint.
+-- Backfill once after creating: refresh_daily_rollups(cursor, since=<first day>)
+
+CREATE TABLE IF NOT EXISTS price_history_daily (
+    product_id INT NOT NULL,
+    day DATE NOT NULL,
+    min_price DECIMAL(12, 2) NOT NULL,
+    max_price DECIMAL(12, 2) NOT NULL,
+    avg_price DECIMAL(12, 2) NOT NULL,
+    last_price DECIMAL(12, 2) NOT NULL,
+    samples INT NOT NULL,
+    PRIMARY KEY (product_id, day)
+);
+
+-- Hour buckets and the current day are aggregated from raw rows
+CREATE INDEX idx_price_history_product_timestamp ON price_history (product_id, timestamp);
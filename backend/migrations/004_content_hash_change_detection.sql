@@ -0,0 +1,23 @@
+-- Content-hash change detection (see price_history_store.py).
+--
+-- competitor_products remembers a hash of its last observation and when it
+-- was last checked, so unchanged scrapes skip the history table entirely.
+-- product_details rows carry the hash of their content so the crawler can
+-- skip re-inserting unchanged products.
+
+ALTER TABLE competitor_products
+    ADD COLUMN last_content_hash CHAR(16) NULL,
+    ADD COLUMN last_checked_at DATETIME NULL;
+
+-- Until now the open interval was extended on every scrape, so its valid_to
+-- is the last check. The hash is filled in by the first scrape after this.
+UPDATE competitor_products cp
+JOIN (
+    SELECT competitor_product_id, MAX(valid_to) AS last_checked_at
+    FROM competitor_price_history
+    GROUP BY competitor_product_id
+) h ON h.competitor_product_id = cp.id
+SET cp.last_checked_at = h.last_checked_at;
+
+ALTER TABLE product_details
+    ADD COLUMN content_hash CHAR(16) NULL;
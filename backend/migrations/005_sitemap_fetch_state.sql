@@ -0,0 +1,8 @@
+-- Sitemap discovery state (see scrape_test.scrape_from_sitemaps).
+-- last_fetched_at is when the previous successful discovery run started;
+-- only sitemap entries with a newer <lastmod> are scraped.
+
+CREATE TABLE IF NOT EXISTS sitemap_fetch_state (
+    retailer VARCHAR(32) NOT NULL PRIMARY KEY,
+    last_fetched_at DATETIME NOT NULL
+);
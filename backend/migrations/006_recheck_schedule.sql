@@ -0,0 +1,9 @@
+-- Out-of-stock aware re-check scheduling (see recheck_schedule.py).
+-- Unavailable checks in a row push next_check_at out exponentially; the
+-- updater skips mappings whose next_check_at is in the future, and sets
+-- is_active = FALSE after DEACTIVATE_AFTER_UNAVAILABLE of them.
+
+ALTER TABLE competitor_products
+    ADD COLUMN consecutive_unavailable INT NOT NULL DEFAULT 0,
+    ADD COLUMN next_check_at DATETIME NULL,
+    ADD INDEX idx_competitor_products_due (is_active, next_check_at);
@@ -0,0 +1,30 @@
+-- Composite indexes for the hot read paths. Each one is listed with the
+-- queries it serves; explain_check.py verifies none of them falls back to a
+-- full scan.
+
+-- /products?category=&minPrice=&maxPrice=, /products/category/<category>,
+-- /api/products/similar and /products/similar-tvs: category equality with
+-- a price range or price ordering, id for the exclusions
+ALTER TABLE product_details
+    ADD INDEX idx_pd_category_price (category, price, id),
+    -- The "different company" similar-product searches and per-company catalog reads
+    ADD INDEX idx_pd_category_company_price (category, company, price, id),
+    -- Latest row per product URL for the crawler's change detection
+    ADD INDEX idx_pd_url (ProductURL, id);
+
+-- Latest interval per mapping (MAX(id) ... GROUP BY competitor_product_id)
+-- and time-range reads of one mapping's history. The composite indexes
+-- also back the foreign key, so the single-column index is dropped.
+ALTER TABLE competitor_price_history
+    ADD INDEX idx_cph_product_id (competitor_product_id, id),
+    ADD INDEX idx_cph_product_scraped_at (competitor_product_id, scraped_at),
+    DROP INDEX idx_cph_competitor_product;
+
+-- Mappings of a product (competitor views) and of a competitor (statistics)
+ALTER TABLE competitor_products
+    ADD INDEX idx_cp_product_active (product_id, is_active, competitor_id),
+    ADD INDEX idx_cp_competitor_active (competitor_id, is_active);
+
+-- /price-alert upsert and the per-user alert lists
+ALTER TABLE price_alerts
+    ADD INDEX idx_price_alerts_user_product (user_id, product_id);
@@ -0,0 +1,48 @@
+-- Monthly range partitioning of competitor_price_history on scraped_at
+-- (see partition_maintenance.py). scraped_at is the start of each interval,
+-- so a row lives in the month its interval started.
+--
+-- MySQL requires the partitioning column in every unique key, so the
+-- primary key becomes (id, scraped_at); id stays AUTO_INCREMENT and unique
+-- in practice. Partitioned InnoDB tables cannot have foreign keys, so the
+-- key to competitor_products is dropped. Mappings are deactivated rather
+-- than deleted; rows of a deleted mapping stay until their month expires.
+--
+-- Rows before 2025 share one partition. Later months are added ahead of
+-- time by the maintenance task, which splits them off pmax.
+
+ALTER TABLE competitor_price_history DROP FOREIGN KEY fk_cph_competitor_product;
+
+ALTER TABLE competitor_price_history
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, scraped_at);
+
+ALTER TABLE competitor_price_history
+PARTITION BY RANGE COLUMNS (scraped_at) (
+    PARTITION p_before_2025 VALUES LESS THAN ('2025-01-01'),
+    PARTITION p202501 VALUES LESS THAN ('2025-02-01'),
+    PARTITION p202502 VALUES LESS THAN ('2025-03-01'),
+    PARTITION p202503 VALUES LESS THAN ('2025-04-01'),
+    PARTITION p202504 VALUES LESS THAN ('2025-05-01'),
+    PARTITION p202505 VALUES LESS THAN ('2025-06-01'),
+    PARTITION p202506 VALUES LESS THAN ('2025-07-01'),
+    PARTITION p202507 VALUES LESS THAN ('2025-08-01'),
+    PARTITION p202508 VALUES LESS THAN ('2025-09-01'),
+    PARTITION p202509 VALUES LESS THAN ('2025-10-01'),
+    PARTITION p202510 VALUES LESS THAN ('2025-11-01'),
+    PARTITION p202511 VALUES LESS THAN ('2025-12-01'),
+    PARTITION p202512 VALUES LESS THAN ('2026-01-01'),
+    PARTITION p202601 VALUES LESS THAN ('2026-02-01'),
+    PARTITION p202602 VALUES LESS THAN ('2026-03-01'),
+    PARTITION p202603 VALUES LESS THAN ('2026-04-01'),
+    PARTITION p202604 VALUES LESS THAN ('2026-05-01'),
+    PARTITION p202605 VALUES LESS THAN ('2026-06-01'),
+    PARTITION p202606 VALUES LESS THAN ('2026-07-01'),
+    PARTITION p202607 VALUES LESS THAN ('2026-08-01'),
+    PARTITION p202608 VALUES LESS THAN ('2026-09-01'),
+    PARTITION p202609 VALUES LESS THAN ('2026-10-01'),
+    PARTITION p202610 VALUES LESS THAN ('2026-11-01'),
+    PARTITION p202611 VALUES LESS THAN ('2026-12-01'),
+    PARTITION p202612 VALUES LESS THAN ('2027-01-01'),
+    PARTITION pmax VALUES LESS THAN (MAXVALUE)
+);
@@ -0,0 +1,201 @@
+"""Monthly partition upkeep for competitor_price_history.
+
+The table is range-partitioned on scraped_at by month (migration 008):
+p202601 holds intervals that started in January 2026, and pmax catches
+anything beyond the last month created. Nightly maintenance
+
+  * splits the next months off pmax ahead of time, so new rows never pile up
+    in pmax, and
+  * retires partitions whose month ended before HISTORY_HOT_DAYS ago: their
+    intervals are exported to the Parquet archive (or simply dropped when
+    HISTORY_DROP_EXPIRED is set and no archive is configured), mappings whose
+    latest interval is still open get it continued in the next month, and
+    the partition is dropped - a metadata operation instead of a DELETE.
+
+    python partition_maintenance.py            # create partitions, retire expired ones
+    python partition_maintenance.py --dry-run  # list what would be done
+"""
+import argparse
+import os
+from datetime import datetime
+
+import history_archive
+from db import get_database_connection
+
+TABLE = 'competitor_price_history'
+MONTHS_AHEAD = int(os.getenv('HISTORY_PARTITION_MONTHS_AHEAD', '3'))
+DROP_EXPIRED = os.getenv('HISTORY_DROP_EXPIRED', '').lower() in ('1', 'true', 'yes')
+OVERFLOW_PARTITION = 'pmax'
+
+PARTITIONS_QUERY = '''
+    SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+    FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+    ORDER BY PARTITION_ORDINAL_POSITION
+'''
+
+# Latest interval of every mapping that has one in the partition
+OPEN_INTERVALS_QUERY = '''
+    SELECT cph.id, cph.competitor_product_id, cph.price, cph.old_price, cph.availability, cph.valid_to
+    FROM competitor_price_history PARTITION ({partition}) cph
+    JOIN (
+        SELECT competitor_product_id, MAX(id) AS id
+        FROM competitor_price_history
+        GROUP BY competitor_product_id
+    ) latest ON latest.id = cph.id
+'''
+
+# Closed intervals reaching into the hot window keep the partition around
+LATE_CLOSED_QUERY = '''
+    SELECT COUNT(*)
+    FROM competitor_price_history PARTITION ({partition}) cph
+    WHERE cph.valid_to >= %s
+    AND cph.id < (SELECT MAX(id) FROM competitor_price_history WHERE competitor_product_id = cph.competitor_product_id)
+'''
+
+CARRY_FORWARD_SQL = '''
+    INSERT INTO competitor_price_history
+    (competitor_product_id, price, old_price, availability, scraped_at, valid_from, valid_to)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+'''
+
+
+def partition_name(month_start):
+    return month_start.strftime('p%Y%m')
+
+
+def add_months(month_start, months):
+    month = month_start.month - 1 + months
+    return month_start.replace(year=month_start.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def month_floor(value):
+    return datetime(value.year, value.month, 1)
+
+
+def parse_bound(description):
+    """Upper bound of a RANGE COLUMNS partition, or None for MAXVALUE"""
+    if description is None or description.upper() == 'MAXVALUE':
+        return None
+    return datetime.strptime(description.strip("'")[:10], '%Y-%m-%d')
+
+
+def existing_partitions(cursor):
+    """[(name, upper_bound)] in partition order; the MAXVALUE partition has bound None"""
+    cursor.execute(PARTITIONS_QUERY, (TABLE,))
+    return [(name, parse_bound(description)) for name, description in cursor.fetchall()]
+
+
+def is_partitioned(cursor):
+    return bool(existing_partitions(cursor))
+
+
+def ensure_future_partitions(cursor, months_ahead=MONTHS_AHEAD, now=None, dry_run=False):
+    """Split monthly partitions off pmax through months_ahead months from now"""
+    partitions = existing_partitions(cursor)
+    bounds = [bound for _, bound in partitions if bound is not None]
+    if not bounds:
+        return []
+    last_bound = max(bounds)
+    target = add_months(month_floor(now or datetime.now()), months_ahead + 1)
+
+    created = []
+    while last_bound < target:
+        next_bound = add_months(last_bound, 1)
+        name = partition_name(last_bound)
+        if not dry_run:
+            cursor.execute(f'''
+                ALTER TABLE {TABLE} REORGANIZE PARTITION {OVERFLOW_PARTITION} INTO (
+                    PARTITION {name} VALUES LESS THAN ('{next_bound:%Y-%m-%d}'),
+                    PARTITION {OVERFLOW_PARTITION} VALUES LESS THAN (MAXVALUE)
+                )
+            ''')
+        created.append(name)
+        last_bound = next_bound
+    return created
+
+
+def expired_partitions(cursor, hot_days=None):
+    """Partitions whose whole month lies before the hot-history cutoff"""
+    cutoff = history_archive.hot_cutoff(hot_days)
+    return [(name, bound) for name, bound in existing_partitions(cursor)
+            if bound is not None and bound <= cutoff]
+
+
+def retire_partition(conn, name, bound, archive, hot_days=None, dry_run=False):
+    """Archive (optionally), carry open intervals forward, and drop one partition.
+
+    Returns False when the partition still has closed intervals ending inside
+    the hot window; it is retried on a later run.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(LATE_CLOSED_QUERY.format(partition=name), (history_archive.hot_cutoff(hot_days),))
+        if cursor.fetchone()[0]:
+            print(f"Keeping {name}: it has intervals that closed inside the hot window")
+            return False
+        cursor.execute(OPEN_INTERVALS_QUERY.format(partition=name))
+        open_rows = cursor.fetchall()
+        if dry_run:
+            print(f"Would retire {name} ({len(open_rows)} open intervals carried forward)")
+            return True
+
+        if archive:
+            exported = history_archive.export_competitor_partition(
+                conn, name, {row[0] for row in open_rows}, bound)
+            print(f"Archived {exported} rows from {name}")
+        # A new row with a higher id stays the mapping's latest interval
+        cursor.executemany(CARRY_FORWARD_SQL, [
+            (mapping_id, price, old_price, availability, bound, bound, max(valid_to, bound))
+            for _, mapping_id, price, old_price, availability, valid_to in open_rows
+        ])
+        conn.commit()
+        cursor.execute(f'ALTER TABLE {TABLE} DROP PARTITION {name}')
+        print(f"Dropped {name} ({len(open_rows)} open intervals carried forward)")
+        return True
+    finally:
+        cursor.close()
+
+
+def maintain_partitions(conn, months_ahead=MONTHS_AHEAD, hot_days=None, dry_run=False):
+    """Nightly upkeep; returns (created, retired) partition names, or None if not partitioned"""
+    cursor = conn.cursor()
+    try:
+        if not is_partitioned(cursor):
+            return None
+        created = ensure_future_partitions(cursor, months_ahead, dry_run=dry_run)
+        expired = expired_partitions(cursor, hot_days)
+    finally:
+        cursor.close()
+    for name in created:
+        print(f"{'Would create' if dry_run else 'Created'} partition {name}")
+
+    archive = history_archive.archive_enabled()
+    if expired and not archive and not DROP_EXPIRED:
+        print(f"{len(expired)} expired partitions kept: set HISTORY_ARCHIVE_DIR to archive them "
+              f"or HISTORY_DROP_EXPIRED=1 to drop them")
+        return created, []
+
+    retired = [name for name, bound in expired
+               if retire_partition(conn, name, bound, archive, hot_days, dry_run)]
+    return created, retired
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create and retire competitor_price_history partitions")
+    parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD,
+                        help="months to keep partitioned ahead of the current one")
+    parser.add_argument('--dry-run', action='store_true', help="list changes without applying them")
+    args = parser.parse_args()
+
+    conn = get_database_connection()
+    try:
+        result = maintain_partitions(conn, args.months_ahead, dry_run=args.dry_run)
+        if result is None:
+            print(f"{TABLE} is not partitioned; run migrate.py first")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
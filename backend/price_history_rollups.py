@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+
+# Downsampled reads of price_history. Whole days come from the
+# price_history_daily rollup table, so day and week queries touch at most one
+# row per product per day; only the current (not yet rolled up) day and
+# hour-level queries read raw rows.
+
+BUCKETS = ('hour', 'day', 'week')
+
+# Default and maximum range per bucket, which keeps responses bounded
+DEFAULT_RANGE = {'hour': timedelta(days=7), 'day': timedelta(days=365), 'week': timedelta(days=3 * 365)}
+MAX_RANGE = {'hour': timedelta(days=31), 'day': timedelta(days=3 * 365), 'week': timedelta(days=10 * 365)}
+
+REFRESH_ROLLUPS_SQL = '''
+    INSERT INTO price_history_daily (product_id, day, min_price, max_price, avg_price, last_price, samples)
+    SELECT product_id, DATE(timestamp), MIN(price), MAX(price), AVG(price),
+           SUBSTRING_INDEX(GROUP_CONCAT(price ORDER BY timestamp DESC), ',', 1),
+           COUNT(*)
+    FROM price_history
+    WHERE timestamp >= %s AND timestamp < %s
+    GROUP BY product_id, DATE(timestamp)
+    ON DUPLICATE KEY UPDATE
+        min_price = VALUES(min_price),
+        max_price = VALUES(max_price),
+        avg_price = VALUES(avg_price),
+        last_price = VALUES(last_price),
+        samples = VALUES(samples)
+'''
+
+RAW_BUCKETS_SQL = '''
+    SELECT {bucket_start} AS bucket_start,
+           MIN(price), MAX(price), AVG(price),
+           SUBSTRING_INDEX(GROUP_CONCAT(price ORDER BY timestamp DESC), ',', 1),
+           COUNT(*)
+    FROM price_history
+    WHERE product_id = %s AND timestamp >= %s AND timestamp < %s
+    GROUP BY bucket_start
+    ORDER BY bucket_start
+'''
+
+DAILY_BUCKETS_SQL = '''
+    SELECT day, min_price, max_price, avg_price, last_price, samples
+    FROM price_history_daily
+    WHERE product_id = %s AND day >= %s AND day < %s
+    ORDER BY day
+'''
+
+WEEKLY_BUCKETS_SQL = '''
+    SELECT DATE_SUB(day, INTERVAL WEEKDAY(day) DAY) AS bucket_start,
+           MIN(min_price), MAX(max_price), SUM(avg_price * samples) / SUM(samples),
+           SUBSTRING_INDEX(GROUP_CONCAT(last_price ORDER BY day DESC), ',', 1),
+           SUM(samples)
+    FROM price_history_daily
+    WHERE product_id = %s AND day >= %s AND day < %s
+    GROUP BY bucket_start
+    ORDER BY bucket_start
+'''
+
+RAW_BUCKET_START = {
+    'hour': "DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00')",
+    'day': 'DATE(timestamp)',
+    'week': 'DATE_SUB(DATE(timestamp), INTERVAL WEEKDAY(timestamp) DAY)',
+}
+
+
+def refresh_daily_rollups(cursor, since=None, until=None):
+    """Recompute price_history_daily for every day in [since, until).
+
+    Defaults to yesterday and today, which is what the periodic job needs;
+    pass an early `since` to backfill.
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = since or today - timedelta(days=1)
+    until = until or today + timedelta(days=1)
+    cursor.execute(REFRESH_ROLLUPS_SQL, (since, until))
+    return cursor.rowcount
+
+
+def resolve_range(bucket, start=None, end=None):
+    """Fill in default bounds and clamp the range to the bucket's maximum"""
+    end = end or datetime.now()
+    start = start or end - DEFAULT_RANGE[bucket]
+    if end - start > MAX_RANGE[bucket]:
+        start = end - MAX_RANGE[bucket]
+    return start, end
+
+
+def _to_bucket(row):
+    bucket_start, min_price, max_price, avg_price, last_price, samples = row
+    if not isinstance(bucket_start, datetime):
+        bucket_start = datetime.fromisoformat(str(bucket_start))
+    return {
+        'bucket_start': bucket_start,
+        'min': float(min_price),
+        'max': float(max_price),
+        'avg': float(avg_price),
+        'last': float(last_price),
+        'samples': int(samples),
+    }
+
+
+def merge_bucket(earlier, later):
+    samples = earlier['samples'] + later['samples']
+    return {
+        'bucket_start': earlier['bucket_start'],
+        'min': min(earlier['min'], later['min']),
+        'max': max(earlier['max'], later['max']),
+        'avg': (earlier['avg'] * earlier['samples'] + later['avg'] * later['samples']) / samples,
+        'last': later['last'],
+        'samples': samples,
+    }
+
+
+def query_price_buckets(cursor, product_id, bucket, start, end):
+    """Return min/max/avg/last buckets for a product's price over [start, end)"""
+    if bucket == 'hour':
+        cursor.execute(RAW_BUCKETS_SQL.format(bucket_start=RAW_BUCKET_START['hour']), (product_id, start, end))
+        return [_to_bucket(row) for row in cursor.fetchall()]
+
+    # Completed days come from the rollup table, today from raw rows
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    rollup_end = min(end, today)
+    buckets = []
+    if start < rollup_end:
+        sql = DAILY_BUCKETS_SQL if bucket == 'day' else WEEKLY_BUCKETS_SQL
+        cursor.execute(sql, (product_id, start.date(), rollup_end.date()))
+        buckets = [_to_bucket(row) for row in cursor.fetchall()]
+
+    if end > today:
+        cursor.execute(RAW_BUCKETS_SQL.format(bucket_start=RAW_BUCKET_START[bucket]),
+                       (product_id, max(start, today), end))
+        for recent in (_to_bucket(row) for row in cursor.fetchall()):
+            if buckets and buckets[-1]['bucket_start'] == recent['bucket_start']:
+                buckets[-1] = merge_bucket(buckets[-1], recent)
+            else:
+                buckets.append(recent)
+    return buckets
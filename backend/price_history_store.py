@@ -0,0 +1,227 @@
+import hashlib
+from datetime import timedelta
+from decimal import Decimal
+
+from recheck_schedule import UPDATE_SCHEDULE_SQL, is_unavailable, plan_schedule_updates
+
+# competitor_price_history is run-length encoded: a row is only inserted when
+# price, old_price or availability changes, and [valid_from, valid_to] covers
+# every scrape that observed the same values. scraped_at is kept equal to
+# valid_from so older queries keep working.
+#
+# competitor_products keeps a short hash of the last observation and when it
+# was last checked. A scrape whose hash matches writes nothing to the history
+# table; the batch only bumps last_checked_at in one statement. The newest
+# (open) interval therefore lasts until last_checked_at, and its valid_to is
+# only written when the next change closes it. Readers use
+# GREATEST(valid_to, last_checked_at) for the open interval.
+#
+# The same pass updates each mapping's re-check schedule (recheck_schedule).
+
+MAPPING_STATE_QUERY = '''
+    SELECT id, last_content_hash, last_checked_at, consecutive_unavailable
+    FROM competitor_products
+    WHERE id IN ({placeholders})
+'''
+
+LATEST_ROWS_QUERY = '''
+    SELECT competitor_product_id, MAX(id)
+    FROM competitor_price_history
+    WHERE competitor_product_id IN ({placeholders})
+    GROUP BY competitor_product_id
+'''
+
+CLOSE_INTERVAL_SQL = '''
+    UPDATE competitor_price_history
+    SET valid_to = GREATEST(valid_to, %s)
+    WHERE id = %s
+'''
+
+INSERT_INTERVAL_SQL = '''
+    INSERT INTO competitor_price_history
+    (competitor_product_id, price, old_price, availability, scraped_at, valid_from, valid_to)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+'''
+
+UPDATE_MAPPING_STATE_SQL = '''
+    UPDATE competitor_products
+    SET last_content_hash = %s, last_checked_at = %s
+    WHERE id = %s
+'''
+
+TOUCH_MAPPINGS_SQL = '''
+    UPDATE competitor_products
+    SET last_checked_at = GREATEST(COALESCE(last_checked_at, %s), %s)
+    WHERE id IN ({placeholders})
+'''
+
+
+def _price_key(value):
+    return '' if value is None else f"{float(value):.2f}"
+
+
+def content_hash(*values):
+    """16-hex-digit hash of an extracted record; prices compare to the cent"""
+    key = '|'.join(_price_key(v) if isinstance(v, (int, float, Decimal)) else str(v or '') for v in values)
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def observation_hash(price, old_price, availability):
+    return content_hash(price, old_price, availability)
+
+
+def _in_query(template, ids):
+    ids = sorted(ids)
+    return template.format(placeholders=','.join(['%s'] * len(ids))), tuple(ids)
+
+
+def mapping_state_query(rows):
+    """MAPPING_STATE_QUERY and its parameters for the mappings in rows"""
+    return _in_query(MAPPING_STATE_QUERY, {row[0] for row in rows})
+
+
+def latest_rows_query(mapping_ids):
+    """LATEST_ROWS_QUERY and its parameters for the given mappings"""
+    return _in_query(LATEST_ROWS_QUERY, mapping_ids)
+
+
+class ObservationPlan:
+    """Writes needed to record a batch of scrapes; built without I/O so the
+    sync and async stores share it"""
+
+    def __init__(self, inserts, changed, touched, close, schedule=()):
+        self.inserts = inserts
+        self.changed = changed
+        self.touched = touched
+        # mapping id -> when its open interval was last confirmed
+        self.close = close
+        self.schedule = schedule
+
+    def statements(self, latest_rows=()):
+        """(sql, params, executemany) in execution order; latest_rows is the
+        result of latest_rows_query(plan.close)"""
+        statements = []
+        closing = [(self.close[cp_id], row_id) for cp_id, row_id in latest_rows if cp_id in self.close]
+        if closing:
+            statements.append((CLOSE_INTERVAL_SQL, closing, True))
+        if self.inserts:
+            statements.append((INSERT_INTERVAL_SQL, self.inserts, True))
+        if self.changed:
+            statements.append((UPDATE_MAPPING_STATE_SQL, self.changed, True))
+        if self.touched:
+            checked_at, ids = self.touched
+            sql, params = _in_query(TOUCH_MAPPINGS_SQL, ids)
+            statements.append((sql, (checked_at, checked_at) + params, False))
+        if self.schedule:
+            statements.append((UPDATE_SCHEDULE_SQL, self.schedule, True))
+        return statements
+
+
+def plan_observation_writes(state_rows, rows):
+    """Split scraped rows into unchanged mappings and new intervals, and work
+    out each mapping's new re-check schedule.
+
+    state_rows is the result of mapping_state_query(rows).
+    """
+    state = {r[0]: (r[1], r[2]) for r in state_rows}
+    schedule = plan_schedule_updates({r[0]: r[3] for r in state_rows},
+                                     [(r[0], is_unavailable(r[3]), r[4]) for r in sorted(rows, key=lambda r: r[4])])
+
+    inserts = []
+    pending = {}
+    unchanged = {}
+    close = {}
+    for cp_id, price, old_price, availability, scraped_at in sorted(rows, key=lambda r: r[4]):
+        digest = observation_hash(price, old_price, availability)
+        if cp_id in pending:
+            # Compare against an interval opened earlier in this same batch
+            index, pending_digest = pending[cp_id]
+            if digest == pending_digest:
+                inserts[index] = inserts[index][:6] + (scraped_at,)
+                continue
+        else:
+            last_hash, last_checked_at = state.get(cp_id, (None, None))
+            if digest == last_hash:
+                unchanged[cp_id] = scraped_at
+                state[cp_id] = (last_hash, scraped_at)
+                continue
+            if last_checked_at is not None:
+                close[cp_id] = last_checked_at
+        pending[cp_id] = (len(inserts), digest)
+        inserts.append((cp_id, price, old_price, availability, scraped_at, scraped_at, scraped_at))
+
+    changed = [(pending[cp_id][1], inserts[pending[cp_id][0]][6], cp_id) for cp_id in pending]
+    # One bump for the whole batch; the mappings were checked within the run
+    touched = (max(unchanged.values()), sorted(unchanged)) if unchanged else None
+    return ObservationPlan(inserts, changed, touched, close, schedule)
+
+
+def record_competitor_prices(cursor, rows):
+    """Store scraped prices, writing history only for observations that changed.
+
+    rows are (competitor_product_id, price, old_price, availability, scraped_at)
+    tuples. Returns the number of new history rows inserted.
+    """
+    if not rows:
+        return 0
+
+    cursor.execute(*mapping_state_query(rows))
+    plan = plan_observation_writes(cursor.fetchall(), rows)
+
+    latest_rows = []
+    if plan.close:
+        cursor.execute(*latest_rows_query(plan.close))
+        latest_rows = cursor.fetchall()
+
+    for sql, params, many in plan.statements(latest_rows):
+        if many:
+            cursor.executemany(sql, params)
+        else:
+            cursor.execute(sql, params)
+    return len(plan.inserts)
+
+
+def record_competitor_price(cursor, competitor_product_id, price_data):
+    """Store one scrape result; returns True when a new history row was needed"""
+    return record_competitor_prices(cursor, [(
+        competitor_product_id,
+        price_data['price'],
+        price_data['old_price'],
+        price_data['availability'],
+        price_data['scraped_at']
+    )]) == 1
+
+
+def record_unavailable_mappings(cursor, mapping_ids, checked_at):
+    """Back off mappings whose page is gone (404/410); no history is written"""
+    if not mapping_ids:
+        return
+    cursor.execute(*_in_query(MAPPING_STATE_QUERY, set(mapping_ids)))
+    counts = {r[0]: r[3] for r in cursor.fetchall()}
+    schedule = plan_schedule_updates(counts, [(cp_id, True, checked_at) for cp_id in counts])
+    if schedule:
+        cursor.executemany(UPDATE_SCHEDULE_SQL, schedule)
+
+
+def expand_price_history(intervals, step=timedelta(hours=6), start=None, end=None, max_points=5000):
+    """Expand (price, old_price, availability, valid_from, valid_to) intervals
+    back into a regular time series with one point every `step`.
+
+    Each interval contributes a point at valid_from and then every step up to
+    valid_to, clipped to [start, end]. Expansion stops after max_points.
+    """
+    points = []
+    for price, old_price, availability, valid_from, valid_to in sorted(intervals, key=lambda r: r[3]):
+        t = max(valid_from, start) if start else valid_from
+        stop = min(valid_to, end) if end else valid_to
+        while t <= stop:
+            points.append({
+                'timestamp': t,
+                'price': float(price) if price is not None else None,
+                'old_price': float(old_price) if old_price is not None else None,
+                'availability': availability
+            })
+            if len(points) >= max_points:
+                return points
+            t += step
+    return points
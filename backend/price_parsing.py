@@ -0,0 +1,73 @@
+import re
+from decimal import Decimal
+
+# LKR price normalization shared by every extractor.
+#
+# Retailers write prices as 'Rs. 123,450.00', 'Rs 123,450', 'LKR 123450',
+# 'රු. 1,23,450/=' or '123,450.00 - 135,000.00'. All of them are read with
+# one precompiled pattern: the first number in the text, with thousands
+# separators (western or lakh grouping) and an optional decimal part. The
+# currency marker and '/=' suffix are simply not part of the match. Prices
+# are computed as integer cents, so no float rounding creeps in.
+
+NUMBER = r'(\d{1,3}(?:,\d{2,3})+|\d+)(?:\.(\d+))?'
+NUMBER_PATTERN = re.compile(NUMBER)
+RANGE_PATTERN = re.compile(NUMBER + r'\s*(?:-|–|—|to)\s*(?:Rs\.?|LKR|රු\.?)?\s*' + NUMBER, re.IGNORECASE)
+
+
+def _cents(whole, fraction):
+    cents = int(whole.replace(',', '')) * 100
+    if fraction:
+        cents += int(fraction[:2].ljust(2, '0'))
+        # Round half up on a third decimal digit
+        if len(fraction) > 2 and fraction[2] >= '5':
+            cents += 1
+    return cents
+
+
+def price_cents(text):
+    """First price in text as integer cents, or None if there is no number"""
+    if not text:
+        return None
+    match = NUMBER_PATTERN.search(text)
+    if match is None:
+        return None
+    return _cents(match.group(1), match.group(2))
+
+
+def price_range_cents(text):
+    """(low, high) cents for a range such as 'Rs. 10,000 - Rs. 12,500'.
+
+    A single price gives (price, price); no number gives None.
+    """
+    if not text:
+        return None
+    match = RANGE_PATTERN.search(text)
+    if match is not None:
+        low = _cents(match.group(1), match.group(2))
+        high = _cents(match.group(3), match.group(4))
+        return (low, high) if low <= high else (high, low)
+    cents = price_cents(text)
+    return None if cents is None else (cents, cents)
+
+
+def cents_to_decimal(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def parse_price(text):
+    """First price in text as a two-place Decimal, or None"""
+    cents = price_cents(text)
+    return None if cents is None else cents_to_decimal(cents)
+
+
+def parse_price_range(text):
+    """(low, high) Decimals for a price or price range, or None"""
+    cents = price_range_cents(text)
+    return None if cents is None else (cents_to_decimal(cents[0]), cents_to_decimal(cents[1]))
+
+
+def price_to_float(text):
+    """First price in text as float, 0.0 when there is none (the extractors' convention)"""
+    cents = price_cents(text)
+    return cents / 100 if cents is not None else 0.0
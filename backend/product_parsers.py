@@ -0,0 +1,24 @@
+from retailers import RETAILERS
+from structured_data import hit_rates
+
+# Product page parsers. Each takes the raw page body and returns
+# (product_name, price, old_price, product_image_url, availability); they have no
+# network or database side effects so they can run in worker processes.
+# The selectors themselves live in the retailer registry.
+
+def parse_product(content, site_type):
+    retailer = RETAILERS[site_type]
+    fields, source = retailer.parse_product_content(content)
+    hit_rates.record(retailer.domain, source)
+    return fields
+
+def parse_product_page(content, product_url, context):
+    """Pipeline parse stage: context is (site_type, company_name, category).
+
+    Returns (product_details row ready for insert, structured data source);
+    the source is counted by the store stage, which runs in this process.
+    """
+    site_type, company_name, category = context
+    fields, source = RETAILERS[site_type].parse_product_content(content)
+    product_name, price, old_price, product_image_url, availability = fields
+    return (product_name, price, old_price, availability, product_image_url, company_name, product_url, category), source
@@ -0,0 +1,54 @@
+import os
+from datetime import timedelta
+
+# Out-of-stock aware re-check scheduling for competitor mappings.
+#
+# Every check of a mapping that finds the product unavailable (out of stock,
+# or the page is gone) doubles the wait before the next check, from
+# RECHECK_BASE_MINUTES up to RECHECK_MAX_HOURS, via
+# competitor_products.next_check_at. After DEACTIVATE_AFTER_UNAVAILABLE
+# unavailable checks in a row the mapping is set inactive. Any available
+# observation resets the count.
+
+UNAVAILABLE = frozenset({'Out of Stock'})
+
+RECHECK_BASE = timedelta(minutes=int(os.getenv('RECHECK_BASE_MINUTES', '60')))
+RECHECK_MAX = timedelta(hours=int(os.getenv('RECHECK_MAX_HOURS', '168')))
+DEACTIVATE_AFTER = int(os.getenv('DEACTIVATE_AFTER_UNAVAILABLE', '12'))
+
+UPDATE_SCHEDULE_SQL = '''
+    UPDATE competitor_products
+    SET consecutive_unavailable = %s, next_check_at = %s, is_active = is_active AND %s
+    WHERE id = %s
+'''
+
+
+def is_unavailable(availability):
+    return availability in UNAVAILABLE
+
+
+def recheck_delay(consecutive_unavailable):
+    """Wait before the next check after this many unavailable checks in a row"""
+    return min(RECHECK_BASE * 2 ** (consecutive_unavailable - 1), RECHECK_MAX)
+
+
+def plan_schedule_updates(counts, checks):
+    """UPDATE_SCHEDULE_SQL parameters for a batch of checks.
+
+    counts maps mapping id -> consecutive_unavailable before the batch;
+    checks are (mapping id, unavailable, checked_at) in time order. Mappings
+    that stay available produce no update.
+    """
+    before = dict(counts)
+    after = {}
+    for cp_id, unavailable, checked_at in checks:
+        consecutive = after[cp_id][0] if cp_id in after else before.get(cp_id) or 0
+        if unavailable:
+            consecutive += 1
+            after[cp_id] = (consecutive, checked_at + recheck_delay(consecutive),
+                            consecutive < DEACTIVATE_AFTER)
+        else:
+            after[cp_id] = (0, None, True)
+    return [(consecutive, next_check_at, keep_active, cp_id)
+            for cp_id, (consecutive, next_check_at, keep_active) in sorted(after.items())
+            if consecutive or before.get(cp_id)]
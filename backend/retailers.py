@@ -0,0 +1,378 @@
+from datetime import datetime
+from urllib.parse import urlparse
+
+import re
+
+import soupsieve
+from bs4 import BeautifulSoup
+
+from price_parsing import price_to_float
+from structured_data import SOURCE_CSS, availability_label, structured_offer
+
+# Retailer registry. Each retailer is described by data only: its domain,
+# category listing URLs, how to recognise product links, CSS selectors for
+# listing cards and product pages, and image URL fix-ups. Specs are compiled
+# once at import into Retailer objects with pre-parsed selectors, and looked
+# up by host with a dict. Adding a retailer means adding a spec here.
+#
+# Sitemaps default to the ones listed in the retailer's robots.txt, then
+# /sitemap.xml; a spec can list them explicitly under 'sitemaps'.
+#
+# Selector lists are tried in order; for prices the first one that yields a
+# positive price wins. The first availability element found is classified by
+# its schema.org value or its text ('Out of stock', 'Sold out', 'Pre-order',
+# ...), falling back to its classes; a page with none is taken as in stock.
+#
+# Pages are first checked for a JSON-LD or microdata offer. It is used when
+# it answers everything the selectors would: in particular, a retailer with
+# old-price selectors only takes the fast path when the offer carries a list
+# price, so discounts are never lost.
+
+RETAILER_SPECS = [
+    {
+        'key': 'bigdeals',
+        'domain': 'bigdeals.lk',
+        'base_url': 'https://bigdeals.lk',
+        'categories': {
+            'tv': 'https://bigdeals.lk/tv',
+            'laptops': 'https://bigdeals.lk/laptops',
+            'mobile_phones': 'https://bigdeals.lk/mobile_phones',
+        },
+        # Product URLs live under the category path, e.g. /tv/samsung-55-...
+        'product_link': '/{category}/',
+        'listing': {
+            'card': ['div.product-layout, div.product-thumb, div.product-item'],
+            'name': ['.product-name, .name a, h4 a'],
+            'price': ['span.sell-price'],
+            'old_price': ['span.m-price'],
+            'image': ['img'],
+            'availability': ['.out-of-stock, .label-out-of-stock, .stock-status'],
+        },
+        'product': {
+            'name': ['h1.product-name'],
+            'price': ['span.sell-price'],
+            'old_price': ['span.m-price'],
+            'availability': ['.product-stock span, .product-stock', '.stock-status', 'button#button-cart'],
+            'image': ['a.cloud-zoom.defaultImage'],
+            'image_attr': 'href',
+        },
+        'image_base_url': 'https://bigdeals.lk',
+        'default_image': 'N/A',
+    },
+    {
+        'key': 'singer',
+        'domain': 'singersl.com',
+        'base_url': 'https://www.singersl.com',
+        'categories': {
+            'tv': 'https://www.singersl.com/products/entertainment/television',
+            'laptops': 'https://www.singersl.com/products/electronics/laptops-notebooks',
+            'mobile_phones': 'https://www.singersl.com/products/electronics/mobile-phones',
+        },
+        'product_link': '/product/',
+        'listing': {
+            'card': ['div.product-card, div.product-item'],
+            'name': ['.product-title, h5, h6'],
+            'price': ['h4.sing-pro-price, h4.productprice, .price'],
+            'old_price': ['span.text-decoration-line-through'],
+            'image': ['img'],
+            'availability': ['.out-of-stock, .sold-out, .badge-out-of-stock'],
+        },
+        'product': {
+            'name': ['h5.single-page-product-title'],
+            'price': ['h4.fw-bold.mb-0.sing-pro-price', 'h4.text-primary.fw-bold.mb-0.productprice', '.price'],
+            'old_price': ['span.text-decoration-line-through'],
+            'availability': ['.stock-status, .product-stock, .availability', '.out-of-stock, .sold-out'],
+            'image': ['a[data-fancybox="gallery"] img'],
+            'image_attr': 'src',
+        },
+        'image_base_url': None,
+        'default_image': 'N/A',
+    },
+    {
+        'key': 'singhagiri',
+        'domain': 'singhagiri.lk',
+        'base_url': 'https://singhagiri.lk',
+        'categories': {
+            'tv': 'https://singhagiri.lk/products/television',
+            'laptops': 'https://singhagiri.lk/products/computers-accessories/laptop',
+            'mobile_phones': 'https://singhagiri.lk/products/mobile-phones',
+        },
+        'product_link': '/product/',
+        'listing': {
+            'card': ['div.product-card, div.product-item, div.product'],
+            'name': ['.product-title, h2, h3'],
+            'price': ['div.selling-price span.data, div.selling-price'],
+            'old_price': ['div.strikeout'],
+            'image': ['img'],
+            'availability': ['.out-of-stock, .sold-out, .stock-out'],
+        },
+        'product': {
+            'name': ['h1.product-title'],
+            'price': ['div.selling-price span.data'],
+            'old_price': ['div.strikeout'],
+            'availability': ['.stock-status, .availability, .stock', '.out-of-stock, .sold-out'],
+            'image': ['a[data-fancybox="gallery"] img'],
+            'image_attr': 'src',
+        },
+        # Product images are served from the CDN, not the shop domain
+        'image_base_url': 'https://d1ugx7ghroxfxae.cloudfront.net',
+        'default_image': 'https://example.com/default-image.jpg',
+    },
+]
+
+# Used for competitor URLs on hosts without a spec
+GENERIC_SPEC = {
+    'key': 'generic',
+    'domain': None,
+    'base_url': None,
+    'categories': {},
+    'product_link': None,
+    'listing': None,
+    'product': {
+        'name': ['h1'],
+        'price': ['.price', '.product-price', '.current-price', '[class*="price"]', '[data-price]',
+                  '.cost', '.amount', '.value'],
+        'old_price': [],
+        'image': [],
+        'image_attr': 'src',
+        'availability': ['[itemprop="availability"]', '.stock-status, .stock, .availability',
+                         '.out-of-stock, .sold-out, .outofstock'],
+    },
+    'image_base_url': None,
+    'default_image': 'N/A',
+    # Unknown layouts: only trust the page if a positive price was found
+    'require_price': True,
+}
+
+# Checked in order, so 'not available' is seen before 'available'
+AVAILABILITY_TEXT = [
+    (re.compile(r'out[\s-]*of[\s-]*stock|outofstock|sold[\s-]*out|not available|unavailable|no stock|discontinued',
+                re.IGNORECASE), 'Out of Stock'),
+    (re.compile(r'pre[\s-]*order', re.IGNORECASE), 'Pre-Order'),
+    (re.compile(r'back[\s-]*order', re.IGNORECASE), 'Back Order'),
+    (re.compile(r'in[\s-]*stock|available|add to (?:cart|bag)|buy now', re.IGNORECASE), 'In Stock'),
+]
+
+DEFAULT_AVAILABILITY = 'In Stock'
+
+
+def classify_availability(text):
+    """Availability label for a stock message, or None if it says nothing about stock"""
+    for pattern, label in AVAILABILITY_TEXT:
+        if text and pattern.search(text):
+            return label
+    return None
+
+
+def _compile(selectors):
+    return [soupsieve.compile(selector) for selector in selectors]
+
+
+def _own_text(tag):
+    # Prefer the tag's own text so a nested strike-through price is not included
+    own_text = ''.join(tag.find_all(string=True, recursive=False)).strip()
+    return own_text or tag.get_text(strip=True)
+
+
+def _first(patterns, soup):
+    for pattern in patterns:
+        tag = pattern.select_one(soup)
+        if tag is not None:
+            return tag
+    return None
+
+
+def _availability(patterns, soup):
+    tag = _first(patterns, soup)
+    if tag is None:
+        return DEFAULT_AVAILABILITY
+    label = availability_label(tag.get('href') or tag.get('content'))
+    if label is None and tag.name == 'button' and tag.has_attr('disabled'):
+        label = 'Out of Stock'
+    return (label
+            or classify_availability(tag.get_text(' ', strip=True))
+            or classify_availability(' '.join(tag.get('class', [])))
+            or DEFAULT_AVAILABILITY)
+
+
+def _first_price(patterns, soup):
+    for pattern in patterns:
+        tag = pattern.select_one(soup)
+        if tag is not None:
+            price = price_to_float(_own_text(tag))
+            if price > 0:
+                return price
+    return 0.0
+
+
+class Retailer:
+    """A compiled retailer spec"""
+
+    def __init__(self, spec):
+        self.key = spec['key']
+        self.domain = spec['domain']
+        self.base_url = spec['base_url']
+        self.company = spec['domain']
+        self.categories = spec['categories']
+        self.product_link = spec['product_link']
+        self.image_base_url = spec['image_base_url']
+        self.default_image = spec['default_image']
+        self.require_price = spec.get('require_price', False)
+        self.sitemaps = spec.get('sitemaps')
+
+        product = spec['product']
+        self.product_name = _compile(product['name'])
+        self.product_price = _compile(product['price'])
+        self.product_old_price = _compile(product['old_price'])
+        self.product_image = _compile(product['image'])
+        self.product_image_attr = product['image_attr']
+        self.product_availability = _compile(product.get('availability', []))
+
+        listing = spec['listing']
+        self.listing = {field: _compile(selectors) for field, selectors in listing.items()} if listing else None
+
+    def absolute_url(self, href):
+        if href.startswith('https://') or href.startswith('http://'):
+            return href
+        return self.base_url + href
+
+    def is_product_link(self, href, category_name):
+        if not self.product_link:
+            return False
+        return self.product_link.format(category=category_name.lower()) in href
+
+    def category_for_url(self, url):
+        """Category a product URL belongs to, when its path says so"""
+        if not self.product_link or '{category}' not in self.product_link:
+            return None
+        return next((name for name in self.categories if self.is_product_link(url, name)), None)
+
+    def is_product_url(self, url):
+        """Whether a URL from anywhere on the site (e.g. a sitemap) is a product page"""
+        if '{category}' in (self.product_link or ''):
+            return self.category_for_url(url) is not None
+        return self.is_product_link(url, '')
+
+    def _image_url(self, url):
+        if url and url.startswith('/') and self.image_base_url:
+            return self.image_base_url + url
+        return url
+
+    def parse_product(self, soup):
+        """(product_name, price, old_price, product_image_url, availability) from a product page"""
+        name_tag = _first(self.product_name, soup)
+        image_tag = _first(self.product_image, soup)
+        image_url = image_tag.get(self.product_image_attr) if image_tag is not None else None
+        return (
+            name_tag.get_text().strip() if name_tag is not None else 'N/A',
+            _first_price(self.product_price, soup),
+            _first_price(self.product_old_price, soup),
+            self._image_url(image_url) or self.default_image,
+            _availability(self.product_availability, soup),
+        )
+
+    def _offer_complete(self, offer, *fields):
+        if offer is None:
+            return False
+        if self.product_old_price and not offer['old_price']:
+            return False
+        if self.product_availability and not offer['availability']:
+            return False
+        return all(offer[field] for field in fields)
+
+    def parse_product_content(self, content):
+        """((product_name, price, old_price, product_image_url, availability), source) from a raw product page"""
+        offer, source = structured_offer(content)
+        if self._offer_complete(offer, 'name', 'image'):
+            return (offer['name'].strip(), offer['price'], offer['old_price'],
+                    self._image_url(offer['image']), offer['availability'] or DEFAULT_AVAILABILITY), source
+        return self.parse_product(BeautifulSoup(content, 'html.parser')), SOURCE_CSS
+
+    def extract_price_content(self, content):
+        """(price data or None, source) from a raw product page"""
+        offer, source = structured_offer(content)
+        if self._offer_complete(offer):
+            return {
+                'price': offer['price'],
+                'old_price': offer['old_price'] or None,
+                'availability': offer['availability'] or DEFAULT_AVAILABILITY,
+                'scraped_at': datetime.now()
+            }, source
+        return self.extract_price(BeautifulSoup(content, 'html.parser')), SOURCE_CSS
+
+    def extract_price(self, soup):
+        """Competitor price data from a product page, or None if it has no usable price"""
+        price = _first_price(self.product_price, soup)
+        if self.require_price and price <= 0:
+            return None
+        old_price = _first_price(self.product_old_price, soup)
+        return {
+            'price': price,
+            'old_price': old_price if old_price > 0 else None,
+            'availability': _availability(self.product_availability, soup),
+            'scraped_at': datetime.now()
+        }
+
+    def extract_listing_cards(self, soup, category_name):
+        """Read name, prices and image for every product card on a listing page"""
+        if not self.listing:
+            return []
+
+        cards = []
+        seen_urls = set()
+        for card_pattern in self.listing['card']:
+            for card in card_pattern.select(soup):
+                link = next((a for a in card.find_all('a', href=True)
+                             if self.is_product_link(a['href'], category_name)), None)
+                if not link:
+                    continue
+                product_url = self.absolute_url(link['href'])
+                if product_url in seen_urls:
+                    continue
+                seen_urls.add(product_url)
+
+                name_tag = _first(self.listing['name'], card)
+                old_price_tag = _first(self.listing['old_price'], card)
+                image_tag = _first(self.listing['image'], card)
+
+                image_url = None
+                if image_tag is not None:
+                    image_url = image_tag.get('data-src') or image_tag.get('src')
+                    if image_url and image_url.startswith('/'):
+                        image_url = self.base_url + image_url
+
+                cards.append({
+                    'url': product_url,
+                    'name': name_tag.get_text(strip=True) if name_tag is not None else None,
+                    'price': _first_price(self.listing['price'], card),
+                    'old_price': price_to_float(old_price_tag.get_text()) if old_price_tag is not None else 0.0,
+                    'image': image_url,
+                    'availability': (_availability(self.listing['availability'], card)
+                                     if 'availability' in self.listing else DEFAULT_AVAILABILITY),
+                })
+        return cards
+
+
+RETAILERS = {spec['key']: Retailer(spec) for spec in RETAILER_SPECS}
+GENERIC_RETAILER = Retailer(GENERIC_SPEC)
+RETAILERS_BY_HOST = {retailer.domain: retailer for retailer in RETAILERS.values()}
+
+
+def get_retailer(key):
+    """Retailer by registry key ('bigdeals', 'singer', ...)"""
+    return RETAILERS[key]
+
+
+def retailer_for_url(url):
+    """Retailer for a URL by host, falling back to the generic extractor.
+
+    www. and other subdomains resolve to their registered parent domain.
+    """
+    host = (urlparse(url).hostname or '').lower()
+    while host:
+        retailer = RETAILERS_BY_HOST.get(host)
+        if retailer is not None:
+            return retailer
+        _, _, host = host.partition('.')
+    return GENERIC_RETAILER
+
@@ -0,0 +1,105 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# In-process background queue for manual competitor scrapes. Jobs live in
+# this process's memory, so status polling must reach the same API process
+# (single worker, or sticky routing). asgi_app enforces a single process.
+
+
+def job_result(price_data):
+    """JSON-friendly job result for a scraper price_data dict"""
+    return {
+        'price': price_data['price'],
+        'old_price': price_data['old_price'],
+        'availability': price_data['availability'],
+        'scraped_at': price_data['scraped_at'].isoformat()
+    }
+
+
+def prune_finished_jobs(jobs, retention_seconds):
+    """Drop jobs that finished more than retention_seconds ago from a job dict"""
+    cutoff = time.time() - retention_seconds
+    expired = [job_id for job_id, job in jobs.items()
+               if job.finished_at and job.finished_at.timestamp() < cutoff]
+    for job_id in expired:
+        del jobs[job_id]
+
+
+class ScrapeJob:
+    def __init__(self, mapping_id):
+        self.id = uuid.uuid4().hex
+        self.mapping_id = mapping_id
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'competitor_product_id': self.mapping_id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class ScrapeJobQueue:
+    """Runs scrape_fn(mapping_id) on a small thread pool.
+
+    A request for a mapping that already has a queued or running job returns
+    that job instead of starting another. Finished jobs are kept for
+    `retention_seconds` so clients can poll for the result.
+    """
+
+    def __init__(self, scrape_fn, max_workers=4, retention_seconds=3600):
+        self.scrape_fn = scrape_fn
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape-job')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._in_flight = {}
+
+    def enqueue(self, mapping_id):
+        """Return (job, created); created is False when merged into an in-flight job"""
+        with self._lock:
+            prune_finished_jobs(self._jobs, self.retention_seconds)
+            job_id = self._in_flight.get(mapping_id)
+            if job_id is not None:
+                return self._jobs[job_id], False
+            job = ScrapeJob(mapping_id)
+            self._jobs[job.id] = job
+            self._in_flight[mapping_id] = job.id
+        self._executor.submit(self._run, job)
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = datetime.now()
+        try:
+            result = self.scrape_fn(job.mapping_id)
+            if result is None:
+                job.status = 'failed'
+                job.error = 'Failed to scrape price'
+            else:
+                job.status = 'succeeded'
+                job.result = result
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now()
+            with self._lock:
+                self._in_flight.pop(job.mapping_id, None)
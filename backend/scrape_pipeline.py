@@ -0,0 +1,213 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Queue sentinel marking the end of a stage's input
+_DONE = object()
+
+
+class StageMetrics:
+    """Throughput counters for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.first_at = None
+        self.last_at = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok=True):
+        now = time.monotonic()
+        with self._lock:
+            if ok:
+                self.items += 1
+            else:
+                self.errors += 1
+            self.seconds += seconds
+            if self.first_at is None:
+                self.first_at = now - seconds
+            self.last_at = now
+
+    def summary(self):
+        elapsed = (self.last_at - self.first_at) if self.first_at is not None else 0.0
+        rate = self.items / elapsed if elapsed > 0 else 0.0
+        handled = self.items + self.errors
+        avg_ms = (self.seconds / handled * 1000) if handled else 0.0
+        return (f"{self.name:<6} {self.items} ok, {self.errors} errors, "
+                f"{rate:.1f} items/s, {avg_ms:.0f} ms avg")
+
+
+class ScrapePipeline:
+    """Fetch -> parse -> store pipeline connected by bounded queues.
+
+    - fetch_fn(url) returns the raw page body and runs on `fetch_workers`
+      threads, so network waits overlap.
+    - parse_fn(content, url, context) returns a record (or None) and runs on a
+      pool of `parse_workers` processes, so BeautifulSoup parsing uses every
+      core. It must be a module-level function; with parse_workers=0 it runs
+      in-process instead.
+    - store_fn(records) is called from a single writer thread with batches of
+      up to `batch_size` records, or whatever has arrived after
+      `flush_interval` seconds.
+
+    `failed` collects the context of every URL whose fetch or parse failed.
+
+    Every queue is bounded by `queue_size`, so a slow stage blocks the ones
+    upstream of it instead of buffering without limit.
+    """
+
+    def __init__(self, fetch_fn, parse_fn, store_fn, fetch_workers=4, parse_workers=None,
+                 queue_size=64, batch_size=50, flush_interval=5.0):
+        self.fetch_fn = fetch_fn
+        self.parse_fn = parse_fn
+        self.store_fn = store_fn
+        self.fetch_workers = fetch_workers
+        self.parse_workers = os.cpu_count() if parse_workers is None else parse_workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._urls = queue.Queue(maxsize=queue_size)
+        self._fetched = queue.Queue(maxsize=queue_size)
+        self._pending = queue.Queue(maxsize=max(self.parse_workers, 1) * 2)
+        self._records = queue.Queue(maxsize=queue_size)
+
+        self.metrics = {name: StageMetrics(name) for name in ('fetch', 'parse', 'store')}
+        self.failed = []
+        self._pool = None
+        self._threads = []
+        self._fetch_threads = []
+
+    def start(self):
+        if self.parse_workers > 0:
+            self._pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+        for _ in range(self.fetch_workers):
+            thread = threading.Thread(target=self._fetch_loop, daemon=True)
+            thread.start()
+            self._fetch_threads.append(thread)
+        for target in (self._dispatch_loop, self._collect_loop, self._store_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, url, context=None):
+        """Queue a URL for fetch and parse; blocks while the fetch queue is full"""
+        self._urls.put((url, context))
+
+    def submit_record(self, record):
+        """Queue an already-parsed record straight for storage"""
+        self._records.put(record)
+
+    def close(self):
+        """Drain every stage, stop the workers and print stage metrics"""
+        for _ in self._fetch_threads:
+            self._urls.put(_DONE)
+        for thread in self._fetch_threads:
+            thread.join()
+        self._fetched.put(_DONE)
+        for thread in self._threads:
+            thread.join()
+        if self._pool:
+            self._pool.shutdown()
+        self.print_metrics()
+        return self.metrics
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def print_metrics(self):
+        print("Pipeline stage metrics:")
+        for stage in self.metrics.values():
+            print(f"  {stage.summary()}")
+
+    def _fetch_loop(self):
+        while True:
+            item = self._urls.get()
+            if item is _DONE:
+                return
+            url, context = item
+            started = time.monotonic()
+            try:
+                content = self.fetch_fn(url)
+            except Exception as e:
+                self.metrics['fetch'].record(time.monotonic() - started, ok=False)
+                self.failed.append(context)
+                print(f"Error fetching {url}: {e}")
+                continue
+            self.metrics['fetch'].record(time.monotonic() - started)
+            self._fetched.put((url, context, content))
+
+    def _dispatch_loop(self):
+        # Hand fetched pages to the process pool; the bounded pending queue
+        # caps how many parses are in flight
+        while True:
+            item = self._fetched.get()
+            if item is _DONE:
+                self._pending.put(_DONE)
+                return
+            url, context, content = item
+            if self._pool:
+                result = self._pool.submit(self.parse_fn, content, url, context)
+            else:
+                result = (content, context)
+            self._pending.put((url, result, time.monotonic(), context))
+
+    def _collect_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is _DONE:
+                self._records.put(_DONE)
+                return
+            url, result, submitted, context = item
+            try:
+                if self._pool:
+                    record = result.result()
+                else:
+                    content, context = result
+                    record = self.parse_fn(content, url, context)
+            except Exception as e:
+                self.metrics['parse'].record(time.monotonic() - submitted, ok=False)
+                self.failed.append(context)
+                print(f"Error parsing {url}: {e}")
+                continue
+            self.metrics['parse'].record(time.monotonic() - submitted)
+            if record is not None:
+                self._records.put(record)
+
+    def _store_loop(self):
+        batch = []
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._records.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            if item is _DONE:
+                break
+            if item is not None:
+                batch.append(item)
+            if batch and (len(batch) >= self.batch_size or time.monotonic() - last_flush >= self.flush_interval):
+                self._flush(batch)
+                batch = []
+                last_flush = time.monotonic()
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        started = time.monotonic()
+        try:
+            self.store_fn(batch)
+        except Exception as e:
+            self.metrics['store'].errors += len(batch)
+            print(f"Error storing batch of {len(batch)} records: {e}")
+            return
+        elapsed = time.monotonic() - started
+        for _ in batch:
+            self.metrics['store'].record(elapsed / len(batch))
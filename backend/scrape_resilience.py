@@ -0,0 +1,156 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+# HTTP statuses worth retrying: rate limiting and server-side failures
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# The listing no longer exists
+GONE_STATUS_CODES = {404, 410}
+
+
+class TransientScrapeError(Exception):
+    """Raised when a fetch failed in a way that may succeed on retry"""
+
+
+class CircuitOpenError(Exception):
+    """Raised when a host's circuit breaker is open and the request was skipped"""
+
+
+def is_transient_error(error):
+    """Check whether an exception from requests is worth retrying"""
+    if isinstance(error, TransientScrapeError):
+        return True
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code in TRANSIENT_STATUS_CODES
+    return False
+
+
+def is_gone_error(error):
+    """Check whether an exception from requests means the page was removed"""
+    return (isinstance(error, requests.exceptions.HTTPError) and error.response is not None
+            and error.response.status_code in GONE_STATUS_CODES)
+
+
+class RetryPolicy:
+    """Retry transient failures with jittered exponential backoff"""
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        """Full-jitter delay before retry number `attempt` (1-based)"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    def call(self, func, *args, **kwargs):
+        """Call func, retrying transient errors; the last error is re-raised"""
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_attempts or not is_transient_error(e):
+                    raise
+                delay = self.backoff(attempt)
+                print(f"Transient error ({e}), retrying in {delay:.1f}s "
+                      f"[attempt {attempt + 1}/{self.max_attempts}]")
+                time.sleep(delay)
+                attempt += 1
+
+
+class CircuitBreaker:
+    """Per-host circuit breaker, shared safely across threads.
+
+    After `failure_threshold` consecutive transient failures a host is skipped
+    for `cooldown_seconds`. After the cool-down a single request is let
+    through as a probe while other callers keep being skipped: success closes
+    the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=3, cooldown_seconds=600):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._opened_at = {}
+        self._probe_started = {}
+
+    @staticmethod
+    def host_for(url):
+        return urlparse(url).netloc.lower()
+
+    def _probe_due(self, host, now):
+        opened_at = self._opened_at.get(host)
+        if opened_at is None or now - opened_at < self.cooldown_seconds:
+            return False
+        # A probe that never reported back is given up after another cool-down
+        probe_started = self._probe_started.get(host)
+        return probe_started is None or now - probe_started >= self.cooldown_seconds
+
+    def available(self, host):
+        """Whether allow(host) would currently succeed, without claiming the probe"""
+        with self._lock:
+            return host not in self._opened_at or self._probe_due(host, time.monotonic())
+
+    def allow(self, host):
+        """Return True if a request to host may be attempted now"""
+        with self._lock:
+            if host not in self._opened_at:
+                return True
+            now = time.monotonic()
+            if self._probe_due(host, now):
+                # Half-open: this caller is the single probe
+                self._probe_started[host] = now
+                return True
+            return False
+
+    def record_success(self, host):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+            self._probe_started.pop(host, None)
+
+    def record_failure(self, host):
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if self._probe_started.pop(host, None) is not None:
+                # The probe failed: start another cool-down
+                self._opened_at[host] = time.monotonic()
+            elif failures >= self.failure_threshold and host not in self._opened_at:
+                self._opened_at[host] = time.monotonic()
+                print(f"Circuit opened for {host} after {failures} consecutive failures; "
+                      f"skipping it for {self.cooldown_seconds}s")
+
+
+class HostRateLimiter:
+    """Space out requests to the same host, shared safely across threads.
+
+    Each request to a host is given the next free slot at least
+    `min_interval` (plus up to `jitter`) seconds after the previous one, so
+    concurrent fetchers never hit a retailer faster than a sequential crawl.
+    """
+
+    def __init__(self, min_interval=0.5, jitter=1.0):
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval + random.uniform(0, self.jitter)
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
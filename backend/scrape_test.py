@@ -1,27 +1,25 @@
 import requests
 from bs4 import BeautifulSoup
-from flask_mysqldb import MySQL
-from flask import Flask
+import os
 import time
-import random
+import re
 import urllib3
+from contextlib import closing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from scrape_resilience import HostRateLimiter
+from scrape_pipeline import ScrapePipeline
+from product_parsers import parse_product, parse_product_page
+from retailers import RETAILERS, get_retailer
+from db import db_cursor
+from price_history_store import content_hash
+from structured_data import hit_rates
+from crawl_frontier import CrawlFrontier
+from sitemap_discovery import discover_urls, sitemaps_from_robots
+from url_utils import canonical_url
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
-# Initialize Flask app
-app = Flask(__name__)
-
-# MySQL configuration
-app.config['MYSQL_HOST'] = 'localhost'
-app.config['MYSQL_USER'] = 'tracker_user'
-app.config['MYSQL_PASSWORD'] = 'password'
-app.config['MYSQL_DB'] = 'price_tracker'
-
-mysql = MySQL(app)
-
-# Sleep to ensure connection is ready
-time.sleep(20)
-
 # Create a session with proper configuration
 def create_session():
     session = requests.Session()
@@ -32,241 +30,467 @@ def create_session():
 
 session = create_session()
 
+# Shared by listing and product fetches so concurrent pages respect each host
+rate_limiter = HostRateLimiter(min_interval=0.5, jitter=1.0)
+
+# Canonical product URL -> (stored URL, content hash) of its latest product_details row, loaded once per crawl
+known_products = None
+
+# Product URLs already handed out in this crawl
+frontier = CrawlFrontier()
+
+# Site -> start time of a sitemap run whose product pages are still in the pipeline
+pending_sitemap_runs = {}
+
+def start_crawl(expected_urls=None):
+    """Reset per-crawl state so a long-lived worker fetches every product again"""
+    global known_products, frontier
+    known_products = None
+    pending_sitemap_runs.clear()
+    frontier = CrawlFrontier(expected_urls or int(os.getenv('CRAWL_EXPECTED_URLS', '0')) or None)
+
+def get_known_products():
+    global known_products
+    if known_products is None:
+        with db_cursor() as cursor:
+            cursor.execute('''
+                SELECT pd.ProductURL, pd.content_hash
+                FROM product_details pd
+                JOIN (
+                    SELECT ProductURL, MAX(id) AS id FROM product_details GROUP BY ProductURL
+                ) latest ON latest.id = pd.id
+                ORDER BY pd.id
+            ''')
+            known_products = latest_by_canonical_url((url, (url, digest)) for url, digest in cursor.fetchall())
+    return known_products
+
+def latest_by_canonical_url(rows):
+    """{canonical URL: value} from (ProductURL, value) rows in id order.
+
+    The crawler stores canonical URLs, while older rows keep the URL as it
+    was linked; keying on the canonical form matches both, and when several
+    stored URLs share one the latest row wins.
+    """
+    return {canonical_url(url): value for url, value in rows}
+
+def changed_product_rows(rows):
+    """Drop rows identical to the product's latest stored row; the rest get their content hash appended"""
+    known = get_known_products()
+    changed = []
+    for row in rows:
+        stored_url, stored_digest = known.get(canonical_url(row[6]), (row[6], None))
+        # The hash covers the URL, so compare against the URL the row was stored under
+        if content_hash(*row[:6], stored_url, *row[7:]) != stored_digest:
+            changed.append(tuple(row) + (content_hash(*row),))
+    return changed
+
+def remember_product_rows(rows):
+    """Record the hashes of rows that were just stored"""
+    known = get_known_products()
+    for row in rows:
+        known[canonical_url(row[6])] = (row[6], row[8])
+
+INSERT_PRODUCT_SQL = '''
+    INSERT INTO product_details (name, price, old_price, availability, images, company, ProductURL, category, content_hash)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+'''
+
 # Function to store data in MySQL
-def store_product_data(product_name, new_price, old_price, product_image_url, company_name, product_url, category):
+def store_product_data(product_name, new_price, old_price, product_image_url, company_name, product_url, category,
+                       availability='In Stock'):
     try:
-        with app.app_context():
-            cursor = mysql.connection.cursor()
-            cursor.execute(''' 
-                INSERT INTO product_details (name, price, old_price, availability, images, company, ProductURL, category) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ''', (product_name, new_price, old_price, 'In Stock', product_image_url, company_name, product_url, category))
-            mysql.connection.commit()
-            cursor.close()
+        rows = changed_product_rows([(product_name, new_price, old_price, availability, product_image_url,
+                                      company_name, product_url, category)])
+        if not rows:
+            print(f"Product unchanged, skipped: {product_name}")
+            return
+        with db_cursor() as cursor:
+            cursor.execute(INSERT_PRODUCT_SQL, rows[0])
+        remember_product_rows(rows)
 
         print(f"Product scraped and stored successfully: {product_name}")
     except Exception as e:
         print(f"Error storing product details: {e}")
 
-# Function to scrape individual product details from BigDeals
-def scrape_bigdeals_product_details(product_url, category):
-    try:
-        response = session.get(product_url, verify=False, timeout=30)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Extract product name
-        product_name_tag = soup.find('h1', class_='product-name')
-        product_name = product_name_tag.text.strip() if product_name_tag else 'N/A'
-
-        # Extract product price
-        product_price_tag = soup.find('span', class_='sell-price')
-        old_price_tag = soup.find('span', class_='m-price')
-        new_price = product_price_tag.text.strip() if product_price_tag else '0.0'
-        old_price = old_price_tag.text.strip() if old_price_tag else '0.0'
-
-        # Clean and convert prices to float
-        new_price = new_price.replace('Rs.', '').replace(',', '').strip() if new_price else '0.0'
-        old_price = old_price.replace('Rs.', '').replace(',', '').strip() if old_price else '0.0'
-        new_price = float(new_price)
-        old_price = float(old_price)
-
-        # Extract image URL
-        image_tag = soup.find('a', class_='cloud-zoom defaultImage')
-        product_image_url = image_tag['href'] if image_tag else 'N/A'
-
-        if product_image_url.startswith('/'):
-            product_image_url = 'https://bigdeals.lk' + product_image_url
-
-        company_name = 'bigdeals.lk'
-        store_product_data(product_name, new_price, old_price, product_image_url, company_name, product_url, category)
-
-    except Exception as e:
-        print(f"Error scraping product details from {product_url}: {e}")
-
-# Function to scrape individual product details from Singhagiri
-def scrape_singhagiri_product_details(product_url, category):
+# Pipeline store stage: insert a batch of changed product_details rows in one round trip.
+# Records are (row, structured data source); rows read from listing cards have no source.
+def store_product_rows(records):
+    rows = []
+    for row, source in records:
+        if source:
+            hit_rates.record(row[5], source)
+        rows.append(row)
+    changed = changed_product_rows(rows)
+    if changed:
+        with db_cursor() as cursor:
+            cursor.executemany(INSERT_PRODUCT_SQL, changed)
+        remember_product_rows(changed)
+    print(f"Stored batch of {len(changed)} products ({len(rows) - len(changed)} unchanged skipped)")
+
+def fetch_product_page(product_url):
+    rate_limiter.wait(product_url)
+    response = session.get(product_url, verify=False, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+def scrape_product_details(product_url, category, site_type):
+    """Fetch, parse and store one product page; returns False if that failed"""
     try:
-        response = session.get(product_url, verify=False, timeout=30)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Extract product name
-        product_name_tag = soup.find('h1', class_='product-title')
-        product_name = product_name_tag.text.strip() if product_name_tag else 'N/A'
-
-        # Extract product price
-        selling_price_tag = soup.find('div', class_='selling-price')
-        product_price = '0.0'
-        old_price = '0.0'
-        
-        if selling_price_tag:
-            product_price_tag = selling_price_tag.find('span', class_='data')
-            if product_price_tag:
-                product_price = product_price_tag.text.strip()
-        
-        old_price_tag = soup.find('div', class_='strikeout')
-        if old_price_tag:
-            old_price = old_price_tag.text.strip()
-
-        # Clean and convert prices to float
-        product_price = product_price.replace('Rs.', '').replace('Rs', '').replace(',', '').replace('.', '').strip() if product_price else '0.0'
-        old_price = old_price.replace('Rs', '').replace('Rs.', '').replace(',', '').replace('.', '').strip() if old_price else '0.0'
-        product_price = float(product_price)
-        old_price = float(old_price)
-
-        # Extract image URL
-        image_tag = soup.find('a', {'data-fancybox': 'gallery'})
-        product_image_url = 'https://example.com/default-image.jpg'
-        if image_tag:
-            img_tag = image_tag.find('img')
-            if img_tag:
-                product_image_url = img_tag['src']
-
-        if product_image_url.startswith('/'):
-            product_image_url = 'https://d1ugx7ghroxfxae.cloudfront.net' + product_image_url
-
-        company_name = 'singhagiri.lk'
-        store_product_data(product_name, product_price, old_price, product_image_url, company_name, product_url, category)
-
-        print(f"Product scraped and stored successfully: {product_name}")
-
+        content = fetch_product_page(product_url)
+        product_name, price, old_price, product_image_url, availability = parse_product(content, site_type)
+        store_product_data(product_name, price, old_price, product_image_url,
+                           get_retailer(site_type).company, product_url, category, availability)
     except Exception as e:
         print(f"Error scraping product details from {product_url}: {e}")
+        return False
+    return True
+
+def build_full_url(product_url, site_type):
+    return get_retailer(site_type).absolute_url(product_url)
+
+def is_product_link(href, category_name, site_type):
+    return get_retailer(site_type).is_product_link(href, category_name)
+
+def extract_listing_cards(soup, category_name, site_type):
+    """Read name, prices and image for every product card on a listing page"""
+    return get_retailer(site_type).extract_listing_cards(soup, category_name)
+
+def is_card_complete(card):
+    return bool(card['name'] and card['price'] > 0 and card['image'])
+
+def scrape_product_page(product_url, category_name, site_type):
+    # fetch_product_page waits on the per-host rate limiter
+    return scrape_product_details(product_url, category_name, site_type)
+
+def fetch_listing_page(listing_url):
+    rate_limiter.wait(listing_url)
+    response = session.get(listing_url, verify=False, timeout=30)
+    response.raise_for_status()
+    return BeautifulSoup(response.text, 'html.parser')
+
+def process_listing_page(soup, listing_url, category_name, site_type, listing_only=True, pipeline=None):
+    """Store the products on a fetched listing page.
+
+    With listing_only, known products are stored straight from their listing
+    card and a product page is only fetched for new products or incomplete
+    cards. Otherwise every product page is fetched as before.
+
+    With a ScrapePipeline, card rows and product page URLs are handed to the
+    pipeline instead of being stored and fetched inline.
+
+    Returns the number of products newly claimed in this crawl, so 0 marks
+    an empty page, or one repeating products already seen (e.g. a site
+    serving its last page for any page number past the end).
+    """
+    cards = extract_listing_cards(soup, category_name, site_type) if listing_only else []
+
+    # Product links outside any recognised card still need their page fetched
+    link_urls = [build_full_url(link['href'], site_type) for link in soup.find_all('a', href=True)
+                 if is_product_link(link['href'], category_name, site_type)]
+
+    if not cards and not link_urls:
+        print(f"No product links found on {listing_url}")
+        return 0
+
+    # Each product is handled once per crawl, however often it is linked;
+    # cards are claimed first so a product with a card is not also fetched
+    listed = len(cards) + len(link_urls)
+    claimed_cards = []
+    for card in cards:
+        url = frontier.claim(card['url'])
+        if url:
+            claimed_cards.append(dict(card, url=url))
+    cards = claimed_cards
+    page_urls = [url for url in map(frontier.claim, link_urls) if url]
+    print(f"Found {len(cards)} new product cards and {len(page_urls)} other new product links "
+          f"({listed - len(cards) - len(page_urls)} already seen this crawl).")
+    found = len(cards) + len(page_urls)
+
+    known_urls = get_known_products() if cards else {}
+    from_cards = 0
+    for card in cards:
+        if card['url'] in known_urls and is_card_complete(card):
+            if pipeline:
+                pipeline.submit_record(((card['name'], card['price'], card['old_price'], card['availability'], card['image'],
+                                         get_retailer(site_type).company, card['url'], category_name), None))
+            else:
+                store_product_data(card['name'], card['price'], card['old_price'], card['image'],
+                                   get_retailer(site_type).company, card['url'], category_name, card['availability'])
+            from_cards += 1
+        else:
+            page_urls.append(card['url'])
 
-# Singer Product Scraping Function
-def scrape_singer_product_details(product_url, category):
-    try:
-        response = session.get(product_url, verify=False, timeout=30)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Extract product name
-        product_name_tag = soup.find('h5', class_='single-page-product-title')
-        product_name = product_name_tag.text.strip() if product_name_tag else 'N/A'
-
-        # Extract product price
-        product_price_tag = soup.find('h4', class_='fw-bold mb-0 sing-pro-price')
-        if not product_price_tag:
-            product_price_tag = soup.find('h4', class_='text-primary fw-bold mb-0 productprice')
-        old_price_tag = soup.find('span', class_='text-decoration-line-through text-muted fs-6')
-        
-        new_price = 0.0
-        old_price = 0.0
-
-        if product_price_tag:
-            new_price_str = product_price_tag.find(text=True, recursive=False)
-            if new_price_str:
-                new_price_str = new_price_str.strip().replace('Rs.', '').replace(',', '').replace(' ', '')
-                if new_price_str:
-                    new_price = float(new_price_str)
-
-        if old_price_tag:
-            old_price_str = old_price_tag.text.strip().replace('Rs.', '').replace(',', '').replace(' ', '')
-            if old_price_str:
-                old_price = float(old_price_str)
-
-        # Extract image URL
-        image_tag = soup.find('a', {'data-fancybox': 'gallery'})
-        product_image_url = 'N/A'
-        if image_tag:
-            img_tag = image_tag.find('img')
-            if img_tag:
-                product_image_url = img_tag['src']
-
-        company_name = 'singersl.com'
-        store_product_data(product_name, new_price, old_price, product_image_url, company_name, product_url, category)
+    # Loop through each remaining product link and scrape its details
+    for full_product_url in page_urls:
+        if pipeline:
+            pipeline.submit(full_product_url, (site_type, get_retailer(site_type).company, category_name))
+            continue
+        print(f"Scraping product: {full_product_url}")
+        scrape_product_page(full_product_url, category_name, site_type)
 
-    except Exception as e:
-        print(f"Error scraping product details from {product_url}: {e}")
+    print(f"Stored {from_cards} products from listing cards, fetched {len(page_urls)} product pages")
+    return found
 
 # Function to scrape product links from a single page
-def scrape_listing_page(listing_url, category_name, site_type):
+def scrape_listing_page(listing_url, category_name, site_type, listing_only=True):
     try:
-        time.sleep(random.uniform(1, 3))
-
-        response = session.get(listing_url, verify=False, timeout=30)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Find all anchor tags with 'href' attribute
-        product_links = soup.find_all('a', href=True)
-        
-        # Filter the links based on site type
-        if site_type == 'bigdeals':
-            valid_links = [link for link in product_links if f'/{category_name.lower()}/' in link['href']]
-        elif site_type == 'singer' or site_type == 'singhagiri':
-            valid_links = [link for link in product_links if '/product/' in link['href']]
-        else:
-            valid_links = []
-
-        if not valid_links:
-            print(f"No product links found on {listing_url}")
-            return
-
-        print(f"Found {len(valid_links)} product links.")
-
-        # Loop through each product link and scrape its details
-        for link in valid_links:
-            product_url = link['href']
-            
-            # Build full URL
-            if product_url.startswith('https://'):
-                full_product_url = product_url
-            else:
-                if site_type == 'bigdeals':
-                    full_product_url = 'https://bigdeals.lk' + product_url
-                elif site_type == 'singer':
-                    full_product_url = 'https://www.singersl.com' + product_url
-                elif site_type == 'singhagiri':
-                    full_product_url = 'https://singhagiri.lk' + product_url
-
-            print(f"Scraping product: {full_product_url}")
-            
-            # Add delay between product scraping
-            time.sleep(random.uniform(0.5, 1.5))
-            
-            if site_type == 'singer':
-                scrape_singer_product_details(full_product_url, category_name)
-            elif site_type == 'singhagiri':
-                scrape_singhagiri_product_details(full_product_url, category_name)
-            elif site_type == 'bigdeals':
-                scrape_bigdeals_product_details(full_product_url, category_name)
-
+        soup = fetch_listing_page(listing_url)
+        return process_listing_page(soup, listing_url, category_name, site_type, listing_only)
     except requests.exceptions.SSLError as e:
         print(f"SSL Error scraping listing page: {e}")
         print("SSL verification has been disabled but error persists")
     except Exception as e:
         print(f"Error scraping listing page: {e}")
+    return 0
+
+PAGE_PARAM_PATTERN = re.compile(r'[?&]page=(\d+)')
+
+def detect_total_pages(soup):
+    """Read the highest page number from pagination markup.
+
+    Returns None when the page has no pagination links, in which case the
+    caller probes pages until the first empty one.
+    """
+    page_numbers = []
+    for link in soup.select('.pagination a, ul.pagination a, a[href*="page="]'):
+        match = PAGE_PARAM_PATTERN.search(link.get('href', ''))
+        if match:
+            page_numbers.append(int(match.group(1)))
+        elif link.get_text(strip=True).isdigit():
+            page_numbers.append(int(link.get_text(strip=True)))
+    return max(page_numbers) if page_numbers else None
+
+# Upper bound on listing pages per category, whether detected or probed
+MAX_LISTING_PAGES = int(os.getenv('SCRAPE_MAX_LISTING_PAGES', '200'))
+
+def listing_page_url(base_url, page_number):
+    return f"{base_url}?page={page_number}"
+
+def _scrape_pages_concurrently(base_url, page_numbers, category_name, site_type, listing_only, max_workers,
+                               pipeline=None):
+    """Fetch listing pages in parallel and process each one as it arrives.
+
+    Returns the page numbers that turned out to be empty or could not be
+    fetched (e.g. a 404 past the last page).
+    """
+    empty_pages = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_listing_page, listing_page_url(base_url, page_number)): page_number
+            for page_number in page_numbers
+        }
+        for future in as_completed(futures):
+            page_number = futures[future]
+            page_url = listing_page_url(base_url, page_number)
+            try:
+                soup = future.result()
+                print(f"Scraping page {page_number}: {page_url}")
+                found = process_listing_page(soup, page_url, category_name, site_type, listing_only, pipeline)
+            except Exception as e:
+                print(f"Error scraping listing page {page_url}: {e}")
+                found = 0
+            if not found:
+                empty_pages.append(page_number)
+    return empty_pages
 
 # Function to scrape multiple pages in a category
-def scrape_listing_page_with_pagination(base_url, total_pages, category_name, site_type):
-    for page_number in range(1, total_pages + 1):
-        page_url = f"{base_url}?page={page_number}"
-        print(f"Scraping page {page_number}: {page_url}")
-        scrape_listing_page(page_url, category_name, site_type)
-
-# Categories with URLs for all three sites
-categories = {
-    'bigdeals': {
-        'tv': 'https://bigdeals.lk/tv',
-        'laptops': 'https://bigdeals.lk/laptops',
-        'mobile_phones': 'https://bigdeals.lk/mobile_phones'
-    },
-    'singer': {
-        'tv': 'https://www.singersl.com/products/entertainment/television',
-        'laptops': 'https://www.singersl.com/products/electronics/laptops-notebooks',
-        'mobile_phones': 'https://www.singersl.com/products/electronics/mobile-phones'
-    },
-    'singhagiri': {
-        'tv': 'https://singhagiri.lk/products/television',
-        'laptops': 'https://singhagiri.lk/products/computers-accessories/laptop',
-        'mobile_phones': 'https://singhagiri.lk/products/mobile-phones'
-    }
-}
-
-# Loop through all categories for all sites
-for site_type, categories_for_site in categories.items():
-    for category_name, category_url in categories_for_site.items():
+def scrape_listing_page_with_pagination(base_url, total_pages=None, category_name=None, site_type=None,
+                                        listing_only=True, max_workers=4, pipeline=None):
+    """Scrape every page of a category.
+
+    When total_pages is not given it is detected from the first page's
+    pagination markup, or by probing batches of pages until an empty one.
+    Pages after the first are fetched concurrently, within the host's rate
+    limit, and processed as they arrive. Probing stops at the first empty,
+    repeated or failed page, and never goes past MAX_LISTING_PAGES.
+    """
+    first_page_url = listing_page_url(base_url, 1)
+    try:
+        first_page = fetch_listing_page(first_page_url)
+    except Exception as e:
+        print(f"Error scraping listing page {first_page_url}: {e}")
+        return
+
+    if total_pages is None:
+        total_pages = detect_total_pages(first_page)
+        print(f"Detected {total_pages or 'unknown'} pages for {category_name} on {site_type}")
+
+    print(f"Scraping page 1: {first_page_url}")
+    found = process_listing_page(first_page, first_page_url, category_name, site_type, listing_only, pipeline)
+
+    if total_pages is not None:
+        total_pages = min(total_pages, MAX_LISTING_PAGES)
+        if total_pages > 1:
+            _scrape_pages_concurrently(base_url, range(2, total_pages + 1), category_name, site_type,
+                                       listing_only, max_workers, pipeline)
+        return
+
+    # No pagination markup: walk forward a batch at a time until a page comes back empty
+    next_page = 2
+    while found and next_page <= MAX_LISTING_PAGES:
+        batch = range(next_page, min(next_page + max_workers, MAX_LISTING_PAGES + 1))
+        empty_pages = _scrape_pages_concurrently(base_url, batch, category_name, site_type,
+                                                 listing_only, max_workers, pipeline)
+        if empty_pages:
+            break
+        next_page += max_workers
+
+# Sitemap discovery: only product pages whose <lastmod> is newer than the
+# previous successful discovery run for the retailer are fetched
+SITEMAP_STATE_QUERY = 'SELECT last_fetched_at FROM sitemap_fetch_state WHERE retailer = %s'
+UPDATE_SITEMAP_STATE_SQL = '''
+    INSERT INTO sitemap_fetch_state (retailer, last_fetched_at) VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE last_fetched_at = VALUES(last_fetched_at)
+'''
+
+def get_sitemap_fetched_at(site_type):
+    with db_cursor() as cursor:
+        cursor.execute(SITEMAP_STATE_QUERY, (site_type,))
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+def set_sitemap_fetched_at(site_type, fetched_at):
+    with db_cursor() as cursor:
+        cursor.execute(UPDATE_SITEMAP_STATE_SQL, (site_type, fetched_at))
+
+def get_known_categories():
+    """Canonical product URL -> category of its latest product_details row"""
+    with db_cursor() as cursor:
+        cursor.execute('''
+            SELECT pd.ProductURL, pd.category
+            FROM product_details pd
+            JOIN (
+                SELECT ProductURL, MAX(id) AS id FROM product_details GROUP BY ProductURL
+            ) latest ON latest.id = pd.id
+            ORDER BY pd.id
+        ''')
+        return latest_by_canonical_url(cursor.fetchall())
+
+def open_sitemap(sitemap_url):
+    """Stream a sitemap body; transfer encoding is undone, .xml.gz files are left to the parser"""
+    rate_limiter.wait(sitemap_url)
+    response = session.get(sitemap_url, verify=False, timeout=30, stream=True)
+    response.raise_for_status()
+    response.raw.decode_content = True
+    return closing(response.raw)
+
+def find_sitemaps(retailer):
+    if retailer.sitemaps:
+        return retailer.sitemaps
+    try:
+        rate_limiter.wait(retailer.base_url)
+        response = session.get(f"{retailer.base_url}/robots.txt", verify=False, timeout=30)
+        if response.ok:
+            listed = sitemaps_from_robots(response.text)
+            if listed:
+                return listed
+    except requests.RequestException as e:
+        print(f"Error reading robots.txt for {retailer.key}: {e}")
+    return [f"{retailer.base_url}/sitemap.xml"]
+
+def scrape_from_sitemaps(site_type, pipeline=None):
+    """Discover changed product pages from the retailer's sitemaps and scrape them.
+
+    A page's category comes from its URL when the retailer encodes it there,
+    otherwise from the stored product; pages that match neither are new
+    products left to listing discovery. Returns the number of such pages, or
+    None when no sitemap could be read.
+
+    The sitemap timestamp only moves forward after a clean run, so sitemaps
+    and product pages that failed are listed again next time. With a
+    pipeline that is decided once it has drained, by finish_sitemap_runs.
+    """
+    retailer = get_retailer(site_type)
+    started_at = datetime.now()
+    since = get_sitemap_fetched_at(site_type)
+    known_categories = get_known_categories()
+    opened = []
+    failed_sitemaps = []
+
+    def open_counted(sitemap_url):
+        stream = open_sitemap(sitemap_url)
+        opened.append(sitemap_url)
+        return stream
+
+    listed = queued = uncategorized = failed_pages = 0
+    for url, lastmod in discover_urls(find_sitemaps(retailer), open_counted, since, failed=failed_sitemaps):
+        if not retailer.is_product_url(url):
+            continue
+        listed += 1
+        category_name = retailer.category_for_url(url) or known_categories.get(canonical_url(url))
+        if category_name is None:
+            uncategorized += 1
+            continue
+        product_url = frontier.claim(url)
+        if not product_url:
+            continue
+        queued += 1
+        if pipeline:
+            pipeline.submit(product_url, (site_type, retailer.company, category_name))
+        else:
+            print(f"Scraping product: {product_url}")
+            if not scrape_product_page(product_url, category_name, site_type):
+                failed_pages += 1
+
+    print(f"Sitemaps for {site_type}: {listed} product pages changed since {since or 'ever'}, "
+          f"{queued} queued, {uncategorized} without a known category")
+    if not opened:
+        return None
+    if failed_sitemaps or failed_pages:
+        print(f"Keeping the sitemap timestamp for {site_type}: {len(failed_sitemaps)} sitemaps "
+              f"and {failed_pages} product pages failed")
+    elif pipeline:
+        pending_sitemap_runs[site_type] = started_at
+    else:
+        set_sitemap_fetched_at(site_type, started_at)
+    return uncategorized
+
+def finish_sitemap_runs(pipeline):
+    """Advance the sitemap timestamp of sites whose queued pages were all fetched and stored"""
+    failed_sites = {context[0] for context in pipeline.failed if context}
+    store_errors = pipeline.metrics['store'].errors
+    for site_type, started_at in pending_sitemap_runs.items():
+        if store_errors or site_type in failed_sites:
+            print(f"Keeping the sitemap timestamp for {site_type}: some of its pages failed")
+        else:
+            set_sitemap_fetched_at(site_type, started_at)
+    pending_sitemap_runs.clear()
+
+# Discovery mode: 'listing' walks category pages, 'sitemap' reads sitemaps
+# and falls back to listings for retailers without a usable sitemap, or when
+# the sitemaps list new products whose category the URL does not give
+DISCOVERY_MODE = os.getenv('SCRAPE_DISCOVERY', 'listing')
+
+def crawl_site(site_type, pipeline=None, discovery=DISCOVERY_MODE):
+    if discovery == 'sitemap':
+        uncategorized = scrape_from_sitemaps(site_type, pipeline)
+        if uncategorized == 0:
+            return
+        if uncategorized is None:
+            print(f"No readable sitemap for {site_type}, falling back to category listings")
+        else:
+            # e.g. retailers whose product URLs do not name the category
+            print(f"{uncategorized} new products from the {site_type} sitemaps have no category, "
+                  f"walking category listings to find them")
+    for category_name, category_url in categories[site_type].items():
         print(f"Starting to scrape category: {category_name} from site: {site_type}")
-        scrape_listing_page_with_pagination(category_url, total_pages=1, category_name=category_name, site_type=site_type)
+        scrape_listing_page_with_pagination(category_url, category_name=category_name, site_type=site_type,
+                                            pipeline=pipeline)
+
+# Category listing URLs for every registered retailer
+categories = {key: retailer.categories for key, retailer in RETAILERS.items()}
+
+# Loop through all categories for all sites; product pages are fetched,
+# parsed and stored by the pipeline while listing pages are still being read
+# (guarded so parse worker processes can import this module safely)
+if __name__ == '__main__':
+    # Give the database time to come up when started alongside it
+    time.sleep(int(os.getenv('SCRAPE_STARTUP_DELAY', '20')))
+    start_crawl()
+    parse_workers = int(os.getenv('SCRAPE_PARSE_WORKERS', os.cpu_count()))
+    with ScrapePipeline(fetch_product_page, parse_product_page, store_product_rows,
+                        parse_workers=parse_workers) as pipeline:
+        for site_type in categories:
+            crawl_site(site_type, pipeline)
+    finish_sitemap_runs(pipeline)
+    print(f"Structured data hit rates:\n{hit_rates.summary()}")
@@ -0,0 +1,62 @@
+import threading
+import time
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait and get the same result (or exception). Successful,
+    non-None results are also reused for `fresh_seconds` afterwards.
+    """
+
+    MAX_RECENT = 1024
+
+    def __init__(self, fresh_seconds=0):
+        self.fresh_seconds = fresh_seconds
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._recent = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent and time.monotonic() - recent[0] < self.fresh_seconds:
+                return recent[1]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and call.result is not None and self.fresh_seconds > 0:
+                    self._recent[key] = (time.monotonic(), call.result)
+                    if len(self._recent) > self.MAX_RECENT:
+                        self._prune()
+            call.done.set()
+        return call.result
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in [k for k, (at, _) in self._recent.items() if now - at >= self.fresh_seconds]:
+            del self._recent[key]
@@ -0,0 +1,100 @@
+import gzip
+import io
+import re
+from datetime import datetime
+from xml.etree.ElementTree import iterparse
+
+# Sitemap-driven product discovery. Sitemaps (and sitemap indexes, plain or
+# gzipped) are stream-parsed with iterparse, so a 50k-URL sitemap is never
+# held as a tree, and each <url> element is cleared once read. Entries are
+# filtered on <lastmod> against the time of the previous discovery run, so a
+# run only queues pages that changed since then; a sitemap index entry whose
+# lastmod is older than that is not fetched at all.
+
+GZIP_MAGIC = b'\x1f\x8b'
+ROBOTS_SITEMAP_PATTERN = re.compile(r'^\s*sitemap\s*:\s*(\S+)', re.IGNORECASE | re.MULTILINE)
+
+# Upper bound on sitemap files fetched per retailer, in case an index nests badly
+MAX_SITEMAPS = 200
+
+
+def _local_name(tag):
+    return tag.rpartition('}')[2]
+
+
+def parse_lastmod(text):
+    """W3C datetime from <lastmod> as a naive local datetime, or None"""
+    if not text:
+        return None
+    text = text.strip()
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    try:
+        value = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def sitemaps_from_robots(robots_text):
+    """Sitemap URLs listed in a robots.txt"""
+    return ROBOTS_SITEMAP_PATTERN.findall(robots_text or '')
+
+
+def iter_sitemap(stream):
+    """Yield (kind, loc, lastmod) for every entry of a sitemap or sitemap index.
+
+    kind is 'url' for pages and 'sitemap' for child sitemaps of an index.
+    stream is a binary file object; gzip content is detected and unpacked.
+    """
+    stream = io.BufferedReader(stream) if not hasattr(stream, 'peek') else stream
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        stream = gzip.GzipFile(fileobj=stream)
+
+    loc = lastmod = None
+    for event, element in iterparse(stream, events=('end',)):
+        name = _local_name(element.tag)
+        if name == 'loc':
+            loc = (element.text or '').strip()
+        elif name == 'lastmod':
+            lastmod = parse_lastmod(element.text)
+        elif name in ('url', 'sitemap'):
+            if loc:
+                yield ('url' if name == 'url' else 'sitemap'), loc, lastmod
+            loc = lastmod = None
+            element.clear()
+
+
+def discover_urls(sitemap_urls, open_sitemap, since=None, max_sitemaps=MAX_SITEMAPS, failed=None):
+    """Yield (page_url, lastmod) for pages changed after `since`.
+
+    open_sitemap(url) returns a binary stream for a sitemap. Entries without
+    a lastmod are always yielded, since there is no way to tell they are
+    unchanged. With since=None every page is yielded.
+
+    Sitemaps that could not be read, or were read only partly, are appended
+    to the `failed` list, as are those left unread past max_sitemaps.
+    """
+    failed = [] if failed is None else failed
+    pending = list(sitemap_urls)
+    seen = set()
+    while pending and len(seen) < max_sitemaps:
+        sitemap_url = pending.pop(0)
+        if sitemap_url in seen:
+            continue
+        seen.add(sitemap_url)
+        try:
+            with open_sitemap(sitemap_url) as stream:
+                for kind, loc, lastmod in iter_sitemap(stream):
+                    if since is not None and lastmod is not None and lastmod <= since:
+                        continue
+                    if kind == 'sitemap':
+                        pending.append(loc)
+                    else:
+                        yield loc, lastmod
+        except Exception as e:
+            failed.append(sitemap_url)
+            print(f"Error reading sitemap {sitemap_url}: {e}")
+    failed.extend(url for url in dict.fromkeys(pending) if url not in seen)
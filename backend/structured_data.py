@@ -0,0 +1,216 @@
+import json
+import re
+import threading
+
+from price_parsing import price_to_float
+
+# Structured-data fast path for product pages. Many shops embed a
+# schema.org Product/Offer as <script type="application/ld+json">, or as
+# itemprop microdata, carrying name, price, currency and availability. Both
+# are found with a scan over the raw bytes and json.loads, which is far
+# cheaper than building a BeautifulSoup tree and running CSS selectors. The
+# retailer registry falls back to its selectors when a page has no usable
+# offer.
+
+SOURCE_JSON_LD = 'json-ld'
+SOURCE_MICRODATA = 'microdata'
+SOURCE_CSS = 'css'
+
+LD_JSON_PATTERN = re.compile(
+    rb'<script[^>]*?type\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL)
+
+# itemprop="price" content="..." in either attribute order
+MICRODATA_PRICE_PATTERN = re.compile(
+    rb'<[^>]*?(?:itemprop\s*=\s*["\']price["\'][^>]*?content\s*=\s*["\']([^"\']+)["\']'
+    rb'|content\s*=\s*["\']([^"\']+)["\'][^>]*?itemprop\s*=\s*["\']price["\'])',
+    re.IGNORECASE)
+MICRODATA_AVAILABILITY_PATTERN = re.compile(
+    rb'itemprop\s*=\s*["\']availability["\'][^>]*?(?:href|content)\s*=\s*["\']([^"\']+)["\']',
+    re.IGNORECASE)
+
+# schema.org ItemAvailability -> the availability labels stored in the database
+AVAILABILITY_LABELS = {
+    'instock': 'In Stock',
+    'instoreonly': 'In Stock',
+    'onlineonly': 'In Stock',
+    'limitedavailability': 'In Stock',
+    'outofstock': 'Out of Stock',
+    'soldout': 'Out of Stock',
+    'discontinued': 'Out of Stock',
+    'preorder': 'Pre-Order',
+    'presale': 'Pre-Order',
+    'backorder': 'Back Order',
+}
+
+LIST_PRICE_TYPES = ('listprice', 'strikethroughprice', 'msrp')
+
+
+def availability_label(value):
+    """Stored availability label for a schema.org availability value, or None"""
+    if not value:
+        return None
+    return AVAILABILITY_LABELS.get(str(value).rstrip('/').rsplit('/', 1)[-1].lower())
+
+
+def _types(node):
+    node_type = node.get('@type', ())
+    return {t.lower() for t in ([node_type] if isinstance(node_type, str) else node_type)
+            if isinstance(t, str)}
+
+
+def _walk(data):
+    # Products can be top level, in a list, in @graph, or the mainEntity of a page
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            yield node
+            for key in ('@graph', 'mainEntity', 'itemListElement', 'item'):
+                if key in node:
+                    stack.append(node[key])
+
+
+def iter_json_ld(content):
+    """Every JSON object in the page's ld+json blocks; malformed blocks are skipped"""
+    if b'ld+json' not in content and b'LD+JSON' not in content:
+        return
+    for match in LD_JSON_PATTERN.finditer(content):
+        try:
+            data = json.loads(match.group(1), strict=False)
+        except ValueError:
+            continue
+        yield from _walk(data)
+
+
+def _price(value):
+    if value is None or isinstance(value, bool):
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    return price_to_float(str(value))
+
+
+def _offer_prices(offers):
+    """(price, list_price, availability) from an Offer, AggregateOffer or list of them"""
+    offers = offers if isinstance(offers, list) else [offers]
+    for offer in offers:
+        if not isinstance(offer, dict):
+            continue
+        currency = offer.get('priceCurrency')
+        if currency and str(currency).upper() != 'LKR':
+            continue
+        price = _price(offer.get('price', offer.get('lowPrice')))
+        list_price = 0.0
+        specs = offer.get('priceSpecification') or []
+        for spec in specs if isinstance(specs, list) else [specs]:
+            if not isinstance(spec, dict):
+                continue
+            price_type = str(spec.get('priceType', '')).rsplit('/', 1)[-1].lower()
+            if price_type in LIST_PRICE_TYPES:
+                list_price = _price(spec.get('price'))
+            elif price <= 0:
+                price = _price(spec.get('price'))
+        if price > 0:
+            return price, list_price, availability_label(offer.get('availability'))
+    return 0.0, 0.0, None
+
+
+def _image(value):
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get('url') or value.get('contentUrl')
+    return value if isinstance(value, str) else None
+
+
+def json_ld_offer(content):
+    """The page's JSON-LD Product offer, or None.
+
+    Returns a dict with name, price, old_price (0.0 when the page gives no
+    list price), availability (None when not stated) and image.
+    """
+    for node in iter_json_ld(content):
+        if 'product' not in _types(node) or 'offers' not in node:
+            continue
+        price, list_price, availability = _offer_prices(node['offers'])
+        if price <= 0:
+            continue
+        return {
+            'name': node.get('name') if isinstance(node.get('name'), str) else None,
+            'price': price,
+            'old_price': list_price if list_price > price else 0.0,
+            'availability': availability,
+            'image': _image(node.get('image')),
+        }
+    return None
+
+
+def microdata_offer(content):
+    """Price and availability from itemprop microdata, or None"""
+    if b'itemprop' not in content:
+        return None
+    match = MICRODATA_PRICE_PATTERN.search(content)
+    if match is None:
+        return None
+    price = price_to_float((match.group(1) or match.group(2)).decode('utf-8', 'replace'))
+    if price <= 0:
+        return None
+    availability = MICRODATA_AVAILABILITY_PATTERN.search(content)
+    return {
+        'name': None,
+        'price': price,
+        'old_price': 0.0,
+        'availability': availability_label(availability.group(1).decode('ascii', 'replace')) if availability else None,
+        'image': None,
+    }
+
+
+def structured_offer(content):
+    """(offer, source) from JSON-LD or microdata, or (None, None)"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    offer = json_ld_offer(content)
+    if offer is not None:
+        return offer, SOURCE_JSON_LD
+    offer = microdata_offer(content)
+    if offer is not None:
+        return offer, SOURCE_MICRODATA
+    return None, None
+
+
+class HitRates:
+    """Per-retailer counts of pages answered by structured data vs CSS selectors"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, retailer_key, source):
+        with self._lock:
+            counts = self._counts.setdefault(retailer_key, {})
+            counts[source] = counts.get(source, 0) + 1
+
+    def as_dict(self):
+        with self._lock:
+            report = {}
+            for retailer_key, counts in self._counts.items():
+                total = sum(counts.values())
+                structured = total - counts.get(SOURCE_CSS, 0)
+                report[retailer_key] = dict(counts, total=total,
+                                            hit_rate=round(structured / total, 3) if total else 0.0)
+            return report
+
+    def summary(self):
+        lines = []
+        for retailer_key, counts in sorted(self.as_dict().items()):
+            lines.append(f"{retailer_key:<16} {counts['hit_rate'] * 100:5.1f}% structured "
+                         f"({counts.get(SOURCE_JSON_LD, 0)} json-ld, {counts.get(SOURCE_MICRODATA, 0)} microdata, "
+                         f"{counts.get(SOURCE_CSS, 0)} css of {counts['total']})")
+        return '\n'.join(lines)
+
+
+# Process-wide counters, filled in wherever parse results are collected
+hit_rates = HitRates()
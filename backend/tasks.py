@@ -1,43 +1,67 @@
 from celery import Celery
-from backend.app import app, scrape_listing_page_with_pagination  # Import your Flask app and scraping function
+from db import db_cursor, get_database_connection
+from price_history_rollups import refresh_daily_rollups
 import os
 
+# Workers import only what each task needs: no Flask app, and the scraper
+# modules are loaded by the scrape task itself.
+
 # Set up Celery with Redis as the broker
 celery = Celery(
     'tasks',
     broker=os.getenv('REDIS_URL', 'redis://localhost:6379/0')  # Using Redis as the message broker
 )
 
-celery.conf.update(app.config)
-
 @celery.task
 def fetch_and_store_price_data():
     """
     Periodic task to scrape products from competitors and update the database
     """
-    categories = {
-        'bigdeals': {
-            'tv': 'https://bigdeals.lk/tv',
-            'laptops': 'https://bigdeals.lk/laptops',
-            'mobile_phones': 'https://bigdeals.lk/mobile_phones'
-        },
-        'singer': {
-            'tv': 'https://www.singersl.com/products/entertainment/television',
-            'laptops': 'https://www.singersl.com/products/electronics/laptops-notebooks',
-            'mobile_phones': 'https://www.singersl.com/products/electronics/mobile-phones'
-        },
-        'singhagiri': {
-            'tv': 'https://singhagiri.lk/products/television',
-            'laptops': 'https://singhagiri.lk/products/computers-accessories/laptop',
-            'mobile_phones': 'https://singhagiri.lk/products/mobile-phones'
-        }
-    }
-
-    # Loop through categories and scrape data for each site
-    for site_type, categories_for_site in categories.items():
-        for category_name, category_url in categories_for_site.items():
-            print(f"Starting to scrape category: {category_name} from site: {site_type}")
-            scrape_listing_page_with_pagination(category_url, total_pages=1, category_name=category_name, site_type=site_type)
+    from scrape_test import categories, crawl_site, start_crawl
+
+    start_crawl()
+    # Discover and scrape products for each site (SCRAPE_DISCOVERY picks listings or sitemaps)
+    for site_type in categories:
+        crawl_site(site_type)
+
+@celery.task
+def refresh_price_history_rollups():
+    """Recompute yesterday's and today's daily price rollups"""
+    with db_cursor() as cursor:
+        refresh_daily_rollups(cursor)
+
+@celery.task
+def archive_cold_price_history():
+    """Move price history older than HISTORY_HOT_DAYS into the Parquet archive"""
+    import history_archive
+
+    from partition_maintenance import is_partitioned
+
+    if not history_archive.archive_enabled():
+        print("HISTORY_ARCHIVE_DIR not set or pyarrow missing; skipping archive")
+        return
+    conn = get_database_connection()
+    try:
+        cursor = conn.cursor()
+        partitioned = is_partitioned(cursor)
+        cursor.close()
+        # A partitioned table is archived a month at a time by the partition task
+        if not partitioned:
+            history_archive.archive_competitor_price_history(conn)
+        history_archive.archive_price_history(conn)
+    finally:
+        conn.close()
+
+@celery.task
+def maintain_competitor_history_partitions():
+    """Create upcoming monthly partitions and retire expired ones"""
+    from partition_maintenance import maintain_partitions
+
+    conn = get_database_connection()
+    try:
+        maintain_partitions(conn)
+    finally:
+        conn.close()
 
 # Schedule the task to run periodically (every 30 minutes)
 from celery.schedules import crontab
@@ -47,4 +71,16 @@ celery.conf.beat_schedule = {
         'task': 'tasks.fetch_and_store_price_data',
         'schedule': crontab(minute='*/30'),  # Run every 30 minutes (you can adjust this)
     },
+    'refresh-price-history-rollups': {
+        'task': 'tasks.refresh_price_history_rollups',
+        'schedule': crontab(minute=5),  # Hourly, after the scrape has written
+    },
+    'archive-cold-price-history': {
+        'task': 'tasks.archive_cold_price_history',
+        'schedule': crontab(hour=3, minute=30),  # Nightly, after the rollups for the day
+    },
+    'maintain-competitor-history-partitions': {
+        'task': 'tasks.maintain_competitor_history_partitions',
+        'schedule': crontab(hour=4, minute=0),  # Nightly, after the archive run
+    },
 }
@@ -0,0 +1,253 @@
+import os
+
+import pytest
+from mysql.connector.errors import InterfaceError, PoolError, ProgrammingError
+
+import db_routing
+from db_routing import ReadPins, Replica, ReplicaRouter, parse_hosts, replication_lag
+
+SECRET = 'test-secret'
+
+
+class FakeCursor:
+    def __init__(self, lag, legacy=False):
+        self.lag = lag
+        self.legacy = legacy
+        self.description = None
+        self.executed = []
+
+    def execute(self, sql):
+        self.executed.append(sql)
+        if sql == 'SHOW REPLICA STATUS' and self.legacy:
+            raise ProgrammingError('You have an error in your SQL syntax')
+        column = 'Seconds_Behind_Master' if self.legacy else 'Seconds_Behind_Source'
+        self.description = [('Replica_IO_State',), (column,)]
+
+    def fetchone(self):
+        if self.lag is False:
+            return None
+        return ('Waiting for source to send event', self.lag)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, replica):
+        self.replica = replica
+        self.closed = False
+
+    def cursor(self):
+        if self.replica.status_error:
+            raise InterfaceError('Lost connection to MySQL server')
+        return FakeCursor(self.replica.lag_value, self.replica.legacy)
+
+    def close(self):
+        self.closed = True
+        self.replica.pool.in_use -= 1
+
+
+class FakePool:
+    def __init__(self, replica, size):
+        self.replica = replica
+        self.size = size
+        self.in_use = 0
+        self.requests = 0
+
+    def get_connection(self):
+        self.requests += 1
+        if self.replica.down:
+            raise InterfaceError("Can't connect to MySQL server")
+        if self.in_use >= self.size:
+            raise PoolError('Failed getting connection; pool exhausted')
+        self.in_use += 1
+        return FakeConnection(self.replica)
+
+
+class FakeReplica(Replica):
+    """Replica whose pool hands out fake connections reporting lag_value"""
+
+    def __init__(self, name, lag_value=0, pool_size=2, legacy=False):
+        super().__init__(name, 3306, pool_size)
+        self.lag_value = lag_value
+        self.legacy = legacy
+        self.down = False
+        self.status_error = False
+        self.pool = FakePool(self, pool_size)
+
+    def _get_pool(self):
+        return self.pool
+
+
+def test_parse_hosts():
+    assert parse_hosts('replica1:3307, replica2,,') == [('replica1', 3307), ('replica2', 3306)]
+    assert parse_hosts('') == []
+
+
+def test_replication_lag_falls_back_to_show_slave_status():
+    cursor = FakeCursor(3, legacy=True)
+    assert replication_lag(cursor) == 3.0
+    assert cursor.executed == ['SHOW REPLICA STATUS', 'SHOW SLAVE STATUS']
+
+
+def test_replication_lag_none_when_not_replicating():
+    assert replication_lag(FakeCursor(False)) is None
+    assert replication_lag(FakeCursor(None)) is None
+
+
+def test_fresh_replica_serves_reads():
+    replica = FakeReplica('r1', lag_value=1)
+    conn = replica.connect(now=100.0, max_lag=5)
+    assert conn is not None and conn.replica is replica
+    assert replica.lag == 1.0 and replica.checked_at == 100.0
+
+
+def test_lagging_replica_is_skipped_until_rechecked():
+    replica = FakeReplica('r1', lag_value=30)
+    assert replica.connect(now=100.0, max_lag=5) is None
+    assert replica.pool.in_use == 0
+    # Within the check interval the cached lag decides, without a connection
+    replica.lag_value = 0
+    assert replica.connect(now=100.0 + db_routing.LAG_CHECK_INTERVAL / 2, max_lag=5) is None
+    assert replica.pool.requests == 1
+    assert replica.connect(now=100.0 + db_routing.LAG_CHECK_INTERVAL, max_lag=5) is not None
+
+
+def test_stopped_replication_is_not_fresh():
+    replica = FakeReplica('r1', lag_value=None)
+    assert replica.connect(now=100.0, max_lag=5) is None
+
+
+def test_unreachable_replica_backs_off():
+    replica = FakeReplica('r1')
+    replica.down = True
+    assert replica.connect(now=100.0, max_lag=5) is None
+    assert replica.unavailable_until == 100.0 + db_routing.REPLICA_RETRY_AFTER
+    replica.down = False
+    assert replica.connect(now=101.0, max_lag=5) is None
+    assert replica.pool.requests == 1
+    assert replica.connect(now=100.0 + db_routing.REPLICA_RETRY_AFTER, max_lag=5) is not None
+
+
+def test_failed_lag_check_backs_off_and_returns_connection():
+    replica = FakeReplica('r1')
+    replica.status_error = True
+    assert replica.connect(now=100.0, max_lag=5) is None
+    assert replica.pool.in_use == 0
+    assert replica.unavailable_until > 100.0
+
+
+def test_exhausted_pool_falls_back_without_marking_replica_down():
+    replica = FakeReplica('r1', pool_size=1)
+    held = replica.connect(now=100.0, max_lag=5)
+    assert held is not None
+    assert replica.connect(now=100.5, max_lag=5) is None
+    assert replica.unavailable_until == 0.0
+    held.close()
+    assert replica.connect(now=101.0, max_lag=5) is not None
+
+
+def test_router_round_robins_and_skips_unusable_replicas():
+    first, second = FakeReplica('r1'), FakeReplica('r2')
+    router = ReplicaRouter([first, second], SECRET)
+    used = []
+    for _ in range(4):
+        conn = router.read_connection()
+        used.append(conn.replica)
+        conn.close()
+    assert used == [first, second, first, second]
+
+    first.lag_value = 60
+    first.checked_at = 0.0
+    conns = [router.read_connection() for _ in range(2)]
+    assert [conn.replica for conn in conns] == [second, second]
+
+
+def test_router_uses_primary_when_every_replica_is_unusable():
+    replica = FakeReplica('r1', lag_value=60)
+    assert ReplicaRouter([replica], SECRET).read_connection() is None
+    assert not ReplicaRouter([], SECRET).enabled
+    assert ReplicaRouter([], SECRET).read_connection() is None
+
+
+def test_read_pin_holds_for_pin_seconds():
+    pins = ReadPins(SECRET, seconds=8)
+    token = pins.issue(now=1000.0)
+    assert pins.is_pinned(token, now=1000.0)
+    assert pins.is_pinned(token, now=1007.9)
+    assert not pins.is_pinned(token, now=1008.0)
+
+
+def test_read_pin_is_shared_across_routers_with_the_same_secret():
+    # Each API worker has its own router; the token is all they share
+    token = ReplicaRouter([FakeReplica('r1')], SECRET).pin()
+    other_worker = ReplicaRouter([FakeReplica('r1')], SECRET)
+    assert other_worker.is_pinned(token)
+    assert other_worker.read_connection(token) is None
+    assert other_worker.replicas[0].pool.requests == 0
+
+
+def test_read_pin_rejects_forged_tokens():
+    pins = ReadPins(SECRET, seconds=8)
+    token = pins.issue(now=1000.0)
+    value, _, signature = token.rpartition('.')
+    assert not pins.is_pinned(f'{float(value) + 5!r}.{signature}', now=1001.0)
+    assert not ReadPins('other-secret', seconds=8).is_pinned(token, now=1001.0)
+    assert not pins.is_pinned('garbage', now=1001.0)
+    assert not pins.is_pinned(None)
+
+
+def test_read_pin_from_the_future_is_ignored():
+    pins = ReadPins(SECRET, seconds=8)
+    assert not pins.is_pinned(pins.issue(now=2000.0), now=1000.0)
+
+
+# Against real replicas, e.g. two local MySQL instances:
+#   MYSQL_REPLICA_HOSTS=127.0.0.1:3307,127.0.0.1:3308 pytest tests/test_db_routing.py
+replica_hosts = pytest.mark.skipif(not os.getenv('MYSQL_REPLICA_HOSTS'),
+                                   reason='MYSQL_REPLICA_HOSTS is not set')
+
+
+def live_router(**kwargs):
+    replicas = [Replica(host, port) for host, port in parse_hosts(os.environ['MYSQL_REPLICA_HOSTS'])]
+    return ReplicaRouter(replicas, SECRET, **kwargs)
+
+
+@replica_hosts
+def test_live_replicas_report_lag():
+    for replica in live_router().replicas:
+        conn = replica._get_pool().get_connection()
+        try:
+            cursor = conn.cursor()
+            assert replication_lag(cursor) is not None, f'{replica} is not replicating'
+            cursor.close()
+        finally:
+            conn.close()
+
+
+@replica_hosts
+def test_live_router_reads_from_every_replica():
+    router = live_router()
+    seen = set()
+    for _ in range(len(router.replicas)):
+        conn = router.read_connection()
+        assert conn is not None
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT @@server_id')
+            seen.add(cursor.fetchone()[0])
+            cursor.close()
+        finally:
+            conn.close()
+    assert len(seen) == len(router.replicas)
+
+
+@replica_hosts
+def test_live_router_falls_back_when_lag_is_not_allowed():
+    assert live_router(max_lag=-1).read_connection() is None
+
+
+@replica_hosts
+def test_live_router_keeps_pinned_reads_on_the_primary():
+    router = live_router()
+    assert router.read_connection(router.pin()) is None
@@ -3,17 +3,16 @@ import sys
 import time
 import random
 from datetime import datetime
-import mysql.connector
-from competitor_scraper import CompetitorScraper
-
-def get_database_connection():
-    """Get database connection"""
-    return mysql.connector.connect(
-        host=os.getenv('MYSQL_HOST', 'localhost'),
-        user=os.getenv('MYSQL_USER', 'tracker_user'),
-        password=os.getenv('MYSQL_PASSWORD', 'password'),
-        database=os.getenv('MYSQL_DB', 'price_tracker')
-    )
+import argparse
+from competitor_scraper import CompetitorScraper, extract_price_fields, hit_rate_key
+from scrape_pipeline import ScrapePipeline
+from scrape_resilience import CircuitOpenError, HostRateLimiter
+from price_history_store import record_competitor_price, record_competitor_prices, record_unavailable_mappings
+from scrape_resilience import is_gone_error
+from db import get_database_connection
+from url_utils import normalize_url
+from structured_data import hit_rates
+
 
 def update_all_competitor_prices():
     """Update prices for all active competitor products"""
@@ -33,38 +32,44 @@ def update_all_competitor_prices():
             JOIN competitors c ON cp.competitor_id = c.id
             JOIN product_details p ON cp.product_id = p.id
             WHERE cp.is_active = TRUE AND c.status = 'active'
+              AND (cp.next_check_at IS NULL OR cp.next_check_at <= NOW())
         ''')
         
         competitor_products = cursor.fetchall()
         
         updated_count = 0
         error_count = 0
+        deferred = []
+        gone = []
         
         print(f"Starting price update for {len(competitor_products)} competitor products...")
         
         for cp_id, url, competitor_name, product_name in competitor_products:
             try:
+                # Skip hosts whose circuit breaker is open without waiting
+                if not scraper.is_host_available(url):
+                    deferred.append((cp_id, url))
+                    print(f"↷ Deferred {competitor_name} - {product_name} (site unavailable)")
+                    continue
+
                 print(f"Scraping {competitor_name} - {product_name}")
                 
                 # Scrape price data
                 price_data = scraper.scrape_competitor_price(url, competitor_name)
                 
                 if price_data:
-                    # Insert price history
-                    cursor.execute('''
-                        INSERT INTO competitor_price_history 
-                        (competitor_product_id, price, old_price, availability, scraped_at)
-                        VALUES (%s, %s, %s, %s, %s)
-                    ''', (
-                        cp_id,
-                        price_data['price'],
-                        price_data['old_price'],
-                        price_data['availability'],
-                        price_data['scraped_at']
-                    ))
+                    # Record price history (only a new row when something changed)
+                    record_competitor_price(cursor, cp_id, price_data)
                     
                     updated_count += 1
-                    print(f"✓ Updated: Rs. {price_data['price']}")
+                    print(f"✓ Updated: Rs. {price_data['price']} ({price_data['availability']})")
+                elif scraper.is_gone(url):
+                    gone.append(cp_id)
+                    print(f"✗ Listing gone, backing off")
+                elif not scraper.is_host_available(url):
+                    # The circuit opened while this URL waited for its turn
+                    deferred.append((cp_id, url))
+                    print(f"↷ Deferred {competitor_name} - {product_name} (site unavailable)")
                 else:
                     error_count += 1
                     print(f"✗ Failed to scrape")
@@ -76,6 +81,9 @@ def update_all_competitor_prices():
                 error_count += 1
                 print(f"✗ Error: {str(e)}")
                 continue
+
+        # Removed listings are re-checked less and less often, then deactivated
+        record_unavailable_mappings(cursor, gone, datetime.now())
         
         # Update competitor last_scraped timestamps
         cursor.execute('''
@@ -95,13 +103,124 @@ def update_all_competitor_prices():
         print(f"Price Update Summary:")
         print(f"Successfully updated: {updated_count}")
         print(f"Errors: {error_count}")
+        print(f"Listings gone (404/410): {len(gone)}")
+        print(f"Deferred (circuit open): {len(deferred)}")
         print(f"Total processed: {len(competitor_products)}")
         print(f"Success rate: {(updated_count/len(competitor_products)*100):.1f}%")
+        print(f"Structured data hit rates:\n{hit_rates.summary()}")
         print(f"{'='*50}")
+
+        for cp_id, url in deferred:
+            print(f"Deferred competitor product {cp_id}: {url}")
         
     except Exception as e:
         print(f"Critical error in price update: {str(e)}")
         sys.exit(1)
 
+def parse_price_row(content, url, cp_ids):
+    """Pipeline parse stage: (competitor_price_history rows, one per mapping of
+    the URL, hit rate key, structured data source)"""
+    fields, source = extract_price_fields(content, url)
+    if not fields:
+        return [], hit_rate_key(url), source
+    price, old_price, availability = fields
+    scraped_at = datetime.now()
+    return [(cp_id, price, old_price, availability, scraped_at) for cp_id in cp_ids], hit_rate_key(url), source
+
+def update_all_competitor_prices_pipelined(fetch_workers=4, parse_workers=None):
+    """Update prices with fetch, parse and store running as overlapping stages.
+
+    Requests to the same host are still spaced out, but different retailers
+    are fetched in parallel and history rows are written in batches.
+    """
+    try:
+        scraper = CompetitorScraper()
+        rate_limiter = HostRateLimiter(min_interval=3, jitter=4)
+
+        conn = get_database_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT cp.id, cp.competitor_url
+            FROM competitor_products cp
+            JOIN competitors c ON cp.competitor_id = c.id
+            WHERE cp.is_active = TRUE AND c.status = 'active'
+              AND (cp.next_check_at IS NULL OR cp.next_check_at <= NOW())
+        ''')
+        competitor_products = cursor.fetchall()
+        # Mappings sharing a listing are fetched once, like the sequential path
+        urls = {}
+        mapping_ids_by_url = {}
+        for cp_id, url in competitor_products:
+            key = normalize_url(url)
+            urls.setdefault(key, url)
+            mapping_ids_by_url.setdefault(urls[key], []).append(cp_id)
+        gone = []
+        deferred = []
+        print(f"Starting pipelined price update for {len(competitor_products)} competitor products "
+              f"({len(mapping_ids_by_url)} distinct URLs)...")
+
+        def fetch(url):
+            if not scraper.is_host_available(url):
+                deferred.append(url)
+                raise CircuitOpenError(f"Circuit open for {scraper.circuit_breaker.host_for(url)}")
+            rate_limiter.wait(url)
+            try:
+                return scraper.fetch_with_retry(url).content
+            except Exception as e:
+                if is_gone_error(e):
+                    gone.extend(mapping_ids_by_url[url])
+                elif isinstance(e, CircuitOpenError):
+                    # The breaker opened while this URL waited for its slot
+                    deferred.append(url)
+                raise
+
+        def store(records):
+            rows = []
+            for mapping_rows, key, source in records:
+                hit_rates.record(key, source)
+                rows.extend(mapping_rows)
+            record_competitor_prices(cursor, rows)
+            conn.commit()
+
+        pipeline = ScrapePipeline(fetch, parse_price_row, store,
+                                  fetch_workers=fetch_workers, parse_workers=parse_workers)
+        with pipeline:
+            for url, cp_ids in mapping_ids_by_url.items():
+                pipeline.submit(url, cp_ids)
+        print(f"Structured data hit rates:\n{hit_rates.summary()}")
+
+        record_unavailable_mappings(cursor, gone, datetime.now())
+        conn.commit()
+        print(f"Listings gone (404/410): {len(gone)}")
+        print(f"Deferred (circuit open): {sum(len(mapping_ids_by_url[url]) for url in deferred)}")
+        for url in deferred:
+            print(f"Deferred competitor products {mapping_ids_by_url[url]}: {url}")
+
+        cursor.execute('''
+            UPDATE competitors c
+            JOIN competitor_products cp ON c.id = cp.competitor_id
+            SET c.last_scraped = NOW()
+            WHERE cp.is_active = TRUE AND c.status = 'active'
+        ''')
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    except Exception as e:
+        print(f"Critical error in price update: {str(e)}")
+        sys.exit(1)
+
 if __name__ == "__main__":
-    update_all_competitor_prices()
+    parser = argparse.ArgumentParser(description="Update competitor prices")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="run fetch, parse and store as concurrent stages")
+    parser.add_argument('--fetch-workers', type=int, default=4)
+    parser.add_argument('--parse-workers', type=int,
+                        default=int(os.getenv('SCRAPE_PARSE_WORKERS', os.cpu_count())),
+                        help="parse processes (default: CPU count, 0 = parse in-process)")
+    args = parser.parse_args()
+
+    if args.pipeline:
+        update_all_competitor_prices_pipelined(args.fetch_workers, args.parse_workers)
+    else:
+        update_all_competitor_prices()
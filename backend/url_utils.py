@@ -0,0 +1,41 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+
+def normalize_url(url):
+    """Canonical form of a product URL, used as a key for shared work.
+
+    Lower-cases scheme and host, drops default ports, the fragment and a
+    trailing slash, and sorts query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ''
+    if parts.port and str(parts.port) != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip('/') or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', 'igshid', '_ga', 'ref', 'srsltid'}
+TRACKING_PREFIXES = ('utm_',)
+
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonical_url(url):
+    """normalize_url with tracking parameters removed.
+
+    Two links to the same product page give the same canonical URL however
+    they were tagged, so it is what the crawler fetches and stores.
+    """
+    parts = urlsplit(url.strip())
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                       if not is_tracking_param(k)])
+    return normalize_url(urlunsplit((parts.scheme, parts.netloc, parts.path, query, '')))